@@ -0,0 +1,145 @@
+"""
+Shared outbound HTTP client for third-party calls (Google geocoding, partner
+restaurant APIs).
+
+One requests.Session is reused by every caller, so connections to the same
+host are kept alive in urllib3's per-host pools instead of paying a new
+TCP + TLS handshake per call. On top of that it adds:
+
+* a default timeout (OUTBOUND_HTTP_TIMEOUT) for callers that pass none;
+* retries with jittered exponential backoff for idempotent methods, on
+  connection errors and 429/502/503/504 responses (never on read timeouts,
+  which would multiply the caller's worst-case latency);
+* per-host request / error / latency counters, see http_client.stats().
+"""
+import logging
+import random
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.2  # seconds, doubled per attempt before jitter
+DEFAULT_POOL_SIZE = 20  # keep-alive connections per host
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class _HostStats:
+    __slots__ = ("requests", "errors", "retries", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+
+class OutboundHTTPClient:
+    def __init__(
+        self,
+        timeout=DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        # The session is shared by every thread and by calls made on behalf of
+        # different restaurants, so a cookie set by one partner API would be
+        # sent on the next caller's request. Calls carry their own
+        # credentials; never store cookies.
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._stats: Dict[str, _HostStats] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """
+        Same contract as requests.request(). retries defaults to the client's
+        setting for idempotent methods and to 0 otherwise.
+        """
+        method = method.upper()
+        if retries is None:
+            retries = self.retries if method in IDEMPOTENT_METHODS else 0
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlparse(url).netloc
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError:
+                self._record(host, started, error=True, retried=attempt > 0)
+                if attempt >= retries:
+                    raise
+            except requests.RequestException:
+                self._record(host, started, error=True, retried=attempt > 0)
+                raise
+            else:
+                failed = response.status_code >= 500 or response.status_code == 429
+                self._record(host, started, error=failed, retried=attempt > 0)
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                response.close()
+
+            # Full jitter keeps retrying workers from hitting the host in lockstep
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+            attempt += 1
+            logger.debug("Retrying %s %s (attempt %s)", method, url, attempt + 1)
+
+    def _record(self, host: str, started: float, error: bool, retried: bool):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            stats = self._stats.get(host)
+            if stats is None:
+                stats = self._stats[host] = _HostStats()
+            stats.requests += 1
+            stats.errors += int(error)
+            stats.retries += int(retried)
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-host counters since start-up."""
+        with self._lock:
+            return {
+                host: {
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "retries": s.retries,
+                    "avg_ms": round(s.total_ms / s.requests, 1) if s.requests else 0.0,
+                    "max_ms": round(s.max_ms, 1),
+                }
+                for host, s in self._stats.items()
+            }
+
+
+http_client = OutboundHTTPClient(
+    timeout=getattr(settings, "OUTBOUND_HTTP_TIMEOUT", DEFAULT_TIMEOUT),
+    retries=getattr(settings, "OUTBOUND_HTTP_RETRIES", DEFAULT_RETRIES),
+    backoff=getattr(settings, "OUTBOUND_HTTP_BACKOFF", DEFAULT_BACKOFF),
+    pool_size=getattr(settings, "OUTBOUND_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE),
+)
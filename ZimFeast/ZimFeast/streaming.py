@@ -0,0 +1,40 @@
+"""
+Streaming response bodies produced by blocking code.
+
+Under ASGI (daphne), Django's StreamingHttpResponse consumes a synchronous
+iterator with a single sync_to_async(list) call, so nothing reaches the
+client until the last chunk exists. streaming_content() gives it an async
+iterator instead, which advances the blocking one a step at a time in the
+request's sync thread (the same thread, and so the same DB connection, the
+view ran in) and sends each chunk as soon as it is produced.
+"""
+from asgiref.sync import sync_to_async
+
+_END = object()
+
+
+def _step(iterator):
+    return next(iterator, _END)
+
+
+async def as_async(iterable):
+    iterator = iter(iterable)
+    step = sync_to_async(_step)
+    try:
+        while True:
+            chunk = await step(iterator)
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        # client went away (or we finished): let generators release what they hold
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def streaming_content(request, iterable):
+    """Body for a StreamingHttpResponse: async under ASGI, unchanged under WSGI."""
+    if getattr(request, "scope", None) is not None:
+        return as_async(iterable)
+    return iterable
@@ -2,7 +2,7 @@ from rest_framework import serializers
 from .models import Driver, DriverOrderStatus
 from accounts.serializers import UserSerializer
 from django.conf import settings
-import requests
+from ZimFeast.http_client import http_client
 
 class DriverSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -19,8 +19,9 @@ class DriverSerializer(serializers.ModelSerializer):
         if address:
             try:
                 api_key = settings.GOOGLE_MAPS_API_KEY
-                response = requests.get(
-                    f"https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={api_key}"
+                response = http_client.get(
+                    "https://maps.googleapis.com/maps/api/geocode/json",
+                    params={"address": address, "key": api_key},
                 )
                 data = response.json()
                 if data["status"] == "OK":
@@ -1,3 +1,57 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from . import utils
+from .models import Driver
+
+User = get_user_model()
+
+RESTAURANT = (-17.8252, 31.0335)
+
+
+def driving(*meters):
+    return {"rows": [{"elements": [{"distance": {"value": value}}]} for value in meters]}
+
+
+class AssignDriverTests(TestCase):
+    def setUp(self):
+        # straight-line distance from the restaurant grows with the offset
+        self.drivers = [self.make_driver(f"driver{i}@example.com", 0.01 * i) for i in range(1, 4)]
+        self.order = SimpleNamespace(restaurant_lat=RESTAURANT[0], restaurant_lng=RESTAURANT[1], restaurant=None)
+
+    def make_driver(self, email, offset, online=True):
+        user = User.objects.create_user(email=email, password="pass1234", role="driver")
+        return Driver.objects.create(
+            user=user, license_number="ZW123", license_photo="", vehicle_details={}, vehicle_photo="",
+            is_online=online, lat=RESTAURANT[0] + offset, lng=RESTAURANT[1],
+        )
+
+    @mock.patch.object(utils, "DRIVER_SHORTLIST_SIZE", 2)
+    def test_one_driving_distance_call_for_the_closest_drivers(self):
+        with mock.patch.object(utils.gmaps, "distance_matrix", return_value=driving(4000, 1500)) as matrix:
+            driver = utils.assign_driver(self.order)
+
+        matrix.assert_called_once()
+        origins = matrix.call_args.kwargs["origins"]
+        self.assertEqual(origins, [(d.lat, d.lng) for d in self.drivers[:2]])
+        # shortest by road, not by straight line
+        self.assertEqual(driver, self.drivers[1])
+
+    def test_offline_drivers_are_skipped(self):
+        self.make_driver("offline@example.com", 0.001, online=False)
+
+        with mock.patch.object(utils.gmaps, "distance_matrix", return_value=driving(900, 2000, 3000)) as matrix:
+            driver = utils.assign_driver(self.order)
+
+        self.assertEqual(len(matrix.call_args.kwargs["origins"]), 3)
+        self.assertEqual(driver, self.drivers[0])
+
+    def test_no_available_driver(self):
+        Driver.objects.update(is_online=False)
+
+        with mock.patch.object(utils.gmaps, "distance_matrix") as matrix:
+            self.assertIsNone(utils.assign_driver(self.order))
+        matrix.assert_not_called()
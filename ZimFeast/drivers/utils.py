@@ -2,10 +2,15 @@
 from django.conf import settings
 from drivers.models import Driver
 from orders.models import Order
+from orders.utils import distances_from_point_km
 import googlemaps
+import numpy as np
 
 gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_API_KEY)
 
+# Number of closest drivers (by straight line) to check driving distance for
+DRIVER_SHORTLIST_SIZE = 10
+
 def assign_driver(order):
     """
     Assign the nearest available driver to a given order.
@@ -15,33 +20,46 @@ def assign_driver(order):
     - Nearest to the restaurant(s) location
     Returns the Driver object or None if no driver is available.
     """
-    restaurant_coords = (order.delivery_address_lat, order.delivery_address_lng)
+    restaurant_lat = order.restaurant_lat if order.restaurant_lat is not None else order.restaurant.lat
+    restaurant_lng = order.restaurant_lng if order.restaurant_lng is not None else order.restaurant.lng
+    restaurant_coords = (restaurant_lat, restaurant_lng)
 
     # Get all drivers who are online and not currently delivering an order
     active_order_driver_ids = Order.objects.filter(status__in=["pending", "accepted", "out_for_delivery"]).values_list("driver_id", flat=True)
-    available_drivers = Driver.objects.filter(is_online=True).exclude(id__in=active_order_driver_ids)
+    available_drivers = list(
+        Driver.objects.filter(is_online=True, lat__isnull=False, lng__isnull=False)
+        .exclude(id__in=active_order_driver_ids)
+        .values_list("id", "lat", "lng")
+    )
 
-    if not available_drivers.exists():
+    if not available_drivers:
         return None
 
-    nearest_driver = None
+    # Straight-line distance for every driver in one pass, then only ask
+    # Google for driving distances of the closest few
+    driver_ids, lats, lngs = zip(*available_drivers)
+    straight_line = distances_from_point_km(restaurant_lat, restaurant_lng, lats, lngs)
+    shortlist = np.argsort(straight_line, kind="stable")[:DRIVER_SHORTLIST_SIZE]
+
+    distance_result = gmaps.distance_matrix(origins=[(lats[i], lngs[i]) for i in shortlist],
+                                            destinations=[restaurant_coords],
+                                            mode="driving")
+
+    nearest_driver_id = None
     shortest_distance = float('inf')
 
-    for driver in available_drivers:
-        driver_coords = (driver.lat, driver.lng)
-        # Calculate driving distance using Google Maps Distance Matrix API
-        distance_result = gmaps.distance_matrix(origins=[driver_coords],
-                                                destinations=[restaurant_coords],
-                                                mode="driving")
+    for row, i in zip(distance_result.get("rows", []), shortlist):
         try:
-            distance_meters = distance_result["rows"][0]["elements"][0]["distance"]["value"]
+            distance_meters = row["elements"][0]["distance"]["value"]
         except (KeyError, IndexError):
             continue
 
         if distance_meters < shortest_distance:
             shortest_distance = distance_meters
-            nearest_driver = driver
+            nearest_driver_id = driver_ids[i]
 
-    return nearest_driver
+    if nearest_driver_id is None:
+        return None
+    return Driver.objects.get(id=nearest_driver_id)
 
 #send order to driver
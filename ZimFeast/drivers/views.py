@@ -6,7 +6,7 @@ from .models import Driver, DriverOrderStatus
 from .serializer import DriverSerializer
 from drivers.utils import assign_driver
 from .models import DriverFinance, DriverRating
-import requests
+from ZimFeast.http_client import http_client
 from django.conf import settings
 from django.utils import timezone
 from rest_framework.pagination import CursorPagination
@@ -90,8 +90,10 @@ GOOGLE_MAPS_API_KEY = settings.GOOGLE_MAPS_API_KEY  # put your key in .env and s
 def get_address_from_coordinates(lat, lng):
     """Use Google Maps API to convert coordinates into a human-readable address."""
     try:
-        url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lng}&key={GOOGLE_MAPS_API_KEY}"
-        response = requests.get(url)
+        response = http_client.get(
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            params={"latlng": f"{lat},{lng}", "key": GOOGLE_MAPS_API_KEY},
+        )
         data = response.json()
         if data["status"] == "OK" and len(data["results"]) > 0:
             return data["results"][0]["formatted_address"]
@@ -1,3 +1,69 @@
-from django.test import TestCase
+from types import SimpleNamespace
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+
+from .utils import (
+    calculate_multi_restaurant_delivery_fee,
+    distance_matrix_km,
+    distances_from_point_km,
+    haversine_distance,
+    optimize_pickup_order,
+    validate_restaurant_group,
+)
+
+HARARE = (-17.8252, 31.0335)
+POINTS = [(-17.8252, 31.0335), (-17.80, 31.05), (-17.86, 31.02), (-20.1325, 28.6265)]
+
+
+class DistanceKernelTests(SimpleTestCase):
+    def test_batch_distances_match_the_scalar_haversine(self):
+        lats, lngs = zip(*POINTS)
+
+        distances = distances_from_point_km(*HARARE, lats, lngs)
+
+        self.assertEqual(distances.shape, (4,))
+        expected = [haversine_distance(*HARARE, lat, lng) for lat, lng in POINTS]
+        np.testing.assert_allclose(distances, expected, rtol=1e-9, atol=1e-9)
+
+    def test_matrix_is_pairwise_and_symmetric(self):
+        lats, lngs = zip(*POINTS)
+
+        matrix = distance_matrix_km(lats, lngs, lats[:2], lngs[:2])
+        square = distance_matrix_km(lats, lngs, lats, lngs)
+
+        self.assertEqual(matrix.shape, (4, 2))
+        self.assertAlmostEqual(matrix[3, 1], haversine_distance(*POINTS[3], *POINTS[1]), places=9)
+        np.testing.assert_allclose(square, square.T)
+        np.testing.assert_allclose(np.diag(square), 0.0, atol=1e-9)
+
+
+class PickupOrderTests(SimpleTestCase):
+    restaurants = [
+        {"name": "near delivery", "lat": -17.860, "lng": 31.050},
+        {"name": "middle", "lat": -17.830, "lng": 31.040},
+        {"name": "near driver", "lat": -17.800, "lng": 31.030},
+    ]
+
+    def test_driver_side_first_and_delivery_side_last(self):
+        ordered = optimize_pickup_order(self.restaurants, -17.79, 31.03, -17.87, 31.05)
+
+        self.assertEqual([r["name"] for r in ordered], ["near driver", "middle", "near delivery"])
+
+    def test_multi_restaurant_fee_follows_the_optimized_route(self):
+        fee = calculate_multi_restaurant_delivery_fee(self.restaurants, -17.87, 31.05, -17.79, 31.03)
+
+        self.assertEqual(fee["pickup_order"][0]["name"], "near driver")
+        route = [(r["lat"], r["lng"]) for r in fee["pickup_order"]] + [(-17.87, 31.05)]
+        total = sum(haversine_distance(*a, *b) for a, b in zip(route, route[1:]))
+        self.assertAlmostEqual(fee["total_distance"], round(total, 2))
+
+
+class RestaurantGroupTests(SimpleTestCase):
+    def test_group_must_fit_within_five_km(self):
+        close = [SimpleNamespace(lat=-17.8252, lng=31.0335), SimpleNamespace(lat=-17.80, lng=31.05)]
+        spread = close + [SimpleNamespace(lat=-17.70, lng=31.05)]
+
+        self.assertTrue(validate_restaurant_group(close))
+        self.assertFalse(validate_restaurant_group(spread))
+        self.assertTrue(validate_restaurant_group(close[:1]))
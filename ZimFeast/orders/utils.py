@@ -1,11 +1,14 @@
 from geopy.distance import distance as geo_distance
 from geopy.distance import geodesic
 from math import radians, sin, cos, sqrt, atan2
+import numpy as np
 
 # Delivery rate: $0.35 per kilometer
 DELIVERY_RATE_PER_KM = 0.35
 MIN_DELIVERY_FEE = 1.50
 
+EARTH_RADIUS_KM = 6371.0
+
 def calculate_distance_kms(point_a, point_b):
     """
     Calculate distance in kilometers between two points using geopy.
@@ -36,6 +39,36 @@ def haversine_distance(lat1, lng1, lat2, lng2):
     c = 2 * atan2(sqrt(a), sqrt(1-a))
     return R * c
 
+def as_coordinate_arrays(lats, lngs):
+    """Return lats/lngs as contiguous float64 arrays (accepts lists, tuples or arrays)."""
+    return (
+        np.ascontiguousarray(lats, dtype=np.float64),
+        np.ascontiguousarray(lngs, dtype=np.float64),
+    )
+
+def _haversine_km(lat1, lng1, lat2, lng2):
+    """Vectorized Haversine on broadcastable arrays of degrees."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def distances_from_point_km(lat, lng, lats, lngs):
+    """
+    Distance in km from one point to N points.
+    Returns a float64 array of shape (N,) in the same order as lats/lngs.
+    """
+    lats, lngs = as_coordinate_arrays(lats, lngs)
+    return _haversine_km(float(lat), float(lng), lats, lngs)
+
+def distance_matrix_km(lats_a, lngs_a, lats_b, lngs_b):
+    """
+    Pairwise distances in km between N points and M points.
+    Returns a float64 array of shape (N, M).
+    """
+    lats_a, lngs_a = as_coordinate_arrays(lats_a, lngs_a)
+    lats_b, lngs_b = as_coordinate_arrays(lats_b, lngs_b)
+    return _haversine_km(lats_a[:, None], lngs_a[:, None], lats_b[None, :], lngs_b[None, :])
+
 def calculate_delivery_fee(restaurant_lat, restaurant_lng, delivery_lat, delivery_lng):
     """
     Calculate delivery fee at $0.35 per km with minimum fee.
@@ -108,57 +141,38 @@ def optimize_pickup_order(restaurants, driver_lat, driver_lng, delivery_lat, del
     if len(restaurants) <= 1:
         return restaurants
     
-    # Find the restaurant closest to delivery address (should be picked up last)
-    restaurants_with_delivery_dist = []
-    for r in restaurants:
-        dist_to_delivery = haversine_distance(r['lat'], r['lng'], delivery_lat, delivery_lng)
-        restaurants_with_delivery_dist.append({**r, '_delivery_dist': dist_to_delivery})
+    lats, lngs = as_coordinate_arrays([r['lat'] for r in restaurants], [r['lng'] for r in restaurants])
+    delivery_dist = distances_from_point_km(delivery_lat, delivery_lng, lats, lngs)
+    driver_dist = distances_from_point_km(driver_lat, driver_lng, lats, lngs)
+    between = distance_matrix_km(lats, lngs, lats, lngs)
     
     # The one closest to delivery should be last
-    restaurants_with_delivery_dist.sort(key=lambda x: x['_delivery_dist'])
-    last_restaurant = restaurants_with_delivery_dist[0]  # Closest to delivery = last pickup
-    remaining = restaurants_with_delivery_dist[1:]
-    
-    if not remaining:
-        return [last_restaurant]
+    by_delivery = np.argsort(delivery_dist, kind='stable')
+    last = by_delivery[0]
     
     # Find the restaurant closest to driver (should be first)
-    for r in remaining:
-        r['_driver_dist'] = haversine_distance(driver_lat, driver_lng, r['lat'], r['lng'])
-    
-    remaining.sort(key=lambda x: x['_driver_dist'])
-    first_restaurant = remaining[0]
-    middle = remaining[1:]
+    remaining = by_delivery[1:]
+    remaining = remaining[np.argsort(driver_dist[remaining], kind='stable')]
+    first = remaining[0]
+    middle = list(remaining[1:])
     
     # For middle restaurants, use nearest-neighbor from first
-    ordered = [first_restaurant]
-    current = first_restaurant
-    
+    ordered = [first]
+    current = first
     while middle:
-        # Find nearest to current
-        for r in middle:
-            r['_dist_from_current'] = haversine_distance(current['lat'], current['lng'], r['lat'], r['lng'])
-        middle.sort(key=lambda x: x['_dist_from_current'])
-        next_stop = middle.pop(0)
-        ordered.append(next_stop)
-        current = next_stop
+        next_pos = int(np.argmin(between[current, middle]))
+        current = middle.pop(next_pos)
+        ordered.append(current)
     
     # Add last restaurant (closest to delivery)
-    ordered.append(last_restaurant)
-    
-    # Clean up temporary keys
-    for r in ordered:
-        r.pop('_delivery_dist', None)
-        r.pop('_driver_dist', None)
-        r.pop('_dist_from_current', None)
+    ordered.append(last)
     
-    return ordered
+    return [dict(restaurants[i]) for i in ordered]
 
 def validate_restaurant_group(restaurants):
     # restaurants: iterable of restaurant objects with lat,lng
-    coords = [(r.lat, r.lng) for r in restaurants]
-    for i in range(len(coords)):
-        for j in range(i+1, len(coords)):
-            if calculate_distance_km(coords[i][0],coords[i][1],coords[j][0],coords[j][1]) > 5:
-                return False
-    return True
\ No newline at end of file
+    restaurants = list(restaurants)
+    if len(restaurants) < 2:
+        return True
+    lats, lngs = as_coordinate_arrays([r.lat for r in restaurants], [r.lng for r in restaurants])
+    return not (distance_matrix_km(lats, lngs, lats, lngs) > 5).any()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CuisineType, Restaurant, RestaurantExternalAPI, MenuItem
+from .models import CuisineType, Restaurant, RestaurantExternalAPI, MenuItem, ExternalMenuItem
 
 @admin.register(CuisineType)
 class CuisineTypeAdmin(admin.ModelAdmin):
@@ -14,9 +14,15 @@ class RestaurantAdmin(admin.ModelAdmin):
 
 @admin.register(RestaurantExternalAPI)
 class RestaurantExternalAPIAdmin(admin.ModelAdmin):
-    list_display = ("id", "restaurant", "category", "api_url")
+    list_display = ("id", "restaurant", "category", "api_url", "last_synced_at")
     search_fields = ("restaurant__name", "category", "api_url")
 
+@admin.register(ExternalMenuItem)
+class ExternalMenuItemAdmin(admin.ModelAdmin):
+    list_display = ("id", "restaurant", "name", "price", "category", "available", "synced_at")
+    search_fields = ("name", "restaurant__name", "external_id")
+    list_filter = ("available",)
+
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
     list_display = ("id", "restaurant", "name", "price", "get_categories", "available")
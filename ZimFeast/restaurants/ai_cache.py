@@ -0,0 +1,217 @@
+"""
+Cache of Chef Zim recommendation payloads.
+
+Requests are reduced to a canonical context: the five dialog answers
+lowercased and snake_cased, party size bucketed into the dialog's own
+choices, and the user's location coarsened to a geohash cell. The
+recommendation for a context is cached under (menu digest fingerprint,
+context), so any menu change makes older answers unreachable.
+
+Entries live in a process-local LRU with a TTL and, when Redis is reachable,
+in Redis as well so workers share answers and the warm_ai_recommendations
+command can precompute them off-peak. Every lookup made of the dialog's own
+choices also counts the context in a Redis sorted set, which is how the
+warm-up command finds the most common combinations; free-text answers are
+not counted, and the set is trimmed to the AI_POPULAR_CONTEXTS_MAX most
+requested contexts.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .nearby_cache import geohash_encode
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 900  # seconds
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_LOCATION_PRECISION = 4  # ~39 km x 20 km cells
+DEFAULT_MAX_POPULAR_CONTEXTS = 5000
+
+POPULAR_CONTEXTS_KEY = "ai:recommendations:contexts"
+ENTRY_KEY = "ai:recommendations:{fingerprint}:{context}"
+
+# Choices offered by the Chef Zim dialog (src/pages/customer-components/ChefZimDialog.tsx)
+MOODS = ("happy", "tired", "stressed", "adventurous", "relaxed")
+CRAVINGS = ("something_savory", "something_sweet", "something_spicy", "something_fresh", "comfort_food", "surprise_me")
+DAY_TYPES = ("workday", "weekend", "special_occasion", "regular_day")
+WEATHERS = ("sunny", "cloudy", "cold", "rainy", "windy")
+PARTY_SIZES = ("just_me", "couple", "family", "group")
+
+MAX_FREE_TEXT = 40
+
+Context = Tuple[str, str, str, str, str, str]  # mood, craving, day_type, weather, party_size, cell
+
+
+def _slug(value: Any) -> str:
+    text = re.sub(r"[\s\-]+", "_", str(value or "").strip().lower())
+    return text[:MAX_FREE_TEXT]
+
+
+def party_size_bucket(value: Any) -> str:
+    text = _slug(value)
+    if text in PARTY_SIZES:
+        return text
+    match = re.search(r"\d+", text)
+    if not match:
+        return text
+    people = int(match.group())
+    if people <= 1:
+        return "just_me"
+    if people == 2:
+        return "couple"
+    if people <= 5:
+        return "family"
+    return "group"
+
+
+def location_cell(lat: Any, lng: Any) -> str:
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return ""
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return ""
+    precision = getattr(settings, "AI_RECOMMENDATION_LOCATION_PRECISION", DEFAULT_LOCATION_PRECISION)
+    return geohash_encode(lat, lng, precision)
+
+
+def normalize_context(mood, craving, day_type, weather, party_size, lat=None, lng=None) -> Context:
+    return (
+        _slug(mood),
+        _slug(craving),
+        _slug(day_type),
+        _slug(weather),
+        party_size_bucket(party_size),
+        location_cell(lat, lng),
+    )
+
+
+def is_dialog_choice(context: Context) -> bool:
+    """Whether every answer in the context is one the dialog offers."""
+    mood, craving, day_type, weather, party_size, _ = context
+    return (
+        mood in MOODS
+        and craving in CRAVINGS
+        and day_type in DAY_TYPES
+        and weather in WEATHERS
+        and party_size in PARTY_SIZES
+    )
+
+
+def _context_id(context: Context) -> str:
+    return hashlib.sha1(json.dumps(context).encode("utf-8")).hexdigest()
+
+
+class RecommendationCache:
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_popular_contexts: int = DEFAULT_MAX_POPULAR_CONTEXTS,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_popular_contexts = max_popular_contexts
+        self._entries: "OrderedDict[Tuple[str, Context], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _redis():
+        from realtime.redis_publisher import publisher
+
+        return publisher.redis_client if publisher.connected else None
+
+    def get(self, fingerprint: str, context: Context, count: bool = True) -> Optional[Dict[str, Any]]:
+        if count:
+            self._count(context)
+        key = (fingerprint, context)
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                # Menus changed: nothing cached so far can be served again
+                self._entries.clear()
+                self._fingerprint = fingerprint
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() - entry[0] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            raw = client.get(ENTRY_KEY.format(fingerprint=fingerprint, context=_context_id(context)))
+        except Exception as e:
+            logger.debug("AI recommendation cache read failed: %s", e)
+            return None
+        if raw is None:
+            return None
+        payload = json.loads(raw)
+        self._store_local(key, payload)
+        return payload
+
+    def set(self, fingerprint: str, context: Context, payload: Dict[str, Any]):
+        self._store_local((fingerprint, context), payload)
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.set(
+                ENTRY_KEY.format(fingerprint=fingerprint, context=_context_id(context)),
+                json.dumps(payload),
+                ex=int(self.ttl),
+            )
+        except Exception as e:
+            logger.debug("AI recommendation cache write failed: %s", e)
+
+    def _store_local(self, key, payload):
+        with self._lock:
+            if key[0] != self._fingerprint:
+                self._entries.clear()
+                self._fingerprint = key[0]
+            self._entries[key] = (time.monotonic(), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, context: Context):
+        if not is_dialog_choice(context):
+            return
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.zincrby(POPULAR_CONTEXTS_KEY, 1, json.dumps(context))
+            # Keep the most requested contexts only (the lowest scores rank first)
+            client.zremrangebyrank(POPULAR_CONTEXTS_KEY, 0, -(self.max_popular_contexts + 1))
+        except Exception as e:
+            logger.debug("AI context counter unavailable: %s", e)
+
+    def popular_contexts(self, limit: int) -> List[Context]:
+        """Most requested contexts first (empty without Redis)."""
+        client = self._redis()
+        if client is None:
+            return []
+        members = client.zrevrange(POPULAR_CONTEXTS_KEY, 0, limit - 1)
+        return [tuple(json.loads(m)) for m in members]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+recommendation_cache = RecommendationCache(
+    ttl=getattr(settings, "AI_RECOMMENDATION_CACHE_TTL", DEFAULT_TTL),
+    max_entries=getattr(settings, "AI_RECOMMENDATION_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+    max_popular_contexts=getattr(settings, "AI_POPULAR_CONTEXTS_MAX", DEFAULT_MAX_POPULAR_CONTEXTS),
+)
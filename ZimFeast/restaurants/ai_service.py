@@ -5,10 +5,19 @@ Uses OpenAI API to provide personalized food suggestions based on user context.
 import os
 import json
 import logging
-import requests
-from typing import List, Dict, Any, Optional
-from django.db.models import Q
-from .models import Restaurant, MenuItem, RestaurantExternalAPI
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple
+from django.conf import settings
+from ZimFeast.http_client import http_client
+from .models import Restaurant, RestaurantExternalAPI
+from .integrations import guarded_call
+from .menu_digest import LiveMenu, menu_digest
+from .ai_cache import recommendation_cache, normalize_context
+from .menu_retrieval import menu_retriever, matched_keywords
+from .prompt_encoding import encode_menu, DEFAULT_MENU_TOKENS
+from .json_stream import StreamingAnswerScanner
+from .search_index import search_index, rank_hits, RESTAURANT, DISH, CUISINE
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +25,53 @@ logger = logging.getLogger(__name__)
 # do not change this unless explicitly requested by the user
 OPENAI_MODEL = "gpt-5"
 
+# Shared pool for external menu fan-out; stragglers past the deadline keep
+# running here without holding up the request
+_external_menu_pool: Optional[ThreadPoolExecutor] = None
+_external_menu_pool_lock = threading.Lock()
+
+# Model calls run here so a request can stop waiting at its latency budget
+_ai_pool: Optional[ThreadPoolExecutor] = None
+_ai_pool_lock = threading.Lock()
+
+LOCAL_RECOMMENDATIONS = 4
+
+CHEF_ZIM_SYSTEM_PROMPT = """You are Chef Zim, a friendly AI food concierge for ZimFeast, a food delivery platform in Zimbabwe. 
+Your job is to recommend dishes based on the customer's mood, cravings, weather, and party size.
+
+You have access to the restaurant menus and should recommend specific dishes that match the customer's preferences.
+Always be warm, helpful, and make appetizing suggestions.
+
+IMPORTANT: You must respond with valid JSON only. No markdown, no extra text.
+The JSON must have this exact structure:
+{
+    "greeting": "A personalized greeting based on their mood and context",
+    "recommendations": [
+        {
+            "dish_id": "Id of the dish in the menu table, e.g. D3",
+            "dish_name": "Name of the dish",
+            "restaurant_name": "Restaurant name",
+            "reason": "Why this dish is perfect for them",
+            "match_score": 95
+        }
+    ],
+    "closing": "A friendly closing message"
+}
+
+Recommend 3-5 dishes that best match the customer's needs. Consider:
+- Mood: comfort food for sad days, light food for energetic moods
+- Weather: warm soups for cold/rainy days, refreshing items for hot days
+- Party size: shareable dishes for groups, individual portions for solo diners
+- Day type: quick meals for workdays, leisurely options for weekends"""
+
+LOCAL_GREETINGS = {
+    'happy': "Love the good vibes! Here's something to keep the mood going.",
+    'tired': "Long day? Let's get you something easy and satisfying.",
+    'stressed': "Take a breath - good food is on the way.",
+    'adventurous': "Feeling bold? Here are a few picks worth exploring.",
+    'relaxed': "Nice and easy - here are some dishes to enjoy at your own pace.",
+}
+
 def get_openai_client():
     """Get OpenAI client with API key from Django settings or environment."""
     try:
@@ -25,70 +81,151 @@ def get_openai_client():
         if not api_key:
             logger.warning("OPENAI_API_KEY not found in settings or environment")
             return None
-        return OpenAI(api_key=api_key)
+        # Bounds how long a hedged-away call keeps its worker thread
+        return OpenAI(api_key=api_key, timeout=getattr(settings, 'OPENAI_TIMEOUT', 30.0))
     except ImportError:
         logger.error("OpenAI package not installed")
         return None
 
 
-def fetch_external_menu_items(restaurant: Restaurant) -> List[Dict[str, Any]]:
+def fetch_external_menu_items(restaurant: Restaurant, menu_api: Optional[RestaurantExternalAPI] = None) -> List[Dict[str, Any]]:
     """Fetch menu items from restaurant's external API if configured."""
     external_items = []
     try:
-        menu_api = restaurant.external_apis.filter(category='menu_api').first()
+        if menu_api is None:
+            menu_api = restaurant.external_apis.filter(category='menu_api').first()
         if menu_api:
             headers = {}
             if menu_api.api_key:
                 headers['Authorization'] = f'Bearer {menu_api.api_key}'
             
-            response = requests.get(menu_api.api_url, headers=headers, timeout=5)
-            if response.ok:
-                data = response.json()
-                if isinstance(data, list):
-                    for item in data[:50]:
-                        external_items.append({
-                            'source': 'external_api',
-                            'restaurant_id': str(restaurant.id),
-                            'restaurant_name': restaurant.name,
-                            'name': item.get('name', 'Unknown'),
-                            'description': item.get('description', ''),
-                            'price': item.get('price', 0),
-                            'category': item.get('category', ''),
-                        })
+            def fetch():
+                response = http_client.get(menu_api.api_url, headers=headers, timeout=5)
+                response.raise_for_status()  # counts against the partner's circuit breaker
+                return response.json()
+            
+            data = guarded_call(menu_api, fetch)
+            if isinstance(data, list):
+                for item in data[:50]:
+                    external_items.append({
+                        'source': 'external_api',
+                        'restaurant_id': str(restaurant.id),
+                        'restaurant_name': restaurant.name,
+                        'name': item.get('name', 'Unknown'),
+                        'description': item.get('description', ''),
+                        'price': item.get('price', 0),
+                        'category': item.get('category', ''),
+                    })
     except Exception as e:
         logger.warning(f"Failed to fetch external menu for {restaurant.name}: {e}")
     return external_items
 
 
-def get_all_menu_items(user_lat: Optional[float] = None, user_lng: Optional[float] = None) -> List[Dict[str, Any]]:
-    """Aggregate all menu items from database and external APIs."""
-    all_items = []
+def _external_menu_executor() -> ThreadPoolExecutor:
+    global _external_menu_pool
+    with _external_menu_pool_lock:
+        if _external_menu_pool is None:
+            _external_menu_pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'EXTERNAL_MENU_FETCH_WORKERS', 8),
+                thread_name_prefix='external-menu',
+            )
+        return _external_menu_pool
+
+
+def fetch_all_external_menu_items(restaurant_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetch the external menus of these restaurants concurrently.
+    Returns {restaurant_id: items} for the fetches that finished within
+    EXTERNAL_MENU_FETCH_DEADLINE seconds; the rest are logged and skipped.
+    """
+    if not restaurant_ids:
+        return {}
+    
+    # Resolve the API rows here so the pool threads never touch the database
+    menu_apis = (
+        RestaurantExternalAPI.objects.filter(restaurant_id__in=restaurant_ids, category='menu_api')
+        .select_related('restaurant')
+    )
+    executor = _external_menu_executor()
+    futures = {
+        executor.submit(fetch_external_menu_items, api.restaurant, api): api.restaurant
+        for api in menu_apis
+    }
     
-    restaurants = Restaurant.objects.prefetch_related('menu_items', 'cuisines', 'external_apis').all()
+    deadline = getattr(settings, 'EXTERNAL_MENU_FETCH_DEADLINE', 3.0)
+    done, not_done = wait(futures, timeout=deadline)
+    for future in not_done:
+        future.cancel()  # no-op once running; it finishes in the background
+        restaurant = futures[future]
+        logger.warning(f"External menu for {restaurant.name} missed the {deadline}s deadline")
     
-    for restaurant in restaurants:
-        cuisines = [c.name for c in restaurant.cuisines.all()]
-        
-        for item in restaurant.menu_items.filter(available=True):
-            categories = [c.name for c in item.category.all()]
-            all_items.append({
-                'source': 'database',
-                'restaurant_id': str(restaurant.id),
-                'restaurant_name': restaurant.name,
-                'restaurant_cuisines': cuisines,
-                'item_id': str(item.id),
-                'name': item.name,
-                'description': item.description,
-                'price': float(item.price),
-                'categories': categories,
-                'prep_time': item.prep_time,
-                'image_url': item.item_image.url if item.item_image else None,
-            })
-        
-        external_items = fetch_external_menu_items(restaurant)
-        all_items.extend(external_items)
+    return {str(futures[future].id): future.result() for future in done}
+
+
+def get_all_menu_items(user_lat: Optional[float] = None, user_lng: Optional[float] = None) -> Sequence[Dict[str, Any]]:
+    """
+    Aggregate all menu items from database and external APIs.
+    Normally this is the prebuilt menu digest as is; only external menus that
+    were never mirrored are fetched live and appended (as a LiveMenu).
+    """
+    digest = menu_digest.current()
+    if not digest.unsynced_restaurant_ids:
+        return digest.items
     
-    return all_items
+    external = fetch_all_external_menu_items(list(digest.unsynced_restaurant_ids))
+    live_items = []
+    for rid in digest.unsynced_restaurant_ids:
+        live_items.extend(external.get(rid, []))
+    return LiveMenu(digest, live_items)
+
+
+def menu_fingerprint(menu_items: Sequence[Dict[str, Any]]) -> Optional[str]:
+    """Recommendation cache key for get_all_menu_items() (None for other lists)."""
+    if isinstance(menu_items, LiveMenu):
+        return menu_items.fingerprint
+    digest = menu_digest.current()
+    return digest.fingerprint if menu_items is digest.items else None
+
+
+def _chef_zim_messages(mood, craving, day_type, weather, party_size, menu_text) -> List[Dict[str, str]]:
+    user_message = f"""Customer Context:
+- Mood: {mood}
+- Craving: {craving}
+- Day type: {day_type}
+- Weather: {weather}
+- Party size: {party_size}
+
+Available Menu Items:
+{menu_text}
+
+Based on this context, recommend the best dishes for this customer. Return your response as JSON."""
+    return [
+        {"role": "system", "content": CHEF_ZIM_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message}
+    ]
+
+
+def _enrich(rec: Dict[str, Any], dish_ids: Dict[str, int], candidates: List, lookup) -> Dict[str, Any]:
+    """Attach the menu item (ids, price, image) the model's recommendation refers to."""
+    rec = dict(rec)
+    index = dish_ids.get(str(rec.pop('dish_id', '')).strip().upper())
+    if index is not None:
+        item = candidates[index][0]
+    else:
+        item = lookup.find(rec.get('restaurant_name'), rec.get('dish_name'))
+    if item is None:
+        return rec
+    return {
+        **rec,
+        'dish_name': item.get('name'),
+        'restaurant_name': item.get('restaurant_name'),
+        'item_id': item.get('item_id'),
+        'restaurant_id': item.get('restaurant_id'),
+        'price': item.get('price'),
+        'image_url': item.get('image_url'),
+        'image_variants': item.get('image_variants'),
+        'source': item.get('source'),
+    }
 
 
 def generate_ai_recommendations(
@@ -97,9 +234,14 @@ def generate_ai_recommendations(
     day_type: str,
     weather: str,
     party_size: str,
-    menu_items: List[Dict[str, Any]]
+    menu_items: Sequence[Dict[str, Any]],
+    candidates: Optional[List] = None,
 ) -> Dict[str, Any]:
-    """Use OpenAI to generate personalized food recommendations."""
+    """
+    Use OpenAI to generate personalized food recommendations.
+    `candidates` are menu_retriever.candidates() for this context, when the
+    caller already has them.
+    """
     
     client = get_openai_client()
     if not client:
@@ -109,88 +251,32 @@ def generate_ai_recommendations(
             'recommendations': []
         }
     
-    menu_summary = []
-    for item in menu_items[:100]:
-        menu_summary.append({
-            'restaurant': item.get('restaurant_name'),
-            'dish': item.get('name'),
-            'description': item.get('description', '')[:100],
-            'price': item.get('price'),
-            'categories': item.get('categories', []),
-            'cuisines': item.get('restaurant_cuisines', []),
-        })
+    # Only the best-matching slice of the whole menu goes into the prompt
+    if candidates is None:
+        candidates = menu_retriever.candidates(menu_items, mood, craving, day_type, weather, party_size)
+    menu_text, dish_ids = encode_menu(
+        [summary for _, summary, _ in candidates],
+        max_tokens=getattr(settings, 'AI_PROMPT_MENU_TOKENS', DEFAULT_MENU_TOKENS),
+    )
+    lookup = menu_retriever.dish_lookup(menu_items)
     
-    system_prompt = """You are Chef Zim, a friendly AI food concierge for ZimFeast, a food delivery platform in Zimbabwe. 
-Your job is to recommend dishes based on the customer's mood, cravings, weather, and party size.
-
-You have access to the restaurant menus and should recommend specific dishes that match the customer's preferences.
-Always be warm, helpful, and make appetizing suggestions.
-
-IMPORTANT: You must respond with valid JSON only. No markdown, no extra text.
-The JSON must have this exact structure:
-{
-    "greeting": "A personalized greeting based on their mood and context",
-    "recommendations": [
-        {
-            "dish_name": "Name of the dish",
-            "restaurant_name": "Restaurant name",
-            "reason": "Why this dish is perfect for them",
-            "match_score": 95
-        }
-    ],
-    "closing": "A friendly closing message"
-}
-
-Recommend 3-5 dishes that best match the customer's needs. Consider:
-- Mood: comfort food for sad days, light food for energetic moods
-- Weather: warm soups for cold/rainy days, refreshing items for hot days
-- Party size: shareable dishes for groups, individual portions for solo diners
-- Day type: quick meals for workdays, leisurely options for weekends"""
-
-    user_message = f"""Customer Context:
-- Mood: {mood}
-- Craving: {craving}
-- Day type: {day_type}
-- Weather: {weather}
-- Party size: {party_size}
-
-Available Menu Items:
-{json.dumps(menu_summary, indent=2)}
-
-Based on this context, recommend the best dishes for this customer. Return your response as JSON."""
-
     try:
         response = client.chat.completions.create(
             model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
+            messages=_chef_zim_messages(mood, craving, day_type, weather, party_size, menu_text),
             response_format={"type": "json_object"},
             max_completion_tokens=2048
         )
         
         result = json.loads(response.choices[0].message.content)
         
-        enhanced_recommendations = []
-        for rec in result.get('recommendations', []):
-            for item in menu_items:
-                if (item.get('name', '').lower() == rec.get('dish_name', '').lower() and 
-                    item.get('restaurant_name', '').lower() == rec.get('restaurant_name', '').lower()):
-                    enhanced_recommendations.append({
-                        **rec,
-                        'item_id': item.get('item_id'),
-                        'restaurant_id': item.get('restaurant_id'),
-                        'price': item.get('price'),
-                        'image_url': item.get('image_url'),
-                        'source': item.get('source'),
-                    })
-                    break
-            else:
-                enhanced_recommendations.append(rec)
+        enhanced_recommendations = [
+            _enrich(rec, dish_ids, candidates, lookup) for rec in result.get('recommendations', [])
+        ]
         
         return {
             'success': True,
+            'engine': 'openai',
             'greeting': result.get('greeting', ''),
             'recommendations': enhanced_recommendations,
             'closing': result.get('closing', ''),
@@ -205,59 +291,258 @@ Based on this context, recommend the best dishes for this customer. Return your
         }
 
 
-def search_restaurants_and_items(query: str, user_lat: Optional[float] = None, user_lng: Optional[float] = None) -> Dict[str, Any]:
-    """Search across restaurants, cuisines, and menu items."""
-    query_lower = query.lower().strip()
+def _humanize(answer: str) -> str:
+    return str(answer or '').replace('_', ' ').strip().lower()
+
+
+def local_recommendations(
+    mood: str,
+    craving: str,
+    day_type: str,
+    weather: str,
+    party_size: str,
+    menu_items: Sequence[Dict[str, Any]],
+    candidates: Optional[List] = None,
+) -> Dict[str, Any]:
+    """
+    Deterministic recommendations without the model: the best retrieval
+    matches, one per restaurant, in the generate_ai_recommendations schema.
+    """
+    if candidates is None:
+        candidates = menu_retriever.candidates(menu_items, mood, craving, day_type, weather, party_size)
     
-    if not query_lower:
-        return {'restaurants': [], 'dishes': [], 'cuisines': []}
+    picks, seen = [], set()
+    for item, summary, score in candidates:
+        if item.get('restaurant_id') in seen:
+            continue
+        seen.add(item.get('restaurant_id'))
+        picks.append((item, summary, score))
+        if len(picks) >= LOCAL_RECOMMENDATIONS:
+            break
+    
+    best = picks[0][2] if picks and picks[0][2] > 0 else 1.0
+    recommendations = []
+    for item, summary, score in picks:
+        reasons = []
+        for answer in (craving, weather, mood, party_size, day_type):
+            words = matched_keywords(summary, answer)
+            if words:
+                reasons.append(f"{_humanize(answer)} ({', '.join(words[:2])})")
+        if reasons:
+            reason = "A good fit for " + " and ".join(reasons[:2]) + "."
+        else:
+            reason = f"A popular pick from {item.get('restaurant_name')}."
+        recommendations.append({
+            'dish_name': item.get('name'),
+            'restaurant_name': item.get('restaurant_name'),
+            'reason': reason,
+            'match_score': int(round(60 + 35 * max(score, 0.0) / best)),
+            'item_id': item.get('item_id'),
+            'restaurant_id': item.get('restaurant_id'),
+            'price': item.get('price'),
+            'image_url': item.get('image_url'),
+            'image_variants': item.get('image_variants'),
+            'source': item.get('source'),
+        })
+    
+    return {
+        'success': True,
+        'engine': 'local',
+        'greeting': LOCAL_GREETINGS.get(_humanize(mood), "Here are a few dishes picked for you."),
+        'recommendations': recommendations,
+        'closing': "Enjoy your meal!",
+    }
+
+
+def _ai_executor() -> ThreadPoolExecutor:
+    global _ai_pool
+    with _ai_pool_lock:
+        if _ai_pool is None:
+            _ai_pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'AI_RECOMMENDATION_WORKERS', 8),
+                thread_name_prefix='chef-zim',
+            )
+        return _ai_pool
+
+
+def recommend(
+    mood: str,
+    craving: str,
+    day_type: str,
+    weather: str,
+    party_size: str,
+    user_lat: Optional[float] = None,
+    user_lng: Optional[float] = None,
+    budget: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Chef Zim recommendations for a context, served from the recommendation
+    cache when the same (normalized) context was answered for the same menus.
     
-    restaurants = Restaurant.objects.filter(
-        Q(name__icontains=query_lower) |
-        Q(description__icontains=query_lower) |
-        Q(cuisines__name__icontains=query_lower)
-    ).distinct().prefetch_related('cuisines', 'menu_items')[:20]
+    On a miss the model is asked, but only waited on for `budget` seconds
+    (AI_RECOMMENDATION_BUDGET, default 2; 0 waits for it). Past the budget,
+    or when the model is unavailable, the local recommender answers instead;
+    a late model answer still lands in the cache for the next request.
+    """
+    menu_items = get_all_menu_items(user_lat, user_lng)
+    fingerprint = menu_fingerprint(menu_items)
+    context = normalize_context(mood, craving, day_type, weather, party_size, user_lat, user_lng)
     
-    cuisines = list(
-        Restaurant.objects.filter(cuisines__name__icontains=query_lower)
-        .values_list('cuisines__name', flat=True)
-        .distinct()[:10]
+    if fingerprint:
+        cached = recommendation_cache.get(fingerprint, context)
+        if cached is not None:
+            return cached
+    
+    # Retrieval runs here, in the request thread, so the pool never touches the database
+    candidates = menu_retriever.candidates(menu_items, mood, craving, day_type, weather, party_size)
+    
+    def remember(future):
+        result = None if future.cancelled() or future.exception() else future.result()
+        if fingerprint and result and result.get('success'):
+            recommendation_cache.set(fingerprint, context, result)
+    
+    future = _ai_executor().submit(
+        generate_ai_recommendations,
+        mood=mood,
+        craving=craving,
+        day_type=day_type,
+        weather=weather,
+        party_size=party_size,
+        menu_items=menu_items,
+        candidates=candidates,
     )
+    future.add_done_callback(remember)
     
-    dishes = MenuItem.objects.filter(
-        Q(name__icontains=query_lower) |
-        Q(description__icontains=query_lower) |
-        Q(category__name__icontains=query_lower),
-        available=True
-    ).select_related('restaurant').prefetch_related('category')[:30]
+    if budget is None:
+        budget = getattr(settings, 'AI_RECOMMENDATION_BUDGET', 2.0)
+    try:
+        result = future.result(timeout=budget or None)
+    except TimeoutError:
+        logger.info(f"Chef Zim model missed the {budget}s budget; answering locally")
+        result = None
+    except Exception as e:
+        logger.error(f"AI recommendation error: {e}")
+        result = None
     
-    restaurant_results = []
-    for r in restaurants:
-        restaurant_results.append({
-            'id': str(r.id),
-            'name': r.name,
-            'description': r.description[:100] if r.description else '',
-            'cuisines': [c.name for c in r.cuisines.all()],
-            'profile_image': r.profile_image.url if r.profile_image else None,
-            'est_delivery_time': r.est_delivery_time,
-            'minimum_order_price': float(r.minimum_order_price),
-        })
+    if result and result.get('success'):
+        return result
+    return local_recommendations(mood, craving, day_type, weather, party_size, menu_items, candidates)
+
+
+def _replay(result: Dict[str, Any], skip_greeting: bool = False) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    if not skip_greeting:
+        yield 'greeting', {'greeting': result.get('greeting', '')}
+    for rec in result.get('recommendations', []):
+        yield 'recommendation', rec
+    yield 'closing', {'closing': result.get('closing', '')}
+    yield 'done', {'success': True, 'engine': result.get('engine')}
+
+
+def stream_recommendations(
+    mood: str,
+    craving: str,
+    day_type: str,
+    weather: str,
+    party_size: str,
+    user_lat: Optional[float] = None,
+    user_lng: Optional[float] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of recommend(): (event, data) pairs - greeting, then each
+    recommendation (already enriched), closing and done - sent as soon as they
+    can be parsed from the streamed completion. If the completion breaks off
+    after some recommendations were sent, the last event is an error marked
+    partial instead of done, and nothing is cached.
     
-    dish_results = []
-    for d in dishes:
-        dish_results.append({
-            'id': str(d.id),
-            'name': d.name,
-            'description': d.description[:100] if d.description else '',
-            'price': float(d.price),
-            'categories': [c.name for c in d.category.all()],
-            'restaurant_id': str(d.restaurant.id),
-            'restaurant_name': d.restaurant.name,
-            'image_url': d.item_image.url if d.item_image else None,
-        })
+    Menu lookups happen here, before the first event; the returned generator
+    only talks to the model. Cache hits and the local fallback are replayed
+    in the same event shape.
+    """
+    menu_items = get_all_menu_items(user_lat, user_lng)
+    fingerprint = menu_fingerprint(menu_items)
+    context = normalize_context(mood, craving, day_type, weather, party_size, user_lat, user_lng)
+    
+    cached = recommendation_cache.get(fingerprint, context) if fingerprint else None
+    if cached is not None:
+        return _replay(cached)
+    
+    candidates = menu_retriever.candidates(menu_items, mood, craving, day_type, weather, party_size)
+    menu_text, dish_ids = encode_menu(
+        [summary for _, summary, _ in candidates],
+        max_tokens=getattr(settings, 'AI_PROMPT_MENU_TOKENS', DEFAULT_MENU_TOKENS),
+    )
+    lookup = menu_retriever.dish_lookup(menu_items)
+    
+    def local(skip_greeting=False):
+        result = local_recommendations(mood, craving, day_type, weather, party_size, menu_items, candidates)
+        return _replay(result, skip_greeting=skip_greeting)
+    
+    client = get_openai_client()
+    if not client:
+        return local()
+    
+    def events():
+        scanner = StreamingAnswerScanner()
+        answer = {'success': True, 'engine': 'openai', 'greeting': '', 'recommendations': [], 'closing': ''}
+        failed = False
+        try:
+            stream = client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=_chef_zim_messages(mood, craving, day_type, weather, party_size, menu_text),
+                response_format={"type": "json_object"},
+                max_completion_tokens=2048,
+                stream=True,
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                for kind, value in scanner.feed(chunk.choices[0].delta.content or ''):
+                    if kind == 'recommendation':
+                        rec = _enrich(value, dish_ids, candidates, lookup)
+                        answer['recommendations'].append(rec)
+                        yield 'recommendation', rec
+                    else:
+                        answer[kind] = value
+                        yield kind, {kind: value}
+        except Exception as e:
+            logger.error(f"AI recommendation stream error: {e}")
+            failed = True
+        
+        if not answer['recommendations']:
+            yield from local(skip_greeting=bool(answer['greeting']))
+            return
+        if failed or 'closing' not in scanner.emitted:
+            # cut off midway: what was sent stands, but it is not a full answer
+            # and must not be cached
+            yield 'error', {
+                'success': False,
+                'engine': 'openai',
+                'partial': True,
+                'error': 'The recommendation stream ended early',
+            }
+            return
+        yield 'done', {'success': True, 'engine': 'openai'}
+        if fingerprint:
+            recommendation_cache.set(fingerprint, context, answer)
+    
+    return events()
+
+
+def search_restaurants_and_items(query: str, user_lat: Optional[float] = None, user_lng: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Search across restaurants, cuisines, and menu items.
+    With a user location, restaurants and dishes are ranked by text relevance
+    blended with distance, and carry a distance_km.
+    """
+    query_lower = query.lower().strip()
+    
+    if not query_lower:
+        return {'restaurants': [], 'dishes': [], 'cuisines': []}
+    
+    hits = search_index.search(query_lower)
     
     return {
-        'restaurants': restaurant_results,
-        'dishes': dish_results,
-        'cuisines': cuisines,
+        'restaurants': rank_hits(hits[RESTAURANT], 20, user_lat, user_lng),
+        'dishes': rank_hits(hits[DISH], 30, user_lat, user_lng),
+        'cuisines': [hit.payload for hit in hits[CUISINE][:10]],
     }
@@ -0,0 +1,296 @@
+"""
+In-memory prefix autocomplete over restaurant, dish and cuisine names.
+
+Every name is stored in a sorted array under each of its word suffixes
+("chicken pizza" and "pizza"), so a prefix lookup is a bisect plus a scan of
+the matching range. The top suggestions for each prefix, ordered by
+popularity (how often a dish has been ordered), are cached and dropped only
+for the prefixes a change touches.
+
+Names come from the catalog snapshot (restaurants/catalog.py), which the
+model signals keep current, and popularity is reloaded from the orders every
+AUTOCOMPLETE_POPULARITY_INTERVAL seconds. Both reloads run on a background
+thread that a lookup starts when one is due: a popularity reload builds a
+complete new index and swaps it in, a catalog change re-indexes only the
+restaurants whose entry changed. Keystrokes never wait for the database,
+except the first lookup in a process, which has nothing to serve yet.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+
+from .catalog import DEFAULT_RECHECK_INTERVAL, CatalogTracker, restaurant_catalog
+from .search_index import tokenize
+
+DEFAULT_TOP_K = 20
+DEFAULT_MAX_CACHED_PREFIXES = 20000
+DEFAULT_POPULARITY_INTERVAL = 600  # seconds
+
+logger = logging.getLogger(__name__)
+
+RESTAURANT = "restaurant"
+DISH = "dish"
+CUISINE = "cuisine"
+
+
+def normalize(text: Optional[str]) -> str:
+    return " ".join(tokenize(text))
+
+
+def load_popularity() -> Counter:
+    """Number of placed orders containing each menu item, keyed by item id."""
+    from orders.models import OrderItem
+
+    rows = (
+        OrderItem.objects.filter(order__isnull=False)
+        .exclude(order__status__in=("pending_payment", "cancelled"))
+        .values("menu_item_id")
+        .annotate(orders=Count("id"))
+        .values_list("menu_item_id", "orders")
+    )
+    return Counter({str(item_id): count for item_id, count in rows})
+
+
+class _Suggestion:
+    __slots__ = ("key", "name", "popularity", "payload", "prefixes")
+
+    def __init__(self, key, name, popularity, payload, prefixes):
+        self.key = key
+        self.name = name
+        self.popularity = popularity
+        self.payload = payload
+        self.prefixes = prefixes
+
+
+# What a full rebuild replaces
+_INDEX_STATE = (
+    "_prefix_array", "_suggestions", "_top", "_restaurant_keys",
+    "_restaurant_cuisines", "_cuisine_refs", "_popularity",
+)
+
+
+class AutocompleteIndex:
+    def __init__(
+        self,
+        top_k: int = DEFAULT_TOP_K,
+        max_cached_prefixes: int = DEFAULT_MAX_CACHED_PREFIXES,
+        popularity_interval: float = DEFAULT_POPULARITY_INTERVAL,
+        recheck_interval: float = DEFAULT_RECHECK_INTERVAL,
+    ):
+        self.top_k = top_k
+        self.max_cached_prefixes = max_cached_prefixes
+        self.popularity_interval = popularity_interval
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()  # held while a reload is running
+        self._catalog = CatalogTracker(restaurant_catalog, recheck_interval)
+        self._prefix_array: List[Tuple[str, tuple]] = []
+        self._suggestions: Dict[tuple, _Suggestion] = {}
+        self._top: Dict[str, List[tuple]] = {}
+        self._restaurant_keys: Dict[str, List[tuple]] = {}
+        self._restaurant_cuisines: Dict[str, List[Tuple[str, int]]] = {}
+        self._cuisine_refs: Counter = Counter()
+        self._bulk_loading = False
+        self._popularity: Counter = Counter()
+        self._popularity_loaded_at: Optional[float] = None
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def suggest(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self.refresh()
+        with self._lock:
+            top = self._top.get(prefix)
+            if top is None:
+                top = self._compute_top(prefix)
+                if len(self._top) >= self.max_cached_prefixes:
+                    self._top.clear()
+                self._top[prefix] = top
+            return [self._suggestions[key].payload for key in top[:limit]]
+
+    def _compute_top(self, prefix: str) -> List[tuple]:
+        pos = bisect.bisect_left(self._prefix_array, (prefix,))
+        matched = set()
+        while pos < len(self._prefix_array):
+            text, key = self._prefix_array[pos]
+            if not text.startswith(prefix):
+                break
+            matched.add(key)
+            pos += 1
+        best = heapq.nsmallest(
+            self.top_k,
+            (self._suggestions[key] for key in matched),
+            key=lambda s: (-s.popularity, len(s.name), s.name, s.key),
+        )
+        return [s.key for s in best]
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def refresh(self):
+        """Start a background reload if one is due (the first call in a process waits for it)."""
+        restaurant_catalog.sync()
+        if self._popularity_loaded_at is None:
+            with self._reload_lock:
+                if self._popularity_loaded_at is None:
+                    self._reload()
+            return
+        if self._due(time.monotonic()) and self._reload_lock.acquire(blocking=False):
+            threading.Thread(target=self._reload_in_background, name="autocomplete-reload", daemon=True).start()
+
+    def _due(self, now: float) -> bool:
+        return (
+            now - self._popularity_loaded_at > self.popularity_interval
+            or self._catalog.due(now)
+        )
+
+    def _reload_in_background(self):
+        close_old_connections()
+        try:
+            self._reload()
+        except Exception:
+            logger.exception("Autocomplete reload failed")
+        finally:
+            close_old_connections()
+            self._reload_lock.release()
+
+    def _reload(self):
+        """Read popularity (when due) and the catalog, then swap the result in."""
+        now = time.monotonic()
+        reload_popularity = (
+            self._popularity_loaded_at is None
+            or now - self._popularity_loaded_at > self.popularity_interval
+        )
+        popularity = load_popularity() if reload_popularity else None
+        diff = self._catalog.diff()
+
+        if popularity is not None:
+            # Every score may have moved: build a new index, sorting once
+            fresh = AutocompleteIndex(top_k=self.top_k, max_cached_prefixes=self.max_cached_prefixes)
+            fresh._popularity = popularity
+            fresh._bulk_loading = True
+            for entry in diff.entries:
+                fresh._add_restaurant(entry.restaurant["id"], entry)
+            fresh._bulk_loading = False
+            fresh._prefix_array.sort()
+            with self._lock:
+                for name in _INDEX_STATE:
+                    setattr(self, name, getattr(fresh, name))
+                self._popularity_loaded_at = now
+                # Everything was re-indexed, not only the changed entries
+                diff.changed = diff.entries
+                self._catalog.record(diff, now)
+            return
+
+        with self._lock:
+            for rid in diff.removed:
+                self._remove_restaurant(rid)
+            for entry in diff.changed:
+                rid = entry.restaurant["id"]
+                self._remove_restaurant(rid)
+                self._add_restaurant(rid, entry)
+            self._catalog.record(diff, now)
+
+    def _add_restaurant(self, rid: str, entry):
+        data = entry.restaurant
+        keys = []
+        total = 0
+        for item in entry.menu_items:
+            popularity = self._popularity.get(item["item_id"], 0)
+            total += popularity
+            key = (DISH, item["item_id"])
+            self._add(key, item["name"], popularity, {
+                'type': DISH,
+                'id': item["item_id"],
+                'name': item["name"],
+                'restaurant_id': rid,
+                'restaurant_name': data["name"],
+            })
+            keys.append(key)
+
+        key = (RESTAURANT, rid)
+        self._add(key, data["name"], total, {
+            'type': RESTAURANT,
+            'id': rid,
+            'name': data["name"],
+        })
+        keys.append(key)
+
+        cuisines = []
+        for cuisine in data.get("cuisines", []):
+            name = cuisine["name"]
+            self._cuisine_refs[name] += 1
+            key = (CUISINE, name)
+            if self._cuisine_refs[name] == 1:
+                self._add(key, name, total, {'type': CUISINE, 'id': cuisine["id"], 'name': name})
+            else:
+                self._bump(key, total)
+            cuisines.append((name, total))
+
+        self._restaurant_keys[rid] = keys
+        self._restaurant_cuisines[rid] = cuisines
+
+    def _remove_restaurant(self, rid: str):
+        for key in self._restaurant_keys.pop(rid, []):
+            self._remove(key)
+        for name, total in self._restaurant_cuisines.pop(rid, []):
+            self._cuisine_refs[name] -= 1
+            if self._cuisine_refs[name] <= 0:
+                del self._cuisine_refs[name]
+                self._remove((CUISINE, name))
+            else:
+                self._bump((CUISINE, name), -total)
+
+    def _add(self, key: tuple, name: str, popularity: int, payload: Dict[str, Any]):
+        words = tokenize(name)
+        prefixes = [" ".join(words[i:]) for i in range(len(words))]
+        self._suggestions[key] = _Suggestion(key, normalize(name), popularity, payload, prefixes)
+        if self._bulk_loading:
+            self._prefix_array.extend((text, key) for text in prefixes)
+            return
+        for text in prefixes:
+            bisect.insort(self._prefix_array, (text, key))
+        self._forget_tops(prefixes)
+
+    def _remove(self, key: tuple):
+        suggestion = self._suggestions.pop(key, None)
+        if suggestion is None:
+            return
+        for text in suggestion.prefixes:
+            pos = bisect.bisect_left(self._prefix_array, (text, key))
+            if pos < len(self._prefix_array) and self._prefix_array[pos] == (text, key):
+                del self._prefix_array[pos]
+        self._forget_tops(suggestion.prefixes)
+
+    def _bump(self, key: tuple, delta: int):
+        suggestion = self._suggestions.get(key)
+        if suggestion is not None and delta:
+            suggestion.popularity += delta
+            self._forget_tops(suggestion.prefixes)
+
+    def _forget_tops(self, texts: List[str]):
+        if not self._top:
+            return
+        for text in texts:
+            for end in range(1, len(text) + 1):
+                self._top.pop(text[:end], None)
+
+
+autocomplete_index = AutocompleteIndex(
+    top_k=getattr(settings, "AUTOCOMPLETE_TOP_K", DEFAULT_TOP_K),
+    max_cached_prefixes=getattr(settings, "AUTOCOMPLETE_MAX_CACHED_PREFIXES", DEFAULT_MAX_CACHED_PREFIXES),
+    popularity_interval=getattr(settings, "AUTOCOMPLETE_POPULARITY_INTERVAL", DEFAULT_POPULARITY_INTERVAL),
+    recheck_interval=getattr(settings, "AUTOCOMPLETE_RECHECK_INTERVAL", DEFAULT_RECHECK_INTERVAL),
+)
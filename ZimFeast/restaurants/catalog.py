@@ -0,0 +1,422 @@
+"""
+Process-local snapshot of the restaurant catalog (restaurants, cuisines, menus).
+
+Browsing endpoints and Chef Zim read restaurants from here instead of rebuilding
+the same restaurant/cuisine/menu graph from the database on every request.
+Entries are built lazily per restaurant and dropped by model signals
+(see restaurants/signals.py).
+
+Invalidations are also recorded in Redis so other Daphne workers drop the same
+entries: `catalog:version` is a counter bumped on every change and
+`catalog:changelog` is a sorted set of restaurant ids (or "*" for everything,
+"ids" for the set of restaurants) scored by the version at which they last
+changed. Both are written in one MULTI transaction, and only the last
+CATALOG_CHANGELOG_VERSIONS versions are kept; a worker further behind than
+that drops everything. When Redis is unavailable entries simply expire after
+CATALOG_LOCAL_TTL seconds. Other per-process indexes keyed by restaurant (the
+grid in geo_index.py) follow the same changes through add_listener().
+
+Indexes derived from the entries themselves (search, autocomplete, the menu
+digest) keep a CatalogTracker: it remembers which entry each restaurant was
+indexed from and hands back only the entries that changed since.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+
+from .images import variant_urls
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "catalog:version"
+CHANGES_KEY = "catalog:changelog"
+ALL = "*"
+MEMBERSHIP = "ids"
+
+DEFAULT_SYNC_INTERVAL = 1.0  # seconds between Redis version checks
+DEFAULT_LOCAL_TTL = 60  # seconds an entry lives when Redis is unavailable
+DEFAULT_CHANGELOG_VERSIONS = 10000  # versions of history kept in CHANGES_KEY
+DEFAULT_RECHECK_INTERVAL = 60  # seconds between full diffs in a CatalogTracker
+BUILD_CHUNK_SIZE = 500
+
+
+def normalize_restaurant_id(restaurant_id) -> Optional[str]:
+    """Return the canonical string form of a restaurant id, or None if it is not a UUID."""
+    try:
+        return str(uuid.UUID(str(restaurant_id)))
+    except (TypeError, ValueError):
+        return None
+
+
+class CatalogEntry:
+    """Everything the read paths need for one restaurant."""
+
+    __slots__ = ("restaurant", "menu_items", "etag", "built_at")
+
+    def __init__(self, restaurant: Dict[str, Any], menu_items: List[Dict[str, Any]], menu_version: int = 0):
+        self.restaurant = restaurant  # RestaurantSerializer output
+        self.menu_items = menu_items  # available items in the ai_service shape
+        # Same data gives the same tag on every worker
+        digest = hashlib.sha1(json.dumps(restaurant, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        self.etag = f"{restaurant['id']}-{menu_version}-{digest[:16]}"
+        self.built_at = time.monotonic()
+
+
+class RestaurantCatalog:
+    def __init__(
+        self,
+        sync_interval: float = DEFAULT_SYNC_INTERVAL,
+        local_ttl: float = DEFAULT_LOCAL_TTL,
+        changelog_versions: int = DEFAULT_CHANGELOG_VERSIONS,
+    ):
+        self.sync_interval = sync_interval
+        self.local_ttl = local_ttl
+        self.changelog_versions = changelog_versions
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._ids: Optional[List[str]] = None  # restaurant ids in listing order
+        # generation of the last drop, per key / of everything / of the id list:
+        # a build that started before it must not install what it read
+        self._dropped_at: Dict[str, int] = {}
+        self._cleared_at = 0
+        self._ids_dropped_at = 0
+        self._lock = threading.RLock()
+        self._seen_version: Optional[int] = None
+        self._last_sync = 0.0
+        # Bumped whenever entries are built or dropped, so derived indexes know to re-check
+        self.generation = 0
+        self._listeners: List[Callable[[Optional[List[str]]], None]] = []
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get(self, restaurant_id) -> Optional[CatalogEntry]:
+        """Return the entry for one restaurant, building it on a miss. None if it does not exist."""
+        key = normalize_restaurant_id(restaurant_id)
+        if key is None:
+            return None
+        self.sync()
+        entry = self._fresh_entry(key)
+        if entry is None:
+            entry = self._build([key]).get(key)
+        return entry
+
+    def get_many(self, restaurant_ids) -> Dict[str, CatalogEntry]:
+        """Return entries keyed by canonical id, building all misses in one batch."""
+        self.sync()
+        keys = [key for key in map(normalize_restaurant_id, restaurant_ids) if key]
+        return self._collect(keys)
+
+    def all(self) -> List[CatalogEntry]:
+        """Return every restaurant entry in listing order."""
+        self.sync()
+        return list(self._collect(self._restaurant_ids()).values())
+
+    def list_restaurants(self) -> List[Dict[str, Any]]:
+        return [entry.restaurant for entry in self.all()]
+
+    def get_restaurant(self, restaurant_id) -> Optional[Dict[str, Any]]:
+        entry = self.get(restaurant_id)
+        return entry.restaurant if entry else None
+
+    def menu_items(self) -> List[Dict[str, Any]]:
+        """Available database menu items across every restaurant."""
+        items = []
+        for entry in self.all():
+            items.extend(entry.menu_items)
+        return items
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def invalidate(self, restaurant_id=None, membership_changed: bool = False, broadcast: bool = True):
+        """
+        Drop one restaurant's entry (or everything when restaurant_id is None).
+        membership_changed signals a restaurant was created or deleted.
+        """
+        if restaurant_id is None:
+            self._drop(None)
+            if broadcast:
+                self._publish([ALL])
+            return
+        self.invalidate_many([restaurant_id], membership_changed=membership_changed, broadcast=broadcast)
+
+    def invalidate_many(self, restaurant_ids, membership_changed: bool = False, broadcast: bool = True):
+        keys = [key for key in map(normalize_restaurant_id, restaurant_ids) if key]
+        if not keys:
+            return
+        for key in keys:
+            self._drop(key, membership_changed)
+        if broadcast:
+            self._publish(keys + ([MEMBERSHIP] if membership_changed else []))
+
+    def add_listener(self, callback: Callable[[Optional[List[str]]], None]):
+        """
+        Call callback(restaurant_ids) with the ids other workers changed, as
+        sync() applies them (None when everything has to be dropped).
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, restaurant_ids: Optional[List[str]]):
+        for callback in self._listeners:
+            try:
+                callback(restaurant_ids)
+            except Exception:
+                logger.exception("Catalog change listener failed")
+
+    def _drop(self, key: Optional[str], membership_changed: bool = False):
+        with self._lock:
+            self.generation += 1
+            if key is None:
+                self._entries = {}
+                self._ids = None
+                self._dropped_at = {}
+                self._cleared_at = self._ids_dropped_at = self.generation
+                return
+            self._entries.pop(key, None)
+            self._dropped_at[key] = self.generation
+            if membership_changed:
+                self._drop_ids()
+
+    def _drop_ids(self):
+        with self._lock:
+            self.generation += 1
+            self._ids = None
+            self._ids_dropped_at = self.generation
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _fresh_entry(self, key: str) -> Optional[CatalogEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._redis() is None and time.monotonic() - entry.built_at > self.local_ttl:
+            return None
+        return entry
+
+    def _collect(self, keys: List[str]) -> Dict[str, CatalogEntry]:
+        """Entries for these keys in order, building the misses in one batch."""
+        entries = {}
+        missing = []
+        for key in keys:
+            entry = self._fresh_entry(key)
+            if entry is None:
+                missing.append(key)
+            else:
+                entries[key] = entry
+        if missing:
+            entries.update(self._build(missing))
+        return {key: entries[key] for key in keys if key in entries}
+
+    def _restaurant_ids(self) -> List[str]:
+        from .models import Restaurant
+
+        ids = self._ids
+        if ids is None:
+            started = self.generation
+            ids = [str(rid) for rid in Restaurant.objects.values_list("id", flat=True)]
+            with self._lock:
+                if self._ids_dropped_at <= started:
+                    self._ids = ids
+        return ids
+
+    def _build(self, keys: List[str]) -> Dict[str, CatalogEntry]:
+        """
+        Build entries for these keys and return them. Keys dropped while the
+        queries ran are returned to this caller but not cached, so a stale
+        read never outlives the invalidation that raced it.
+        """
+        from .models import Restaurant
+        from .serializers import RestaurantSerializer
+
+        result = {}
+        for start in range(0, len(keys), BUILD_CHUNK_SIZE):
+            chunk = keys[start:start + BUILD_CHUNK_SIZE]
+            restaurants = (
+                Restaurant.objects.filter(id__in=chunk)
+                .select_related("dashboard")
+                .prefetch_related("cuisines", "external_apis", "menu_items__category")
+            )
+            started = self.generation
+            built = {}
+            for restaurant in restaurants:
+                data = dict(RestaurantSerializer(restaurant).data)
+                built[str(restaurant.id)] = CatalogEntry(
+                    data, self._menu_items_for(restaurant), restaurant.menu_version
+                )
+            with self._lock:
+                if self._cleared_at <= started:
+                    self._entries.update(
+                        (key, entry) for key, entry in built.items()
+                        if self._dropped_at.get(key, 0) <= started
+                    )
+                self.generation += 1
+            result.update(built)
+        return result
+
+    @staticmethod
+    def _menu_items_for(restaurant) -> List[Dict[str, Any]]:
+        cuisines = [c.name for c in restaurant.cuisines.all()]
+        items = []
+        for item in restaurant.menu_items.all():
+            if not item.available:
+                continue
+            items.append({
+                'source': 'database',
+                'restaurant_id': str(restaurant.id),
+                'restaurant_name': restaurant.name,
+                'restaurant_cuisines': cuisines,
+                'item_id': str(item.id),
+                'name': item.name,
+                'description': item.description,
+                'price': float(item.price),
+                'categories': [c.name for c in item.category.all()],
+                'prep_time': item.prep_time,
+                'image_url': item.item_image.url if item.item_image else None,
+                'image_variants': variant_urls(item.item_image, item.item_image_variants),
+            })
+        return items
+
+    @staticmethod
+    def _redis():
+        from realtime.redis_publisher import publisher
+
+        return publisher.redis_client if publisher.connected else None
+
+    def _publish(self, fields: List[str]):
+        client = self._redis()
+        if client is None:
+            return
+        def record(pipe):
+            # WATCH/MULTI: readers see the new version and its changes together
+            version = int(pipe.get(VERSION_KEY) or 0) + 1
+            pipe.multi()
+            pipe.set(VERSION_KEY, version)
+            pipe.zadd(CHANGES_KEY, {field: version for field in fields})
+            pipe.zremrangebyscore(CHANGES_KEY, "-inf", version - self.changelog_versions)
+            return version
+
+        try:
+            version = client.transaction(record, VERSION_KEY, value_from_callable=True)
+            with self._lock:
+                # Our own change is already applied locally
+                if self._seen_version == version - 1:
+                    self._seen_version = version
+        except Exception as e:
+            logger.warning("Catalog invalidation broadcast failed: %s", e)
+
+    def sync(self):
+        """Apply invalidations published by other workers since the last check."""
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            remote = int(client.get(VERSION_KEY) or 0)
+            seen = self._seen_version
+            if seen is None or remote < seen or remote - seen > self.changelog_versions:
+                # First sync, Redis was reset, or we are further behind than the
+                # changelog reaches: nothing local can be trusted to be current
+                if seen is not None:
+                    self._drop(None)
+                    self._notify(None)
+                self._seen_version = remote
+                return
+            if remote == seen:
+                return
+            changes = client.zrangebyscore(CHANGES_KEY, seen + 1, "+inf")
+        except Exception as e:
+            logger.warning("Catalog version check failed: %s", e)
+            return
+
+        changed: Optional[List[str]] = []
+        for field in changes:
+            field = field.decode() if isinstance(field, bytes) else field
+            if field == ALL:
+                self._drop(None)
+                changed = None
+            elif field == MEMBERSHIP:
+                self._drop_ids()
+            else:
+                self._drop(field)
+                if changed is not None:
+                    changed.append(field)
+        self._seen_version = remote
+        if changed is None or changed:
+            self._notify(changed)
+
+
+class CatalogDiff:
+    """The catalog as a CatalogTracker last compared it."""
+
+    __slots__ = ("generation", "order", "entries", "changed", "removed")
+
+    def __init__(self, generation: int, entries: List[CatalogEntry], changed: List[CatalogEntry], removed: List[str]):
+        self.generation = generation  # catalog generation read before the entries
+        self.order = [entry.restaurant["id"] for entry in entries]  # restaurant ids in listing order
+        self.entries = entries
+        self.changed = changed  # entries not indexed yet (new or rebuilt)
+        self.removed = removed  # indexed restaurant ids no longer in the catalog
+
+    def __bool__(self) -> bool:
+        return bool(self.changed or self.removed)
+
+
+class CatalogTracker:
+    """
+    Bookkeeping for a per-process index derived from catalog entries.
+
+    Entries are immutable and replaced on every change, so an entry that is
+    not the one a restaurant was indexed from means it changed. due() says
+    whether to look again: the catalog generation moved, or recheck_interval
+    seconds passed (entries can also be rebuilt after expiring, without a
+    signal). diff() lists the changes; record() marks them applied.
+    """
+
+    def __init__(self, catalog: "RestaurantCatalog", recheck_interval: float = DEFAULT_RECHECK_INTERVAL):
+        self.catalog = catalog
+        self.recheck_interval = recheck_interval
+        self.indexed: Dict[str, CatalogEntry] = {}  # restaurant id -> entry it was indexed from
+        self.generation: Optional[int] = None
+        self.last_full_check = 0.0
+
+    def due(self, now: Optional[float] = None) -> bool:
+        self.catalog.sync()
+        now = time.monotonic() if now is None else now
+        return self.catalog.generation != self.generation or now - self.last_full_check >= self.recheck_interval
+
+    def diff(self) -> CatalogDiff:
+        generation = self.catalog.generation
+        entries = self.catalog.all()
+        current = {entry.restaurant["id"] for entry in entries}
+        changed = [entry for entry in entries if self.indexed.get(entry.restaurant["id"]) is not entry]
+        removed = [rid for rid in self.indexed if rid not in current]
+        return CatalogDiff(generation, entries, changed, removed)
+
+    def record(self, diff: CatalogDiff, now: Optional[float] = None):
+        for rid in diff.removed:
+            self.indexed.pop(rid, None)
+        for entry in diff.changed:
+            self.indexed[entry.restaurant["id"]] = entry
+        self.generation = diff.generation
+        self.last_full_check = time.monotonic() if now is None else now
+
+
+restaurant_catalog = RestaurantCatalog(
+    sync_interval=getattr(settings, "CATALOG_SYNC_INTERVAL", DEFAULT_SYNC_INTERVAL),
+    local_ttl=getattr(settings, "CATALOG_LOCAL_TTL", DEFAULT_LOCAL_TTL),
+    changelog_versions=getattr(settings, "CATALOG_CHANGELOG_VERSIONS", DEFAULT_CHANGELOG_VERSIONS),
+)
@@ -23,3 +23,6 @@ class RestaurantDashboardConsumer(AsyncWebsocketConsumer):
     # Receive message from group
     async def restaurant_dashboard_update(self, event):
         await self.send(text_data=json.dumps(event["dashboard_data"]))
+
+    async def restaurant_menu_availability(self, event):
+        await self.send(text_data=json.dumps({"type": "menu_availability", **event["availability"]}))
@@ -0,0 +1,139 @@
+"""
+Response cache for restaurant-provided external APIs (RestaurantExternalAPI).
+
+Partner POS backends can take seconds to answer, so their JSON responses are
+cached per (api_url, credentials, normalized query params):
+
+* younger than EXTERNAL_API_CACHE_TTL seconds: served as is;
+* older, but younger than EXTERNAL_API_CACHE_TTL + EXTERNAL_API_CACHE_STALE:
+  served immediately while one background thread refreshes it;
+* older than that, or missing: fetched in the request. Concurrent misses for
+  the same key wait on a single upstream call instead of each making their own.
+
+Failed fetches are not cached; a failed background refresh keeps serving the
+stale copy until it ages out.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60  # seconds
+DEFAULT_STALE = 600  # seconds a stale copy may still be served while refreshing
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_REFRESH_WORKERS = 4
+
+
+def cache_key(api_url: str, params=None, api_key: Optional[str] = None) -> tuple:
+    """(url, credentials digest, params) with params order-insensitive and multi-value aware."""
+    if params is None:
+        normalized = ()
+    elif hasattr(params, "getlist"):
+        normalized = tuple(sorted((k, tuple(params.getlist(k))) for k in params))
+    else:
+        normalized = tuple(sorted(
+            (k, tuple(v) if isinstance(v, (list, tuple)) else (v,)) for k, v in params.items()
+        ))
+    credentials = hashlib.sha1(api_key.encode("utf-8")).hexdigest() if api_key else ""
+    return (api_url, credentials, normalized)
+
+
+class _CachedResponse:
+    __slots__ = ("data", "fetched_at")
+
+    def __init__(self, data):
+        self.data = data
+        self.fetched_at = time.monotonic()
+
+
+class ExternalResponseCache:
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        stale: float = DEFAULT_STALE,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        refresh_workers: int = DEFAULT_REFRESH_WORKERS,
+    ):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self.refresh_workers = refresh_workers
+        self._entries: "OrderedDict[tuple, _CachedResponse]" = OrderedDict()
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def get(self, key: tuple, fetch: Callable[[], Any]) -> Any:
+        """Return the cached response for key, calling fetch() when it has to."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.fetched_at
+                if age <= self.ttl:
+                    self._entries.move_to_end(key)
+                    return entry.data
+                if age <= self.ttl + self.stale:
+                    self._entries.move_to_end(key)
+                    if key not in self._inflight:
+                        self._inflight[key] = Future()
+                        self._refresher().submit(self._load, key, fetch)
+                    return entry.data
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if leader:
+            self._load(key, fetch)
+        return future.result()
+
+    def _load(self, key: tuple, fetch: Callable[[], Any]):
+        future = self._inflight[key]
+        try:
+            data = fetch()
+        except Exception as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+                stale = key in self._entries
+            if stale:
+                logger.warning("Background refresh failed for %s: %s", key[0], exc)
+            future.set_exception(exc)
+            return
+
+        with self._lock:
+            self._entries[key] = _CachedResponse(data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(data)
+
+    def _refresher(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.refresh_workers, thread_name_prefix="external-api-refresh"
+            )
+        return self._executor
+
+    def invalidate(self, api_url: Optional[str] = None):
+        """Forget cached responses for one API url (None = all)."""
+        with self._lock:
+            if api_url is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == api_url]:
+                del self._entries[key]
+
+
+external_api_cache = ExternalResponseCache(
+    ttl=getattr(settings, "EXTERNAL_API_CACHE_TTL", DEFAULT_TTL),
+    stale=getattr(settings, "EXTERNAL_API_CACHE_STALE", DEFAULT_STALE),
+    max_entries=getattr(settings, "EXTERNAL_API_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+)
@@ -0,0 +1,222 @@
+"""
+In-process spatial grid index over Restaurant coordinates.
+
+Restaurants are bucketed into fixed-size lat/lng cells so radius queries only
+look at the handful of cells overlapping the search area instead of every row.
+The index is kept up to date by the Restaurant post_save/post_delete signals
+(see restaurants/signals.py). Saves on other workers arrive through the
+catalog's Redis change log (restaurants/catalog.py): the restaurants it names
+are re-read on the next query. A periodic full rebuild covers anything else,
+and saves that land while a rebuild is reading the table are replayed on top
+of what it read, so they are not lost when it swaps in.
+"""
+import math
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from .catalog import restaurant_catalog
+
+KM_PER_DEG_LAT = 111.32
+
+# ~5.5 km per cell at Zimbabwe's latitudes: a 10 km radius touches ~25 cells
+DEFAULT_CELL_SIZE_DEG = 0.05
+DEFAULT_REBUILD_INTERVAL = 300  # seconds
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lng, max_lng) enclosing a radius around a point."""
+    lat_delta = radius_km / KM_PER_DEG_LAT
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6:
+        lng_delta = 180.0
+    else:
+        lng_delta = min(180.0, radius_km / (KM_PER_DEG_LAT * cos_lat))
+    return (
+        max(-90.0, lat - lat_delta),
+        min(90.0, lat + lat_delta),
+        lng - lng_delta,
+        lng + lng_delta,
+    )
+
+
+class RestaurantGridIndex:
+    """Fixed-size grid cells mapping to the restaurant ids located inside them."""
+
+    def __init__(
+        self,
+        cell_size_deg: float = DEFAULT_CELL_SIZE_DEG,
+        rebuild_interval: float = DEFAULT_REBUILD_INTERVAL,
+        catalog=None,
+    ):
+        self.cell_size = cell_size_deg
+        self.rebuild_interval = rebuild_interval
+        self._cells: Dict[Tuple[int, int], Set] = defaultdict(set)
+        self._points: Dict = {}
+        self._built_at: Optional[float] = None
+        self._lock = threading.RLock()
+        # Bumped by every local change; a rebuild replays the changes made after
+        # it started reading, and one that started before the installed grid
+        # was read is thrown away
+        self._generation = 0
+        self._changes: Dict = {}  # restaurant id -> (generation, (lat, lng) or None)
+        self._installed_from = 0
+        self._invalidated_at = 0
+        self._stale: Set = set()  # changed on other workers, re-read on the next query
+        self._catalog = catalog
+        if catalog is not None:
+            catalog.add_listener(self.apply_remote_changes)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    @staticmethod
+    def _read_locations(restaurant_ids: Optional[Iterable] = None) -> List[Tuple]:
+        from .models import Restaurant
+
+        restaurants = Restaurant.objects.all()
+        if restaurant_ids is not None:
+            restaurants = restaurants.filter(id__in=list(restaurant_ids))
+        return list(restaurants.values_list("id", "lat", "lng"))
+
+    def rebuild(self):
+        """Reload every restaurant location from the database."""
+        with self._lock:
+            started = self._generation
+            self._stale = set()  # covered by this read
+        cells = defaultdict(set)
+        points = {}
+        for restaurant_id, lat, lng in self._read_locations():
+            if lat is None or lng is None:
+                continue
+            points[restaurant_id] = (lat, lng)
+            cells[self._cell(lat, lng)].add(restaurant_id)
+
+        with self._lock:
+            if started < self._installed_from:
+                return  # a rebuild that read later has already swapped in
+            self._cells = cells
+            self._points = points
+            # saves and deletes made while the table was being read win over it
+            for restaurant_id, (generation, location) in self._changes.items():
+                if generation > started:
+                    self._place(restaurant_id, location)
+            self._changes = {key: change for key, change in self._changes.items() if change[0] > started}
+            self._installed_from = started
+            self._built_at = None if self._invalidated_at > started else time.monotonic()
+
+    def ensure_fresh(self):
+        if self._catalog is not None:
+            self._catalog.sync()  # throttled; delivers other workers' changes to apply_remote_changes
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at > self.rebuild_interval:
+            self.rebuild()
+        elif self._stale:
+            self._reload_stale()
+
+    def invalidate(self):
+        """Force a full rebuild on the next query."""
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at = self._generation
+            self._built_at = None
+
+    def apply_remote_changes(self, restaurant_ids: Optional[List[str]]):
+        """Catalog listener: re-read restaurants saved on other workers (None = all of them)."""
+        if restaurant_ids is None:
+            self.invalidate()
+            return
+        with self._lock:
+            self._stale.update(uuid.UUID(key) for key in restaurant_ids)
+
+    def _reload_stale(self):
+        with self._lock:
+            ids, self._stale = self._stale, set()
+            started = self._generation
+        rows = {restaurant_id: (lat, lng) for restaurant_id, lat, lng in self._read_locations(ids)}
+        with self._lock:
+            for restaurant_id in ids:
+                if self._changes.get(restaurant_id, (0,))[0] > started:
+                    continue  # saved here since the read; that is newer
+                lat, lng = rows.get(restaurant_id, (None, None))
+                self._place(restaurant_id, None if lat is None or lng is None else (lat, lng))
+
+    def upsert(self, restaurant_id, lat: Optional[float], lng: Optional[float]):
+        location = None if lat is None or lng is None else (lat, lng)
+        with self._lock:
+            self._generation += 1
+            self._changes[restaurant_id] = (self._generation, location)
+            if self._built_at is None:
+                return  # the next rebuild reads it (or replays it if already reading)
+            self._place(restaurant_id, location)
+
+    def location(self, restaurant_id) -> Optional[Tuple[float, float]]:
+        """Last indexed (lat, lng) of a restaurant, if known."""
+        return self._points.get(restaurant_id)
+
+    def remove(self, restaurant_id):
+        with self._lock:
+            self._generation += 1
+            self._changes[restaurant_id] = (self._generation, None)
+            self._discard(restaurant_id)
+
+    def _place(self, restaurant_id, location: Optional[Tuple[float, float]]):
+        self._discard(restaurant_id)
+        if location is not None:
+            self._points[restaurant_id] = location
+            self._cells[self._cell(*location)].add(restaurant_id)
+
+    def _discard(self, restaurant_id):
+        old = self._points.pop(restaurant_id, None)
+        if old is None:
+            return
+        cell = self._cell(*old)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(restaurant_id)
+            if not members:
+                del self._cells[cell]
+
+    def candidates(self, lat: float, lng: float, radius_km: float) -> List[Tuple]:
+        """
+        Return (restaurant_id, lat, lng) for every restaurant in a cell overlapping
+        the radius' bounding box. Callers still need an exact distance check.
+        """
+        self.ensure_fresh()
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        row_lo, col_lo = self._cell(min_lat, min_lng)
+        row_hi, col_hi = self._cell(max_lat, max_lng)
+
+        with self._lock:
+            span = (row_hi - row_lo + 1) * (col_hi - col_lo + 1)
+            if span > len(self._cells):
+                # Huge radius: walking the populated cells is cheaper than the grid
+                cells = [
+                    members for (row, col), members in self._cells.items()
+                    if row_lo <= row <= row_hi and col_lo <= col <= col_hi
+                ]
+            else:
+                cells = [
+                    self._cells[(row, col)]
+                    for row in range(row_lo, row_hi + 1)
+                    for col in range(col_lo, col_hi + 1)
+                    if (row, col) in self._cells
+                ]
+            result = []
+            for members in cells:
+                for restaurant_id in members:
+                    r_lat, r_lng = self._points[restaurant_id]
+                    if min_lat <= r_lat <= max_lat and min_lng <= r_lng <= max_lng:
+                        result.append((restaurant_id, r_lat, r_lng))
+        return result
+
+
+restaurant_index = RestaurantGridIndex(
+    cell_size_deg=getattr(settings, "RESTAURANT_INDEX_CELL_SIZE_DEG", DEFAULT_CELL_SIZE_DEG),
+    rebuild_interval=getattr(settings, "RESTAURANT_INDEX_REBUILD_INTERVAL", DEFAULT_REBUILD_INTERVAL),
+    catalog=restaurant_catalog,
+)
@@ -0,0 +1,211 @@
+"""
+Resized derivatives of uploaded menu and restaurant images.
+
+Each upload gets fixed-size variants (thumb / card / detail, longest edge in
+pixels, never upscaled) in WebP and JPEG, stored next to the original under
+deterministic names:
+
+    menu_items/pizza.jpg -> menu_items/variants/pizza.jpg.card.webp
+
+(the original's extension stays in the name, so pizza.png and pizza.jpg do
+not share variants). The names that were written are recorded on the row
+(item_image_variants / profile_image_variants) together with the original
+they were made from, so serializers can hand out URLs without touching
+storage and stale variants are regenerated when the image is replaced.
+
+Encoding takes a while, so saves only schedule it: schedule_variants() runs
+after the transaction commits, on a small background pool, and serializers
+leave the variants out until they exist. The generate_image_variants
+command backfills existing images.
+"""
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = {"thumb": 160, "card": 480, "detail": 1080}
+FORMATS = {"webp": ("WEBP", {"quality": 78, "method": 4}), "jpg": ("JPEG", {"quality": 80, "optimize": True, "progressive": True})}
+
+VARIANT_DIR = "variants"
+
+DEFAULT_WORKERS = 2
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def variant_sizes() -> Dict[str, int]:
+    return getattr(settings, "IMAGE_VARIANT_SIZES", DEFAULT_SIZES)
+
+
+def variant_name(source_name: str, size: str, fmt: str) -> str:
+    directory, filename = posixpath.split(source_name)
+    return posixpath.join(directory, VARIANT_DIR, f"{filename}.{size}.{fmt}")
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    pil_format, options = FORMATS[fmt]
+    if pil_format == "JPEG" and image.mode != "RGB":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(field_file) -> Dict[str, Any]:
+    """
+    Write every size/format of this image and return the record to store:
+    {"source": original name, "<size>": {"<fmt>": storage name}}.
+    Raises OSError/UnidentifiedImageError for unreadable images.
+    """
+    storage = field_file.storage
+    with storage.open(field_file.name, "rb") as handle:
+        original = Image.open(handle)
+        original = ImageOps.exif_transpose(original)  # phone photos are often stored rotated
+        original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "transparency" in original.info or "A" in original.getbands() else "RGB")
+
+    record: Dict[str, Any] = {"source": field_file.name}
+    for size, edge in variant_sizes().items():
+        resized = original.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        record[size] = {}
+        for fmt in FORMATS:
+            name = variant_name(field_file.name, size, fmt)
+            if storage.exists(name):
+                storage.delete(name)  # deterministic names: overwrite, never get a suffixed copy
+            record[size][fmt] = storage.save(name, ContentFile(_encode(resized, fmt)))
+    return record
+
+
+def delete_variants(storage, record: Optional[Dict[str, Any]]):
+    for size, formats in (record or {}).items():
+        if size == "source":
+            continue
+        for name in formats.values():
+            try:
+                storage.delete(name)
+            except OSError:
+                pass
+
+
+def refresh_variants(instance, field_name: str, force: bool = False) -> bool:
+    """
+    Bring `<field_name>_variants` of this row in line with its image. Writes
+    with .update() so no save signals fire again. Returns True if it changed.
+    """
+    field_file = getattr(instance, field_name)
+    variants_field = f"{field_name}_variants"
+    current = getattr(instance, variants_field) or {}
+
+    if not field_file:
+        record = {}
+    elif not force and current.get("source") == field_file.name:
+        return False
+    else:
+        try:
+            record = generate_variants(field_file)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            logger.warning("Could not make image variants for %s: %s", field_file.name, e)
+            record = {}
+
+    if current and current.get("source") != record.get("source"):
+        delete_variants(field_file.storage, current)
+    if record == current:
+        return False
+    setattr(instance, variants_field, record)
+    type(instance).objects.filter(pk=instance.pk).update(**{variants_field: record})
+    return True
+
+
+def needs_variants(instance, field_name: str) -> bool:
+    """Whether the stored variants no longer match the image (no storage access)."""
+    field_file = getattr(instance, field_name)
+    current = getattr(instance, f"{field_name}_variants") or {}
+    return current.get("source") != (field_file.name if field_file else None)
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_VARIANT_WORKERS", DEFAULT_WORKERS),
+                thread_name_prefix="image-variants",
+            )
+        return _pool
+
+
+def _refresh_rows(model, field_name: str, pks: List[Any], on_done: Optional[Callable[[], None]]):
+    variants_field = f"{field_name}_variants"
+    by_image: Dict[str, list] = {}
+    for instance in model.objects.filter(pk__in=pks).only("pk", field_name, variants_field):
+        by_image.setdefault(getattr(instance, field_name).name, []).append(instance)
+    changed = False
+    # one set of variants per distinct image, shared by every row that uses it
+    for group in by_image.values():
+        changed = refresh_variants(group[0], field_name) or changed
+        record = getattr(group[0], variants_field)
+        stale = [instance.pk for instance in group[1:] if getattr(instance, variants_field) != record]
+        if stale:
+            model.objects.filter(pk__in=stale).update(**{variants_field: record})
+            changed = True
+    if changed and on_done is not None:
+        on_done()
+
+
+def _refresh_rows_in_worker(*args):
+    close_old_connections()
+    try:
+        _refresh_rows(*args)
+    except Exception:
+        logger.exception("Image variant refresh failed for %s %s", args[0].__name__, args[2])
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(model, field_name: str, pks: Iterable[Any], on_done: Optional[Callable[[], None]] = None):
+    """
+    Refresh the variants of these rows once the current transaction commits,
+    on the background pool (inline if IMAGE_VARIANT_WORKERS is 0). Rows are
+    re-read there, so the latest image wins. on_done runs if anything changed.
+    """
+    pks = list(pks)
+    if not pks:
+        return
+
+    def submit():
+        if getattr(settings, "IMAGE_VARIANT_WORKERS", DEFAULT_WORKERS) == 0:
+            _refresh_rows(model, field_name, pks, on_done)
+        else:
+            _executor().submit(_refresh_rows_in_worker, model, field_name, pks, on_done)
+
+    transaction.on_commit(submit)
+
+
+def variant_urls(field_file, record: Optional[Dict[str, Any]], request=None) -> Dict[str, Dict[str, str]]:
+    """{"thumb": {"webp": url, "jpg": url}, ...} for the variants of the current image."""
+    if not field_file or not record or record.get("source") != field_file.name:
+        return {}
+    storage = field_file.storage
+    urls = {}
+    for size, formats in record.items():
+        if size == "source":
+            continue
+        urls[size] = {}
+        for fmt, name in formats.items():
+            url = storage.url(name)
+            urls[size][fmt] = request.build_absolute_uri(url) if request else url
+    return urls
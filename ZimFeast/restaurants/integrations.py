@@ -0,0 +1,290 @@
+"""
+Failure isolation for restaurant-provided external APIs (RestaurantExternalAPI).
+
+Every partner call goes through guarded_call(), which applies:
+
+* a circuit breaker per RestaurantExternalAPI row. Outcomes are counted in a
+  rolling window of EXTERNAL_API_BREAKER_WINDOW seconds; once at least
+  EXTERNAL_API_BREAKER_MIN_REQUESTS calls were made and the error rate reaches
+  EXTERNAL_API_BREAKER_ERROR_RATE the breaker opens and calls fail fast with
+  CircuitOpenError for EXTERNAL_API_BREAKER_OPEN_SECONDS. It then goes
+  half-open: a single probe call is let through and closes the breaker on
+  success or re-opens it on failure (the probe's claim lapses after
+  EXTERNAL_API_BREAKER_PROBE_TIMEOUT seconds). State lives in Redis so every
+  worker sees the same breaker, with an in-memory store when Redis is down.
+* a bulkhead per partner host: at most EXTERNAL_API_HOST_CONCURRENCY calls in
+  flight per host in this process, so one slow backend cannot take every
+  worker thread. Callers over the limit get BulkheadFullError.
+
+Both errors mean "use the fallback", which every call site already has.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 60  # seconds
+DEFAULT_BUCKETS = 6
+DEFAULT_MIN_REQUESTS = 5
+DEFAULT_ERROR_RATE = 0.5
+DEFAULT_OPEN_SECONDS = 30
+DEFAULT_PROBE_TIMEOUT = 15  # seconds a half-open probe may hold its slot
+DEFAULT_HOST_CONCURRENCY = 4
+DEFAULT_BULKHEAD_WAIT = 0.25  # seconds to wait for a free host slot
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class IntegrationUnavailable(Exception):
+    """The partner call was not attempted; use the fallback path."""
+
+
+class CircuitOpenError(IntegrationUnavailable):
+    pass
+
+
+class BulkheadFullError(IntegrationUnavailable):
+    pass
+
+
+class _MemoryStore:
+    """The handful of Redis string commands the breaker needs, with expiry."""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key: str, now: float):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        return value
+
+    def incr(self, key: str, ttl: float):
+        with self._lock:
+            now = time.monotonic()
+            value = int(self._alive(key, now) or 0) + 1
+            self._data[key] = (value, now + ttl)
+
+    def mget(self, keys: List[str]) -> List[Optional[int]]:
+        with self._lock:
+            now = time.monotonic()
+            return [self._alive(key, now) for key in keys]
+
+    def set(self, key: str, value, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if nx and self._alive(key, now) is not None:
+                return False
+            self._data[key] = (value, now + ttl if ttl else None)
+            return True
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            return self._alive(key, time.monotonic()) is not None
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+class _RedisStore:
+    def __init__(self, client):
+        self.client = client
+
+    def incr(self, key: str, ttl: float):
+        pipe = self.client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, int(ttl) + 1)
+        pipe.execute()
+
+    def mget(self, keys: List[str]) -> List[Optional[int]]:
+        return [int(v) if v is not None else None for v in self.client.mget(keys)]
+
+    def set(self, key: str, value, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        return bool(self.client.set(key, value, ex=int(ttl) if ttl else None, nx=nx))
+
+    def exists(self, key: str) -> bool:
+        return bool(self.client.exists(key))
+
+    def delete(self, *keys: str):
+        self.client.delete(*keys)
+
+
+class CircuitBreakers:
+    """Rolling-window circuit breakers keyed by RestaurantExternalAPI id."""
+
+    def __init__(
+        self,
+        window: float = DEFAULT_WINDOW,
+        min_requests: int = DEFAULT_MIN_REQUESTS,
+        error_rate: float = DEFAULT_ERROR_RATE,
+        open_seconds: float = DEFAULT_OPEN_SECONDS,
+        probe_timeout: float = DEFAULT_PROBE_TIMEOUT,
+        buckets: int = DEFAULT_BUCKETS,
+    ):
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+        self.buckets = buckets
+        self.bucket_seconds = window / buckets
+        self._memory = _MemoryStore()
+
+    # Keys ---------------------------------------------------------------
+
+    @staticmethod
+    def _key(name: str, *parts) -> str:
+        return ":".join(("breaker", name) + tuple(str(p) for p in parts))
+
+    def _bucket_keys(self, name: str) -> List[tuple]:
+        current = int(time.time() // self.bucket_seconds)
+        return [
+            (self._key(name, "ok", b), self._key(name, "err", b))
+            for b in range(current - self.buckets + 1, current + 1)
+        ]
+
+    # Store --------------------------------------------------------------
+
+    def _run(self, op: Callable[[Any], Any]):
+        """Apply op to the shared store, or the local one when Redis is unusable."""
+        from realtime.redis_publisher import publisher
+
+        if publisher.connected and publisher.redis_client is not None:
+            try:
+                return op(_RedisStore(publisher.redis_client))
+            except Exception as e:
+                logger.debug("Circuit breaker store unavailable, using local state: %s", e)
+        return op(self._memory)
+
+    # State --------------------------------------------------------------
+
+    def state(self, name: str) -> str:
+        def op(store):
+            if store.exists(self._key(name, "open")):
+                return OPEN
+            if store.exists(self._key(name, "tripped")):
+                return HALF_OPEN
+            return CLOSED
+        return self._run(op)
+
+    def allow(self, name: str) -> bool:
+        """Whether a call may go out now. A True in half-open state claims the probe."""
+        def op(store):
+            if store.exists(self._key(name, "open")):
+                return False
+            if store.exists(self._key(name, "tripped")):
+                return store.set(self._key(name, "probe"), 1, ttl=self.probe_timeout, nx=True)
+            return True
+        return self._run(op)
+
+    def record_success(self, name: str):
+        def op(store):
+            if store.exists(self._key(name, "tripped")):
+                # Probe succeeded: close and start counting afresh
+                keys = [k for pair in self._bucket_keys(name) for k in pair]
+                store.delete(self._key(name, "tripped"), self._key(name, "probe"), *keys)
+                return True
+            store.incr(self._bucket_keys(name)[-1][0], self.window + self.bucket_seconds)
+            return False
+        if self._run(op):
+            logger.info("Circuit breaker %s closed", name)
+
+    def record_failure(self, name: str):
+        def op(store):
+            if store.exists(self._key(name, "tripped")):
+                self._trip(store, name)  # probe failed
+                return True
+            bucket_keys = self._bucket_keys(name)
+            store.incr(bucket_keys[-1][1], self.window + self.bucket_seconds)
+            counts = store.mget([k for pair in bucket_keys for k in pair])
+            ok = sum(c or 0 for c in counts[0::2])
+            err = sum(c or 0 for c in counts[1::2])
+            total = ok + err
+            if total >= self.min_requests and err / total >= self.error_rate:
+                self._trip(store, name)
+                return True
+            return False
+        if self._run(op):
+            logger.warning("Circuit breaker %s opened for %ss", name, self.open_seconds)
+
+    def _trip(self, store, name: str):
+        store.set(self._key(name, "open"), 1, ttl=self.open_seconds)
+        store.set(self._key(name, "tripped"), 1)
+        store.delete(self._key(name, "probe"))
+
+    def reset(self, name: str):
+        def op(store):
+            keys = [k for pair in self._bucket_keys(name) for k in pair]
+            store.delete(self._key(name, "open"), self._key(name, "tripped"), self._key(name, "probe"), *keys)
+        self._run(op)
+
+
+class HostBulkheads:
+    """Per-host caps on concurrent outbound calls from this process."""
+
+    def __init__(self, limit: int = DEFAULT_HOST_CONCURRENCY, wait: float = DEFAULT_BULKHEAD_WAIT):
+        self.limit = limit
+        self.wait = wait
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._slots.get(host)
+            if semaphore is None:
+                semaphore = self._slots[host] = threading.BoundedSemaphore(self.limit)
+            return semaphore
+
+
+circuit_breakers = CircuitBreakers(
+    window=getattr(settings, "EXTERNAL_API_BREAKER_WINDOW", DEFAULT_WINDOW),
+    min_requests=getattr(settings, "EXTERNAL_API_BREAKER_MIN_REQUESTS", DEFAULT_MIN_REQUESTS),
+    error_rate=getattr(settings, "EXTERNAL_API_BREAKER_ERROR_RATE", DEFAULT_ERROR_RATE),
+    open_seconds=getattr(settings, "EXTERNAL_API_BREAKER_OPEN_SECONDS", DEFAULT_OPEN_SECONDS),
+    probe_timeout=getattr(settings, "EXTERNAL_API_BREAKER_PROBE_TIMEOUT", DEFAULT_PROBE_TIMEOUT),
+)
+host_bulkheads = HostBulkheads(
+    limit=getattr(settings, "EXTERNAL_API_HOST_CONCURRENCY", DEFAULT_HOST_CONCURRENCY),
+    wait=getattr(settings, "EXTERNAL_API_BULKHEAD_WAIT", DEFAULT_BULKHEAD_WAIT),
+)
+
+
+def guarded_call(api_obj, call: Callable[[], Any]) -> Any:
+    """
+    Run call() (the HTTP request to api_obj) behind its circuit breaker and its
+    host's bulkhead. Raises IntegrationUnavailable instead of calling when the
+    breaker is open or the host is saturated; call()'s own errors propagate.
+    """
+    name = str(api_obj.pk)
+    host = urlparse(api_obj.api_url).hostname or api_obj.api_url
+    slot = host_bulkheads.slot(host)
+    # Slot first: in half-open state allow() claims the single probe, which
+    # must not be left claimed by a call that then never goes out
+    if not slot.acquire(timeout=host_bulkheads.wait):
+        raise BulkheadFullError(f"Too many concurrent calls to {host}")
+    try:
+        if not circuit_breakers.allow(name):
+            raise CircuitOpenError(f"Circuit open for external API {name} ({api_obj.api_url})")
+        try:
+            result = call()
+        except Exception:
+            circuit_breakers.record_failure(name)
+            raise
+    finally:
+        slot.release()
+    circuit_breakers.record_success(name)
+    return result
@@ -0,0 +1,86 @@
+"""
+Incremental reader for the Chef Zim JSON answer while it is being streamed.
+
+The model streams one JSON object of the shape
+{"greeting": ..., "recommendations": [{...}, ...], "closing": ...} a few
+characters at a time. feed() takes each new fragment and returns the parts
+that became complete with it: the greeting and closing strings as soon as
+their closing quote arrives, and each recommendation object as soon as its
+closing brace does, regardless of key order.
+"""
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_STRING_FIELD = r'"{name}"\s*:\s*"((?:[^"\\]|\\.)*)"'
+_ARRAY_START = re.compile(r'"recommendations"\s*:\s*\[')
+
+
+class StreamingAnswerScanner:
+    SCALARS = ("greeting", "closing")
+
+    def __init__(self):
+        self.buffer = ""
+        self.emitted = set()  # scalar fields already returned
+        self._array_pos: Optional[int] = None  # next unscanned index inside the array
+        self._array_done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start: Optional[int] = None
+
+    def feed(self, fragment: str) -> List[Tuple[str, Any]]:
+        """Append a fragment; returns the newly complete (kind, value) pairs."""
+        self.buffer += fragment
+        events: List[Tuple[str, Any]] = []
+
+        for name in self.SCALARS:
+            if name in self.emitted:
+                continue
+            match = re.search(_STRING_FIELD.format(name=name), self.buffer)
+            if match:
+                self.emitted.add(name)
+                events.append((name, json.loads(f'"{match.group(1)}"')))
+
+        if self._array_pos is None:
+            match = _ARRAY_START.search(self.buffer)
+            if match:
+                self._array_pos = match.end()
+        if self._array_pos is not None and not self._array_done:
+            events.extend(("recommendation", obj) for obj in self._scan_array())
+        return events
+
+    def _scan_array(self) -> List[Any]:
+        objects = []
+        text = self.buffer
+        pos = self._array_pos
+        while pos < len(text):
+            char = text[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = pos
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    try:
+                        objects.append(json.loads(text[self._object_start:pos + 1]))
+                    except ValueError:
+                        pass
+                    self._object_start = None
+            elif char == "]" and self._depth == 0:
+                self._array_done = True
+                pos += 1
+                break
+            pos += 1
+        self._array_pos = pos
+        return objects
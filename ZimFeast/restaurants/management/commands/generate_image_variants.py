@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from restaurants.images import refresh_variants
+from restaurants.models import MenuItem, Restaurant
+from restaurants.signals import image_variants_ready
+
+
+class Command(BaseCommand):
+    help = "Create the resized WebP/JPEG variants of existing menu item and restaurant images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Regenerate variants even where they are already up to date (e.g. after changing sizes).",
+        )
+        parser.add_argument(
+            "--restaurant", action="append", dest="restaurants",
+            help="Only this restaurant and its menu items (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        changed_restaurants = set()
+        restaurants = Restaurant.objects.exclude(profile_image="").exclude(profile_image__isnull=True)
+        items = MenuItem.objects.exclude(item_image="")
+        if options["restaurants"]:
+            restaurants = restaurants.filter(pk__in=options["restaurants"])
+            items = items.filter(restaurant_id__in=options["restaurants"])
+
+        for label, queryset, field, restaurant_field in (
+            ("restaurant images", restaurants, "profile_image", "pk"),
+            ("menu item images", items, "item_image", "restaurant_id"),
+        ):
+            changed = 0
+            rows = queryset.only("pk", restaurant_field, field, f"{field}_variants")
+            for instance in rows.iterator(chunk_size=200):
+                if refresh_variants(instance, field, force=options["force"]):
+                    changed += 1
+                    changed_restaurants.add(getattr(instance, restaurant_field))
+            self.stdout.write(f"Updated variants for {changed} {label}")
+
+        if changed_restaurants:
+            # .update() bypasses the save signals; let cached menus pick the URLs up
+            image_variants_ready(changed_restaurants)
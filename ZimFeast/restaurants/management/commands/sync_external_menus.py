@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from restaurants.menu_sync import sync_external_menus
+
+
+class Command(BaseCommand):
+    help = "Pull restaurant external menu APIs into the local ExternalMenuItem mirror."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--restaurant", action="append", dest="restaurants",
+            help="Only sync this restaurant id (repeatable).",
+        )
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep running, syncing every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval", type=float,
+            default=getattr(settings, "EXTERNAL_MENU_SYNC_INTERVAL", 300),
+            help="Seconds between passes with --loop (default: EXTERNAL_MENU_SYNC_INTERVAL or 300).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            totals = sync_external_menus(options["restaurants"])
+            self.stdout.write(
+                "Synced {synced} menu APIs ({failed} failed): "
+                "{created} created, {updated} updated, {deleted} deleted".format(**totals)
+            )
+            if not options["loop"]:
+                return
+            close_old_connections()
+            time.sleep(max(0.0, options["interval"] - (time.monotonic() - started)))
@@ -0,0 +1,71 @@
+import itertools
+
+from django.core.management.base import BaseCommand
+
+from restaurants.ai_cache import (
+    CRAVINGS,
+    DAY_TYPES,
+    MOODS,
+    PARTY_SIZES,
+    WEATHERS,
+    recommendation_cache,
+)
+from restaurants.ai_service import generate_ai_recommendations, get_all_menu_items
+from restaurants.menu_digest import menu_digest
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute Chef Zim recommendations for the most requested contexts "
+        "(run off-peak; needs Redis so the web workers can read the results)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, default=50,
+            help="How many contexts to warm (default 50).",
+        )
+
+    def handle(self, *args, **options):
+        if recommendation_cache._redis() is None:
+            self.stderr.write("Redis is not reachable; warmed answers would stay in this process. Nothing done.")
+            return
+
+        limit = options["limit"]
+        contexts = recommendation_cache.popular_contexts(limit)
+        if not contexts:
+            # No traffic recorded yet: fall back to the dialog's own choices
+            contexts = [
+                (*combo, "")
+                for combo in itertools.islice(
+                    itertools.product(MOODS, CRAVINGS, DAY_TYPES, WEATHERS, PARTY_SIZES), limit
+                )
+            ]
+
+        digest = menu_digest.current()
+        if get_all_menu_items() is not digest.items:
+            self.stderr.write("Some partner menus are not mirrored yet; run sync_external_menus first. Nothing done.")
+            return
+
+        warmed = skipped = failed = 0
+        for context in contexts:
+            if recommendation_cache.get(digest.fingerprint, context, count=False) is not None:
+                skipped += 1
+                continue
+            mood, craving, day_type, weather, party_size, _cell = context
+            result = generate_ai_recommendations(
+                mood=mood,
+                craving=craving,
+                day_type=day_type,
+                weather=weather,
+                party_size=party_size,
+                menu_items=digest.items,
+            )
+            if result.get("success"):
+                recommendation_cache.set(digest.fingerprint, context, result)
+                warmed += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Failed for {context}: {result.get('error')}")
+
+        self.stdout.write(f"Warmed {warmed} contexts ({skipped} already cached, {failed} failed)")
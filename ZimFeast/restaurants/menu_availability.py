@@ -0,0 +1,82 @@
+"""
+Bulk availability switching for a restaurant's menu items.
+
+A kitchen marks items (by id) and/or whole categories (by name) available or
+unavailable in one go: one SELECT to find the rows that actually change, one
+UPDATE for all of them, one menu_version bump, one catalog invalidation and
+one websocket message to the restaurant's dashboard group. QuerySet.update()
+fires no model signals, so the per-item version bumps and cache drops of
+restaurants/signals.py are replaced by the single ones here.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import F, Q
+
+from .catalog import restaurant_catalog
+from .models import MenuItem, Restaurant
+
+logger = logging.getLogger(__name__)
+
+
+def _notify(restaurant_id, payload: Dict[str, Any]):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            f"restaurant_{restaurant_id}",
+            {"type": "restaurant.menu.availability", "availability": payload},
+        )
+    except Exception as e:
+        logger.warning("Menu availability notification failed for %s: %s", restaurant_id, e)
+
+
+def set_availability(
+    restaurant: Restaurant,
+    available: bool,
+    item_ids: Optional[Iterable] = None,
+    categories: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Switch the matching items of this restaurant. Returns {"available",
+    "changed": [ids], "unchanged": count, "unknown_item_ids": [ids],
+    "menu_version"}.
+    """
+    item_ids = [str(item_id) for item_id in (item_ids or [])]
+    categories = [name for name in (categories or []) if name]
+
+    match = Q(pk__in=item_ids) if item_ids else Q()
+    if categories:
+        category_match = Q()
+        for name in categories:
+            category_match |= Q(category__name__iexact=name)
+        match = (match | category_match) if item_ids else category_match
+
+    with transaction.atomic():
+        rows = list(
+            MenuItem.objects.filter(restaurant=restaurant).filter(match)
+            .values_list("pk", "available").distinct()
+        )
+        changed: List[str] = [str(pk) for pk, current in rows if current != available]
+        if changed:
+            MenuItem.objects.filter(pk__in=changed).update(available=available)
+            Restaurant.objects.filter(pk=restaurant.pk).update(menu_version=F("menu_version") + 1)
+            transaction.on_commit(lambda: restaurant_catalog.invalidate(restaurant.pk))
+        menu_version = Restaurant.objects.values_list("menu_version", flat=True).get(pk=restaurant.pk)
+
+    matched = {str(pk) for pk, _ in rows}
+    result = {
+        "available": available,
+        "changed": changed,
+        "unchanged": len(rows) - len(changed),
+        "unknown_item_ids": [item_id for item_id in item_ids if item_id not in matched],
+        "menu_version": menu_version,
+    }
+    if changed:
+        payload = {"available": available, "item_ids": changed, "menu_version": menu_version}
+        transaction.on_commit(lambda: _notify(restaurant.pk, payload))
+    return result
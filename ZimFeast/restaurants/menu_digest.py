@@ -0,0 +1,147 @@
+"""
+Prebuilt, compact digest of every available menu item for Chef Zim.
+
+The digest is an immutable snapshot: the flat item list in the ai_service
+shape (plus restaurant coordinates), the compact per-item summary that goes
+into the prompt, a version number and a content fingerprint. Reading it is a
+single attribute lookup; it is only rebuilt when something changed.
+
+Rows are kept per restaurant and derived from the catalog snapshot
+(restaurants/catalog.py) plus the external menu mirror (restaurants/menu_sync.py),
+so the model signals and the mirror sync that invalidate catalog entries
+also refresh the digest, one restaurant at a time. `version` moves whenever
+the content does; `fingerprint` is a digest of the content itself, so it is
+equal across workers that hold the same menus and can key shared caches.
+
+Partner menus that were never mirrored are fetched live per request and
+appended to the digest items as a LiveMenu, which keeps the two parts apart
+so the digest's prebuilt work can still be reused for its share.
+"""
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+
+from .catalog import DEFAULT_RECHECK_INTERVAL, CatalogTracker, restaurant_catalog
+
+DESCRIPTION_CHARS = 100
+
+
+def summarize(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The compact form of one menu item that is sent to the model."""
+    return {
+        'restaurant': item.get('restaurant_name'),
+        'dish': item.get('name'),
+        'description': (item.get('description') or '')[:DESCRIPTION_CHARS],
+        'price': item.get('price'),
+        'categories': item.get('categories', []),
+        'cuisines': item.get('restaurant_cuisines', []),
+    }
+
+
+class MenuDigestSnapshot:
+    __slots__ = ("version", "fingerprint", "items", "summary", "unsynced_restaurant_ids")
+
+    def __init__(self, version: int, fingerprint: str, items: Tuple, summary: Tuple, unsynced_restaurant_ids: Tuple):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.items = items  # ai_service item dicts, + lat/lng
+        self.summary = summary  # summarize(item) for each item, same order
+        self.unsynced_restaurant_ids = unsynced_restaurant_ids  # menu APIs not mirrored yet
+
+
+class LiveMenu(list):
+    """A digest's items followed by live-fetched external menu items."""
+
+    def __init__(self, digest: MenuDigestSnapshot, external: List[Dict[str, Any]]):
+        super().__init__(digest.items)
+        self.extend(external)
+        self.digest = digest
+        self.external = tuple(external)
+        self.external_summary = tuple(summarize(item) for item in external)
+        content = json.dumps([digest.fingerprint, self.external_summary], default=str)
+        # Content of the whole list: the digest's fingerprint plus the external items
+        self.fingerprint = hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class MenuDigest:
+    def __init__(self, recheck_interval: float = DEFAULT_RECHECK_INTERVAL):
+        self._lock = threading.RLock()
+        self._catalog = CatalogTracker(restaurant_catalog, recheck_interval)
+        self._rows: Dict[str, Tuple[Tuple, Tuple, str]] = {}  # restaurant id -> (items, summary, hash)
+        self._unsynced: Dict[str, bool] = {}
+        self._order: List[str] = []
+        self._snapshot = MenuDigestSnapshot(0, "", (), (), ())
+
+    def current(self) -> MenuDigestSnapshot:
+        self.refresh()
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self.current().version
+
+    def refresh(self):
+        """Rebuild the rows of restaurants whose catalog entry changed."""
+        if not self._catalog.due():
+            return
+
+        from .menu_sync import mirrored_ai_items
+
+        with self._lock:
+            diff = self._catalog.diff()
+            if diff or diff.order != self._order:
+                mirrored = mirrored_ai_items([
+                    e.restaurant["id"] for e in diff.changed if self._has_menu_api(e)
+                ])
+                for rid in diff.removed:
+                    self._rows.pop(rid, None)
+                    self._unsynced.pop(rid, None)
+                for entry in diff.changed:
+                    rid = entry.restaurant["id"]
+                    self._rows[rid] = self._rows_for(entry, mirrored.get(rid, []))
+                    self._unsynced[rid] = self._has_menu_api(entry) and rid not in mirrored
+                self._order = diff.order
+                self._publish()
+            self._catalog.record(diff)
+
+    @staticmethod
+    def _has_menu_api(entry) -> bool:
+        return any(api["category"] == "menu_api" for api in entry.restaurant.get("external_apis", []))
+
+    @staticmethod
+    def _rows_for(entry, external_items: List[Dict[str, Any]]) -> Tuple[Tuple, Tuple, str]:
+        data = entry.restaurant
+        cuisines = [c["name"] for c in data.get("cuisines", [])]
+        items = []
+        for item in list(entry.menu_items) + list(external_items):
+            items.append({
+                **item,
+                'restaurant_cuisines': item.get('restaurant_cuisines', cuisines),
+                'lat': data.get("lat"),
+                'lng': data.get("lng"),
+            })
+        summary = tuple(summarize(item) for item in items)
+        content = json.dumps([data["id"], summary, [item.get("item_id") for item in items]], default=str)
+        return tuple(items), summary, hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def _publish(self):
+        items, summary = [], []
+        fingerprint = hashlib.sha1()
+        for rid in self._order:
+            rows = self._rows.get(rid)
+            if rows:
+                items.extend(rows[0])
+                summary.extend(rows[1])
+                fingerprint.update(rows[2].encode("ascii"))
+        unsynced = tuple(rid for rid in self._order if self._unsynced.get(rid))
+        self._snapshot = MenuDigestSnapshot(
+            self._snapshot.version + 1, fingerprint.hexdigest(), tuple(items), tuple(summary), unsynced
+        )
+
+
+menu_digest = MenuDigest(
+    recheck_interval=getattr(settings, "MENU_DIGEST_RECHECK_INTERVAL", DEFAULT_RECHECK_INTERVAL),
+)
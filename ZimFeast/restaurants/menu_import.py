@@ -0,0 +1,342 @@
+"""
+Bulk import and export of a restaurant's menu.
+
+Import takes rows from a CSV file, a JSON file or a JSON body, with the same
+columns the export writes:
+
+    name, price, description, categories, prep_time, available, image
+
+`categories` is a list (JSON) or a ";"-separated string (CSV) of existing
+CategoryType names. `image` is either the name of a file inside an uploaded
+zip archive ("images") or the storage name of an image that is already
+uploaded (as written by the export), so an exported menu can be re-imported.
+
+Every row is validated in one pass (categories resolved with one query)
+before anything is written; the valid rows are then inserted with one
+bulk_create for the items and one for the category through-table, inside a
+single transaction. Because bulk writes skip the model signals, the menu
+version and catalog entry are refreshed here instead, and the image variants
+are scheduled for the background pool once the transaction commits.
+"""
+import csv
+import io
+import json
+import posixpath
+import zipfile
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from PIL import Image, UnidentifiedImageError
+
+from .catalog import restaurant_catalog
+from .images import schedule_variants
+from .models import CategoryType, MenuItem, Restaurant
+from .signals import image_variants_ready
+
+COLUMNS = ("name", "price", "description", "categories", "prep_time", "available", "image")
+CATEGORY_SEPARATOR = ";"
+
+DEFAULT_MAX_ROWS = 1000
+DEFAULT_MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_PRICE = Decimal("999999.99")
+EXPORT_BATCH_ROWS = 200  # rows per streamed chunk; each chunk is one hop to the sync thread under ASGI
+
+TRUE_VALUES = {"1", "true", "yes", "y", "on"}
+FALSE_VALUES = {"0", "false", "no", "n", "off"}
+
+
+class MenuImportError(ValueError):
+    """The upload as a whole could not be read (bad file, too many rows...)."""
+
+
+def read_rows(upload=None, data=None) -> List[Dict[str, Any]]:
+    """Rows from a CSV/JSON file upload, or from an already parsed JSON body."""
+    if upload is not None:
+        raw = upload.read()
+        try:
+            text = raw.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise MenuImportError("File must be UTF-8 encoded")
+        if upload.name.lower().endswith(".json"):
+            try:
+                data = json.loads(text)
+            except ValueError as e:
+                raise MenuImportError(f"Invalid JSON: {e}")
+        else:
+            data = list(csv.DictReader(io.StringIO(text)))
+
+    if isinstance(data, dict):
+        data = data.get("items")
+    if not isinstance(data, list):
+        raise MenuImportError("Expected a list of items")
+    max_rows = getattr(settings, "MENU_IMPORT_MAX_ROWS", DEFAULT_MAX_ROWS)
+    if len(data) > max_rows:
+        raise MenuImportError(f"At most {max_rows} items per import")
+    return data
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _categories(value) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        names = value
+    else:
+        names = _text(value).split(CATEGORY_SEPARATOR)
+    return [_text(name) for name in names if _text(name)]
+
+
+def _bool(value, default=True) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if not text:
+        return default
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    return None
+
+
+class ImageSource:
+    """Resolves a row's image reference to a zip member or an existing upload."""
+
+    def __init__(self, archive=None):
+        self.max_bytes = getattr(settings, "MENU_IMPORT_MAX_IMAGE_BYTES", DEFAULT_MAX_IMAGE_BYTES)
+        self.storage = MenuItem._meta.get_field("item_image").storage
+        self.upload_to = MenuItem._meta.get_field("item_image").upload_to
+        self._zip = None
+        self._members: Dict[str, zipfile.ZipInfo] = {}
+        self._stored: Dict[str, str] = {}  # zip member -> storage name, so shared images are written once
+        self._checked: Dict[str, Optional[str]] = {}  # zip member -> check() result
+        if archive is not None:
+            try:
+                self._zip = zipfile.ZipFile(archive)
+            except zipfile.BadZipFile:
+                raise MenuImportError("images must be a zip archive")
+            for info in self._zip.infolist():
+                if not info.is_dir():
+                    self._members.setdefault(posixpath.basename(info.filename).lower(), info)
+
+    def check(self, reference: str) -> Optional[str]:
+        """None if the reference is usable, otherwise the error message."""
+        if not reference:
+            return "image is required"
+        info = self._members.get(posixpath.basename(reference).lower())
+        if info is not None:
+            if info.filename not in self._checked:
+                self._checked[info.filename] = self._check_member(info, reference)
+            return self._checked[info.filename]
+        if (
+            reference.startswith(self.upload_to)
+            and posixpath.normpath(reference) == reference
+            and self.storage.exists(reference)
+        ):
+            return None
+        return f"image {reference} was not found in the zip archive or among uploaded images"
+
+    def _check_member(self, info: zipfile.ZipInfo, reference: str) -> Optional[str]:
+        if info.file_size > self.max_bytes:
+            return f"image {reference} is larger than {self.max_bytes // (1024 * 1024)} MB"
+        try:
+            with self._zip.open(info) as handle:
+                Image.open(handle).verify()
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError, zipfile.BadZipFile):
+            return f"image {reference} is not a valid image"
+        return None
+
+    def store(self, reference: str) -> Tuple[str, bool]:
+        """Storage name for the reference and whether it was newly written."""
+        info = self._members.get(posixpath.basename(reference).lower())
+        if info is None:
+            return reference, False
+        if info.filename in self._stored:
+            return self._stored[info.filename], False
+        name = posixpath.join(self.upload_to, posixpath.basename(info.filename))
+        with self._zip.open(info) as handle:
+            self._stored[info.filename] = self.storage.save(name, ContentFile(handle.read()))
+        return self._stored[info.filename], True
+
+
+def validate_rows(rows: List[Any], images: ImageSource) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Returns (clean rows, errors). Each error is {"row": 1-based row number,
+    "errors": {field: message}}; each clean row carries its row number too.
+    """
+    wanted = set()
+    for row in rows:
+        if isinstance(row, dict):
+            wanted.update(name.lower() for name in _categories(row.get("categories")))
+    known = {
+        category.lname: category
+        for category in CategoryType.objects.annotate(lname=Lower("name")).filter(lname__in=wanted)
+    }
+
+    clean, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": number, "errors": {"row": "Expected an object"}})
+            continue
+        problems: Dict[str, str] = {}
+
+        name = _text(row.get("name"))
+        if not name:
+            problems["name"] = "name is required"
+        elif len(name) > 255:
+            problems["name"] = "name must be at most 255 characters"
+
+        price = None
+        try:
+            price = Decimal(_text(row.get("price"))).quantize(Decimal("0.01"))
+            if not price.is_finite() or price < 0 or price > MAX_PRICE:
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            problems["price"] = "price must be a number between 0 and 999999.99"
+
+        prep_time = None
+        if _text(row.get("prep_time")):
+            try:
+                prep_time = int(_text(row.get("prep_time")))
+                if prep_time < 0:
+                    raise ValueError
+            except ValueError:
+                problems["prep_time"] = "prep_time must be a whole number of minutes"
+
+        available = _bool(row.get("available"))
+        if available is None:
+            problems["available"] = "available must be true or false"
+
+        categories = []
+        missing = []
+        for category_name in _categories(row.get("categories")):
+            category = known.get(category_name.lower())
+            if category is None:
+                missing.append(category_name)
+            elif category not in categories:
+                categories.append(category)
+        if missing:
+            problems["categories"] = f"unknown categories: {', '.join(missing)}"
+
+        image = _text(row.get("image"))
+        image_problem = images.check(image)
+        if image_problem:
+            problems["image"] = image_problem
+
+        if problems:
+            errors.append({"row": number, "errors": problems})
+            continue
+        clean.append({
+            "row": number,
+            "name": name,
+            "price": price,
+            "description": _text(row.get("description")),
+            "prep_time": prep_time,
+            "available": available,
+            "categories": categories,
+            "image": image,
+        })
+    return clean, errors
+
+
+def import_menu(restaurant: Restaurant, rows: List[Dict[str, Any]], images: ImageSource) -> List[MenuItem]:
+    """Insert validated rows in one transaction. Returns the created items."""
+    Through = MenuItem.category.through
+    written: List[str] = []
+    try:
+        with transaction.atomic():
+            items, links = [], []
+            for row in rows:
+                image_name, new_file = images.store(row["image"])
+                if new_file:
+                    written.append(image_name)
+                item = MenuItem(
+                    restaurant=restaurant,
+                    name=row["name"],
+                    price=row["price"],
+                    description=row["description"],
+                    prep_time=row["prep_time"],
+                    available=row["available"],
+                    item_image=image_name,
+                )
+                items.append(item)
+                links.extend(Through(menuitem_id=item.pk, categorytype_id=category.pk) for category in row["categories"])
+
+            MenuItem.objects.bulk_create(items, batch_size=500)
+            Through.objects.bulk_create(links, batch_size=1000)
+            # bulk writes fire no signals: one version bump and one catalog refresh for the lot
+            Restaurant.objects.filter(pk=restaurant.pk).update(menu_version=F("menu_version") + 1)
+            transaction.on_commit(lambda: restaurant_catalog.invalidate(restaurant.pk))
+            # one set of variants per distinct image, made after commit off the request
+            schedule_variants(
+                MenuItem, "item_image", [item.pk for item in items],
+                on_done=lambda: image_variants_ready([restaurant.pk]),
+            )
+    except Exception:
+        for name in written:
+            images.storage.delete(name)
+        raise
+    return items
+
+
+def export_rows(restaurant: Restaurant) -> Iterator[Dict[str, Any]]:
+    items = (
+        MenuItem.objects.filter(restaurant=restaurant)
+        .order_by("created")
+        .prefetch_related("category")
+    )
+    for item in items.iterator(chunk_size=500):
+        yield {
+            "name": item.name,
+            "price": str(item.price),
+            "description": item.description,
+            "categories": [category.name for category in item.category.all()],
+            "prep_time": item.prep_time,
+            "available": item.available,
+            "image": item.item_image.name,
+        }
+
+
+def _batched(pieces: Iterable[str], size: int = EXPORT_BATCH_ROWS) -> Iterator[str]:
+    batch = []
+    for piece in pieces:
+        batch.append(piece)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    writer = csv.DictWriter(_Echo(), fieldnames=COLUMNS)
+    yield writer.writeheader()
+    for row in rows:
+        row = dict(row, categories=CATEGORY_SEPARATOR.join(row["categories"]))
+        yield writer.writerow({key: "" if value is None else value for key, value in row.items()})
+
+
+def _json_pieces(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    yield "["
+    for index, row in enumerate(rows):
+        yield ("," if index else "") + json.dumps(row)
+    yield "]"
+
+
+def export_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    return _batched(_csv_lines(rows))
+
+
+def export_json(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    return _batched(_json_pieces(rows))
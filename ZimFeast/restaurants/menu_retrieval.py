@@ -0,0 +1,324 @@
+"""
+Local retrieval stage in front of the Chef Zim model call.
+
+Every menu item is turned into a hashed bag-of-words vector (dish name,
+description, categories, cuisines), weighted by TF-IDF and L2-normalized.
+The vectors are kept as flat NumPy arrays (row, column, value) so scoring the
+whole menu against a query is one vectorized pass with no per-item Python.
+The matrix for the menu digest is built once per digest version and reused
+by every request until the menus change; live-fetched partner items (a
+LiveMenu) are vectorized on their own, against the digest's IDF, and scored
+alongside it.
+
+A request context is turned into a weighted query from a small lexicon of
+keywords per mood, craving, weather, day type and party size, plus the raw
+words of the answers themselves (so free-text cravings still count). The top
+scoring items are handed to the model, at most a few per restaurant first so
+one large menu cannot crowd out everyone else.
+
+DishLookup maps the model's answers back onto menu items: an exact dictionary
+on normalized (restaurant, dish) names, then a fuzzy pass over just that
+restaurant's dishes for near-miss spellings.
+"""
+import math
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .menu_digest import LiveMenu, menu_digest, summarize
+from .search_index import tokenize, trigrams
+
+DEFAULT_CANDIDATES = 40
+DEFAULT_PER_RESTAURANT = 3
+DIMENSIONS = 1 << 18
+
+# Answer -> words that make a dish a good fit for it, with weights
+CONTEXT_KEYWORDS: Dict[str, Dict[str, float]] = {
+    # cravings
+    "something_savory": {"grilled": 1, "meat": 1, "beef": 1, "chicken": 1, "steak": 1, "cheese": 0.8,
+                         "sausage": 1, "boerewors": 1, "ribs": 1, "wings": 1, "roast": 0.8, "savory": 1.5},
+    "something_sweet": {"sweet": 1.5, "dessert": 1.5, "cake": 1, "chocolate": 1, "ice": 0.8, "cream": 0.8,
+                        "honey": 1, "pancake": 1, "waffle": 1, "donut": 1, "cookie": 1, "milkshake": 1,
+                        "caramel": 1, "pudding": 1},
+    "something_spicy": {"spicy": 1.5, "chilli": 1, "chili": 1, "peri": 1, "pepper": 0.8, "hot": 0.8,
+                        "curry": 1, "jalapeno": 1, "masala": 1, "sriracha": 1, "buffalo": 0.8},
+    "something_fresh": {"fresh": 1.5, "salad": 1.2, "fruit": 1, "juice": 1, "smoothie": 1, "vegetable": 1,
+                        "veggie": 1, "light": 1, "green": 0.8, "wrap": 0.6, "sushi": 0.8, "grilled": 0.5},
+    "comfort_food": {"comfort": 1.5, "stew": 1, "sadza": 1.2, "burger": 1, "pizza": 1, "pasta": 1,
+                     "mac": 0.8, "cheese": 0.6, "fries": 0.8, "chips": 0.8, "pie": 1, "soup": 0.8, "fried": 0.8},
+    "surprise_me": {"special": 1, "signature": 1, "chef": 1, "traditional": 0.8},
+    # moods
+    "happy": {"dessert": 0.5, "special": 0.5, "platter": 0.5},
+    "tired": {"comfort": 0.6, "quick": 0.6, "soup": 0.5, "coffee": 0.6, "stew": 0.4},
+    "stressed": {"comfort": 0.8, "chocolate": 0.5, "tea": 0.5, "soup": 0.4, "burger": 0.4},
+    "adventurous": {"traditional": 0.6, "special": 0.6, "exotic": 0.8, "fusion": 0.8, "signature": 0.6},
+    "relaxed": {"platter": 0.5, "sharing": 0.4, "smoothie": 0.4, "tea": 0.4},
+    # weather
+    "sunny": {"salad": 0.6, "ice": 0.6, "cream": 0.4, "juice": 0.6, "smoothie": 0.6, "cold": 0.6,
+              "fresh": 0.6, "lemonade": 0.6, "grilled": 0.3},
+    "cloudy": {"soup": 0.3, "coffee": 0.3, "pie": 0.3},
+    "cold": {"soup": 0.8, "stew": 0.8, "hot": 0.6, "curry": 0.6, "tea": 0.6, "coffee": 0.6, "roast": 0.5,
+             "warm": 0.8},
+    "rainy": {"soup": 0.8, "stew": 0.8, "hot": 0.5, "curry": 0.5, "tea": 0.5, "coffee": 0.5, "warm": 0.8,
+              "pie": 0.5},
+    "windy": {"soup": 0.4, "warm": 0.4, "stew": 0.4},
+    # day types
+    "workday": {"quick": 0.6, "wrap": 0.5, "sandwich": 0.5, "combo": 0.5, "bowl": 0.4, "lunch": 0.5},
+    "weekend": {"platter": 0.5, "braai": 0.6, "roast": 0.4, "brunch": 0.6, "breakfast": 0.3},
+    "special_occasion": {"special": 0.8, "steak": 0.5, "platter": 0.6, "premium": 0.8, "dessert": 0.5},
+    "regular_day": {},
+    # party sizes
+    "just_me": {"single": 0.5, "wrap": 0.3, "sandwich": 0.3, "bowl": 0.3, "regular": 0.3},
+    "couple": {"two": 0.5, "couple": 0.6, "medium": 0.3},
+    "family": {"family": 1, "platter": 0.8, "sharing": 0.8, "bucket": 0.6, "combo": 0.5, "large": 0.5,
+               "pizza": 0.3},
+    "group": {"platter": 1, "sharing": 1, "bucket": 0.8, "party": 0.8, "large": 0.6, "family": 0.6},
+}
+RAW_ANSWER_WEIGHT = 0.5
+
+MIN_NAME_SIMILARITY = 0.6
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("es"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _column(word: str) -> int:
+    # crc32 rather than hash(): columns must agree across processes
+    return zlib.crc32(_stem(word).encode("utf-8")) % DIMENSIONS
+
+
+def _document(summary: Dict[str, Any]) -> List[str]:
+    words = tokenize(summary.get("dish"))
+    words += tokenize(summary.get("description"))
+    for field in ("categories", "cuisines"):
+        for value in summary.get(field) or []:
+            words += tokenize(value)
+    return words
+
+
+class MenuMatrix:
+    """Hashed TF-IDF vectors for a list of item summaries, in coordinate form."""
+
+    __slots__ = ("size", "rows", "cols", "values", "idf", "restaurants")
+
+    def __init__(self, summaries: Sequence[Dict[str, Any]], idf: Optional[np.ndarray] = None):
+        # Rows built with another matrix's idf score on the same scale as its rows
+        rows, cols, counts = [], [], []
+        for index, summary in enumerate(summaries):
+            tf: Dict[int, int] = {}
+            for word in _document(summary):
+                column = _column(word)
+                tf[column] = tf.get(column, 0) + 1
+            for column, count in tf.items():
+                rows.append(index)
+                cols.append(column)
+                counts.append(1.0 + math.log(count))
+
+        self.size = len(summaries)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.cols = np.asarray(cols, dtype=np.int32)
+        if idf is None:
+            document_frequency = np.bincount(self.cols, minlength=DIMENSIONS)
+            idf = (np.log((1.0 + self.size) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+        self.idf = idf
+
+        values = np.asarray(counts, dtype=np.float32) * self.idf[self.cols]
+        norms = np.sqrt(np.bincount(self.rows, weights=values * values, minlength=self.size))
+        norms[norms == 0] = 1.0
+        self.values = (values / norms[self.rows]).astype(np.float32)
+        self.restaurants = [summary.get("restaurant") for summary in summaries]
+
+    def scores(self, query: Dict[int, float]) -> np.ndarray:
+        """Dot product of every item vector with the query vector."""
+        if not self.size:
+            return np.zeros(0, dtype=np.float32)
+        dense = np.zeros(DIMENSIONS, dtype=np.float32)
+        for column, weight in query.items():
+            dense[column] += weight
+        dense *= self.idf
+        return np.bincount(self.rows, weights=self.values * dense[self.cols], minlength=self.size)
+
+
+def context_query(mood, craving, day_type, weather, party_size) -> Dict[int, float]:
+    query: Dict[int, float] = {}
+    for answer in (mood, craving, day_type, weather, party_size):
+        key = "_".join(tokenize(answer))
+        for word, weight in CONTEXT_KEYWORDS.get(key, {}).items():
+            column = _column(word)
+            query[column] = query.get(column, 0.0) + weight
+        for word in tokenize(answer):
+            column = _column(word)
+            query[column] = query.get(column, 0.0) + RAW_ANSWER_WEIGHT
+    return query
+
+
+def matched_keywords(summary: Dict[str, Any], answer: str) -> List[str]:
+    """The lexicon words for this answer that appear in the item, strongest first."""
+    keywords = CONTEXT_KEYWORDS.get("_".join(tokenize(answer)), {})
+    present = {_stem(word) for word in _document(summary)}
+    hits = [word for word in keywords if _stem(word) in present]
+    return sorted(hits, key=lambda word: -keywords[word])
+
+
+def select_candidates(
+    restaurants: Sequence[Any],
+    scores: np.ndarray,
+    limit: int,
+    per_restaurant: int,
+) -> List[int]:
+    """Indices of the best items: up to per_restaurant each first, then the best of the rest."""
+    order = np.argsort(-scores, kind="stable")
+    chosen: List[int] = []
+    taken: Dict[Any, int] = {}
+    leftovers: List[int] = []
+    for index in order.tolist():
+        restaurant = restaurants[index]
+        if taken.get(restaurant, 0) < per_restaurant:
+            taken[restaurant] = taken.get(restaurant, 0) + 1
+            chosen.append(index)
+            if len(chosen) >= limit:
+                return chosen
+        else:
+            leftovers.append(index)
+    return chosen + leftovers[:limit - len(chosen)]
+
+
+def normalize_name(value: Any) -> str:
+    return " ".join(tokenize(str(value or "")))
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Max of trigram Dice and token-set overlap between two normalized names."""
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    dice = 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+    words_a, words_b = set(a.split()), set(b.split())
+    overlap = len(words_a & words_b) / max(len(words_a), len(words_b), 1)
+    return max(dice, overlap)
+
+
+class DishLookup:
+    """Menu items by normalized (restaurant, dish) name, with a fuzzy fallback."""
+
+    def __init__(self, menu_items: Sequence[Dict[str, Any]], base: Optional["DishLookup"] = None):
+        # With a base lookup, menu_items come after the base's items
+        self._exact: Dict[Tuple[str, str], Dict[str, Any]] = dict(base._exact) if base else {}
+        self._by_dish: Dict[str, Dict[str, Any]] = dict(base._by_dish) if base else {}
+        self._buckets: Dict[str, List[Tuple[str, Dict[str, Any]]]] = dict(base._buckets) if base else {}
+        added: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for item in menu_items:
+            restaurant = normalize_name(item.get("restaurant_name"))
+            dish = normalize_name(item.get("name"))
+            self._exact.setdefault((restaurant, dish), item)
+            self._by_dish.setdefault(dish, item)
+            added.setdefault(restaurant, []).append((dish, item))
+        for restaurant, dishes in added.items():
+            # New lists: the base's stay as they are
+            self._buckets[restaurant] = self._buckets.get(restaurant, []) + dishes
+
+    def find(self, restaurant_name: Any, dish_name: Any) -> Optional[Dict[str, Any]]:
+        restaurant = normalize_name(restaurant_name)
+        dish = normalize_name(dish_name)
+        if not dish:
+            return None
+        item = self._exact.get((restaurant, dish))
+        if item is not None:
+            return item
+
+        bucket = self._buckets.get(restaurant)
+        if bucket is None and restaurant:
+            # Restaurant name itself slightly off: use the closest one
+            best = max(self._buckets, key=lambda name: name_similarity(restaurant, name), default=None)
+            if best is not None and name_similarity(restaurant, best) >= MIN_NAME_SIMILARITY:
+                bucket = self._buckets[best]
+        if bucket:
+            similarity, item = max(
+                ((name_similarity(dish, name), candidate) for name, candidate in bucket),
+                key=lambda pair: pair[0],
+            )
+            if similarity >= MIN_NAME_SIMILARITY:
+                return item
+        # Model put the dish under the wrong restaurant
+        return self._by_dish.get(dish)
+
+
+class MenuRetriever:
+    def __init__(self, limit: int = DEFAULT_CANDIDATES, per_restaurant: int = DEFAULT_PER_RESTAURANT):
+        self.limit = limit
+        self.per_restaurant = per_restaurant
+        self._lock = threading.Lock()
+        self._matrix: Optional[Tuple[int, MenuMatrix]] = None  # (digest version, matrix)
+        self._lookup: Optional[Tuple[Sequence, DishLookup]] = None  # (digest items, lookup)
+
+    def digest_matrix(self, digest) -> MenuMatrix:
+        cached = self._matrix
+        if cached is not None and cached[0] == digest.version:
+            return cached[1]
+        with self._lock:
+            if self._matrix is None or self._matrix[0] != digest.version:
+                self._matrix = (digest.version, MenuMatrix(digest.summary))
+            return self._matrix[1]
+
+    def dish_lookup(self, menu_items: Sequence[Dict[str, Any]]) -> DishLookup:
+        if isinstance(menu_items, LiveMenu):
+            return DishLookup(menu_items.external, base=self.dish_lookup(menu_items.digest.items))
+        # Digest item tuples are immutable and replaced on every change, so
+        # identity is the version check (and needs no digest refresh/DB read)
+        if not isinstance(menu_items, tuple):
+            return DishLookup(menu_items)
+        cached = self._lookup
+        if cached is not None and cached[0] is menu_items:
+            return cached[1]
+        with self._lock:
+            if self._lookup is None or self._lookup[0] is not menu_items:
+                self._lookup = (menu_items, DishLookup(menu_items))
+            return self._lookup[1]
+
+    def candidates(
+        self,
+        menu_items: Sequence[Dict[str, Any]],
+        mood: str,
+        craving: str,
+        day_type: str,
+        weather: str,
+        party_size: str,
+        limit: Optional[int] = None,
+        per_restaurant: Optional[int] = None,
+    ) -> List[Tuple[Dict[str, Any], Dict[str, Any], float]]:
+        """
+        The (item, summary, score) triples worth showing the model for this
+        context, best first.
+        """
+        query = context_query(mood, craving, day_type, weather, party_size)
+        digest = menu_digest.current()
+        if menu_items is digest.items:
+            summaries = digest.summary
+            matrix = self.digest_matrix(digest)
+            scores, restaurants = matrix.scores(query), matrix.restaurants
+        elif isinstance(menu_items, LiveMenu) and menu_items.digest is digest:
+            # Only the live items need vectorizing; the digest rows are prebuilt
+            summaries = digest.summary + menu_items.external_summary
+            matrix = self.digest_matrix(digest)
+            live = MenuMatrix(menu_items.external_summary, idf=matrix.idf)
+            scores = np.concatenate([matrix.scores(query), live.scores(query)])
+            restaurants = matrix.restaurants + live.restaurants
+        else:
+            summaries = [summarize(item) for item in menu_items]
+            matrix = MenuMatrix(summaries)
+            scores, restaurants = matrix.scores(query), matrix.restaurants
+
+        indices = select_candidates(restaurants, scores, limit or self.limit, per_restaurant or self.per_restaurant)
+        return [(menu_items[i], summaries[i], float(scores[i])) for i in indices]
+
+
+menu_retriever = MenuRetriever(
+    limit=getattr(settings, "AI_RECOMMENDATION_CANDIDATES", DEFAULT_CANDIDATES),
+    per_restaurant=getattr(settings, "AI_RECOMMENDATION_CANDIDATES_PER_RESTAURANT", DEFAULT_PER_RESTAURANT),
+)
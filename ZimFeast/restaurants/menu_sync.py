@@ -0,0 +1,214 @@
+"""
+Mirror of restaurant-provided external menus (ExternalMenuItem).
+
+sync_external_menu() pulls one partner menu, diffs it against the mirrored
+rows by external id + content hash and applies only the differences with
+bulk_create / bulk_update / one DELETE. The sync_external_menus management
+command runs it for every menu API, once or on an interval.
+
+Once an API has been synced (RestaurantExternalAPI.last_synced_at is set),
+get_menu_data and Chef Zim read its menu from the mirror instead of calling
+the partner, so customer latency no longer depends on partner uptime. A
+failed sync leaves the previous mirror in place; once the last successful
+sync is older than EXTERNAL_MENU_MIRROR_MAX_AGE seconds get_menu_data calls
+the partner again and only falls back to the old mirror if that fails.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ZimFeast.http_client import http_client
+
+from .catalog import restaurant_catalog
+from .integrations import guarded_call
+from .models import ExternalMenuItem, RestaurantExternalAPI
+
+logger = logging.getLogger(__name__)
+
+# RestaurantExternalAPI categories whose responses are a list of menu items
+MIRRORED_CATEGORIES = ("menu_api", "meal_data", "meals", "items")
+
+DEFAULT_MAX_ITEMS = 500
+DEFAULT_MIRROR_MAX_AGE = 3600  # seconds since the last successful sync
+MAX_PRICE = Decimal("999999.99")
+
+
+class UnsupportedMenuPayload(ValueError):
+    """The partner answered with something other than a list of items."""
+
+
+def fetch_partner_menu(api: RestaurantExternalAPI) -> List[Dict[str, Any]]:
+    headers = {}
+    if api.api_key:
+        headers["Authorization"] = f"Bearer {api.api_key}"
+
+    def fetch():
+        response = http_client.get(api.api_url, headers=headers, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    data = guarded_call(api, fetch)
+    if not isinstance(data, list):
+        raise UnsupportedMenuPayload(f"{api.api_url} returned {type(data).__name__}, expected a list")
+    return [item for item in data[:getattr(settings, "EXTERNAL_MENU_MAX_ITEMS", DEFAULT_MAX_ITEMS)]
+            if isinstance(item, dict)]
+
+
+def _price(value) -> Decimal:
+    try:
+        price = Decimal(str(value)).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError, TypeError):
+        return Decimal("0.00")
+    if not price.is_finite() or price < 0:
+        return Decimal("0.00")
+    return min(price, MAX_PRICE)
+
+
+def _rows(items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Partner items -> {external_id: mirror field values}, in response order."""
+    rows = {}
+    for position, item in enumerate(items):
+        partner_id = item.get("id") or item.get("item_id") or item.get("sku")
+        if partner_id not in (None, ""):
+            external_id = str(partner_id)[:255]
+        else:
+            external_id = f"name:{str(item.get('name', '')).strip().lower()}"[:240]
+        while external_id in rows:  # duplicate ids/names keep their own rows
+            external_id = f"{external_id}#{position}"
+
+        raw = json.loads(json.dumps(item, default=str))
+        rows[external_id] = {
+            "position": position,
+            "name": str(item.get("name") or "Unknown")[:255],
+            "description": str(item.get("description") or ""),
+            "price": _price(item.get("price", 0)),
+            "category": str(item.get("category") or "")[:255],
+            "available": item.get("available", True) is not False,
+            "raw": raw,
+            "content_hash": hashlib.sha1(
+                json.dumps([position, raw], sort_keys=True).encode("utf-8")
+            ).hexdigest(),
+        }
+    return rows
+
+
+def sync_external_menu(api: RestaurantExternalAPI) -> Dict[str, int]:
+    """Bring the mirror of one API in line with the partner. Returns change counts."""
+    rows = _rows(fetch_partner_menu(api))
+    now = timezone.now()
+    first_sync = api.last_synced_at is None
+
+    with transaction.atomic():
+        existing = {
+            external_id: (pk, content_hash)
+            for pk, external_id, content_hash in ExternalMenuItem.objects.filter(api=api)
+            .values_list("pk", "external_id", "content_hash")
+        }
+
+        to_create, to_update = [], []
+        for external_id, fields in rows.items():
+            current = existing.get(external_id)
+            if current is None:
+                to_create.append(ExternalMenuItem(
+                    api=api, restaurant_id=api.restaurant_id, external_id=external_id, synced_at=now, **fields
+                ))
+            elif current[1] != fields["content_hash"]:
+                to_update.append(ExternalMenuItem(pk=current[0], synced_at=now, **fields))
+        removed = [pk for external_id, (pk, _) in existing.items() if external_id not in rows]
+
+        if to_create:
+            ExternalMenuItem.objects.bulk_create(to_create, batch_size=500)
+        if to_update:
+            ExternalMenuItem.objects.bulk_update(
+                to_update,
+                ["position", "name", "description", "price", "category", "available", "raw",
+                 "content_hash", "synced_at"],
+                batch_size=500,
+            )
+        if removed:
+            ExternalMenuItem.objects.filter(pk__in=removed).delete()
+        # .update() keeps the RestaurantExternalAPI save signals (cache/catalog drops) out of it
+        RestaurantExternalAPI.objects.filter(pk=api.pk).update(last_synced_at=now)
+        if first_sync or to_create or to_update or removed:
+            # Rebuilds the restaurant's catalog entry and with it the menu digest rows
+            transaction.on_commit(lambda: restaurant_catalog.invalidate(api.restaurant_id))
+
+    return {"created": len(to_create), "updated": len(to_update), "deleted": len(removed)}
+
+
+def sync_external_menus(restaurant_ids: Optional[Iterable] = None) -> Dict[str, int]:
+    """Sync every mirrored API (optionally only these restaurants'). Returns totals."""
+    apis = RestaurantExternalAPI.objects.filter(category__in=MIRRORED_CATEGORIES).select_related("restaurant")
+    if restaurant_ids is not None:
+        apis = apis.filter(restaurant_id__in=list(restaurant_ids))
+
+    totals = {"synced": 0, "failed": 0, "created": 0, "updated": 0, "deleted": 0}
+    for api in apis:
+        try:
+            changes = sync_external_menu(api)
+        except Exception as e:
+            totals["failed"] += 1
+            logger.warning("Menu sync failed for %s (%s): %s", api.restaurant.name, api.api_url, e)
+            continue
+        totals["synced"] += 1
+        for key, count in changes.items():
+            totals[key] += count
+    return totals
+
+
+def mirror_is_fresh(api: RestaurantExternalAPI) -> bool:
+    """Whether the mirror of this API was synced recently enough to serve."""
+    if api.last_synced_at is None:
+        return False
+    max_age = getattr(settings, "EXTERNAL_MENU_MIRROR_MAX_AGE", DEFAULT_MIRROR_MAX_AGE)
+    return timezone.now() - api.last_synced_at <= timedelta(seconds=max_age)
+
+
+def mirrored_menu(api: RestaurantExternalAPI, category: Optional[str] = None) -> List[Dict[str, Any]]:
+    """The mirrored items of one API in the partner's own shape (get_menu_data)."""
+    items = ExternalMenuItem.objects.filter(api=api).order_by("position")
+    if category:
+        items = items.filter(category__iexact=category)
+    return list(items.values_list("raw", flat=True))
+
+
+def mirrored_ai_items(restaurant_ids: Iterable, per_restaurant: int = 50) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Available mirrored menu_api items in the ai_service shape, keyed by restaurant
+    id. Restaurants whose menu API was never synced are left out.
+    """
+    synced = RestaurantExternalAPI.objects.filter(
+        restaurant_id__in=list(restaurant_ids), category="menu_api", last_synced_at__isnull=False
+    ).values_list("pk", "restaurant_id")
+    api_restaurants = {api_id: str(rid) for api_id, rid in synced}
+    result = {rid: [] for rid in api_restaurants.values()}
+    if not api_restaurants:
+        return result
+
+    rows = (
+        ExternalMenuItem.objects.filter(api_id__in=list(api_restaurants), available=True)
+        .select_related("restaurant")
+        .order_by("api_id", "position")
+    )
+    for row in rows:
+        items = result[api_restaurants[row.api_id]]
+        if len(items) >= per_restaurant:
+            continue
+        items.append({
+            'source': 'external_api',
+            'restaurant_id': str(row.restaurant_id),
+            'restaurant_name': row.restaurant.name,
+            'name': row.name,
+            'description': row.description,
+            'price': row.raw.get('price', 0),
+            'category': row.category,
+        })
+    return result
+
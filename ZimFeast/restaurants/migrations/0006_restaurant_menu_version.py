@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0005_restaurant_profile_image_alter_menuitem_item_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='menu_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0006_restaurant_menu_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurantexternalapi',
+            name='last_synced_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ExternalMenuItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_id', models.CharField(max_length=255)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('category', models.CharField(blank=True, max_length=255)),
+                ('available', models.BooleanField(default=True)),
+                ('raw', models.JSONField(default=dict)),
+                ('content_hash', models.CharField(max_length=40)),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('api', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mirrored_items', to='restaurants.restaurantexternalapi')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='external_menu_items', to='restaurants.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['api', 'position'], name='restaurants_api_id_7e3ccd_idx')],
+                'unique_together': {('api', 'external_id')},
+            },
+        ),
+    ]
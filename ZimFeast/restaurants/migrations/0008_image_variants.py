@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0007_externalmenuitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='item_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='profile_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
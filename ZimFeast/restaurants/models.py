@@ -26,17 +26,32 @@ class Restaurant(models.Model):
     phone_number = models.CharField(max_length=30, blank=True)
     description = models.TextField(blank=True)
     profile_image = models.ImageField(upload_to="restaurant_profiles/", null=True, blank=True)
+    # Resized copies of profile_image, written by restaurants/images.py
+    profile_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     full_address = models.CharField(max_length=500)  # full textual address saved from frontend
     lat = models.FloatField()
     lng = models.FloatField()
     minimum_order_price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     est_delivery_time = models.CharField(max_length=50, blank=True)  # e.g. "30-45 mins"
     cuisines = models.ManyToManyField(CuisineType, blank=True)
+    # Bumped by restaurants/signals.py on every menu item / category change; feeds menu ETags
+    menu_version = models.PositiveIntegerField(default=0, editable=False)
     created = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # menu_version only moves through F() updates. Writing back the value
+        # this instance loaded would roll back bumps made since and bring
+        # back old ETags, so an ordinary save never writes it.
+        if not self._state.adding:
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs["update_fields"] = [name for name in update_fields if name != "menu_version"]
+        super().save(*args, **kwargs)
+
 class RestaurantExternalAPI(models.Model):
     """
     Stores external APIs provided by the restaurant.
@@ -51,6 +66,8 @@ class RestaurantExternalAPI(models.Model):
     category = models.CharField(max_length=100)
     api_url = models.URLField()
     api_key = models.CharField(max_length=255, blank=True, null=True)
+    # Set once the menu mirror (ExternalMenuItem) holds a successful sync of this API
+    last_synced_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         unique_together = ("restaurant", "category")
@@ -58,6 +75,42 @@ class RestaurantExternalAPI(models.Model):
     def __str__(self):
         return f"{self.restaurant.name} - {self.category}"
 
+class ExternalMenuItem(models.Model):
+    """
+    Local mirror of one item served by a restaurant's external menu API.
+    Kept up to date by the sync_external_menus command (restaurants/menu_sync.py)
+    so read paths don't have to call the partner.
+    """
+    api = models.ForeignKey(
+        RestaurantExternalAPI,
+        related_name="mirrored_items",
+        on_delete=models.CASCADE
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        related_name="external_menu_items",
+        on_delete=models.CASCADE
+    )
+    external_id = models.CharField(max_length=255)  # partner id, or derived from the name
+    position = models.PositiveIntegerField(default=0)  # order in the partner's response
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    category = models.CharField(max_length=255, blank=True)
+    available = models.BooleanField(default=True)
+    raw = models.JSONField(default=dict)  # item exactly as the partner sent it
+    content_hash = models.CharField(max_length=40)
+    synced_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("api", "external_id")
+        indexes = [
+            models.Index(fields=["api", "position"]),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant.name} - {self.name} (external)"
+
 class MenuItem(models.Model):
     restaurant = models.ForeignKey(
         Restaurant,
@@ -72,6 +125,8 @@ class MenuItem(models.Model):
     prep_time = models.IntegerField(null=True, blank=True, help_text="Preparation time in minutes")
     available = models.BooleanField(default=True)
     item_image = models.ImageField(upload_to="menu_items/")  # Mandatory field - enforced by frontend
+    # Resized copies of item_image, written by restaurants/images.py
+    item_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -0,0 +1,187 @@
+"""
+Geohash-cell cache of nearby-restaurant candidates.
+
+Customers in the same suburb ask for the same radius and cuisine over and over,
+so the candidate set (restaurants within reach of a ~150 m geohash cell) is
+cached per (cell, radius bucket, cuisine). Each request then only re-derives
+exact distances from its own point over the cached arrays.
+
+Entries are dropped by the Restaurant signals when a restaurant in or near the
+cell changes, and expire after NEARBY_CACHE_TTL seconds so other workers'
+changes are picked up too.
+"""
+import bisect
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from orders.utils import distances_from_point_km
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+DEFAULT_PRECISION = 7  # ~153 m x 153 m cells
+DEFAULT_TTL = 60  # seconds
+DEFAULT_MAX_ENTRIES = 5000
+RADIUS_BUCKETS_KM = (1, 2, 3, 5, 10, 15, 20, 30, 50)
+
+
+def geohash_encode(lat: float, lng: float, precision: int = DEFAULT_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bit, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_ALPHABET[ch])
+            bit, ch = 0, 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lng, max_lng) of a geohash cell."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    even = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                if bit:
+                    lng_lo = mid
+                else:
+                    lng_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lat_hi, lng_lo, lng_hi
+
+
+def radius_bucket(radius_km: float) -> float:
+    """Round a radius up to the nearest cache bucket."""
+    pos = bisect.bisect_left(RADIUS_BUCKETS_KM, radius_km)
+    if pos < len(RADIUS_BUCKETS_KM):
+        return float(RADIUS_BUCKETS_KM[pos])
+    return float(math.ceil(radius_km / 10.0) * 10)
+
+
+class _CellEntry:
+    __slots__ = ("center", "reach_km", "ids", "lats", "lngs", "created")
+
+    def __init__(self, center, reach_km, ids, lats, lngs):
+        self.center = center
+        self.reach_km = reach_km
+        self.ids = ids
+        self.lats = lats
+        self.lngs = lngs
+        self.created = time.monotonic()
+
+
+class NearbyResultCache:
+    def __init__(self, precision: int = DEFAULT_PRECISION, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.precision = precision
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, _CellEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def candidates(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        cuisine: str,
+        loader: Callable[[float, float, float], Iterable[Tuple]],
+    ) -> Tuple[tuple, np.ndarray, np.ndarray]:
+        """
+        Return (ids, lats, lngs) of every restaurant that can be within radius_km
+        of (lat, lng). loader(center_lat, center_lng, reach_km) must return
+        (id, lat, lng) rows for restaurants within reach_km of the given center.
+        """
+        cell = geohash_encode(lat, lng, self.precision)
+        bucket = radius_bucket(radius_km)
+        key = (cell, bucket, cuisine or "")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created <= self.ttl:
+                self._entries.move_to_end(key)
+                return entry.ids, entry.lats, entry.lngs
+
+        min_lat, max_lat, min_lng, max_lng = geohash_bounds(cell)
+        center = ((min_lat + max_lat) / 2, (min_lng + max_lng) / 2)
+        half_diagonal = float(distances_from_point_km(min_lat, min_lng, [center[0]], [center[1]])[0])
+        reach = bucket + half_diagonal
+
+        rows = list(loader(center[0], center[1], reach))
+        if rows:
+            ids, lats, lngs = zip(*rows)
+        else:
+            ids, lats, lngs = (), (), ()
+        entry = _CellEntry(
+            center,
+            reach,
+            tuple(ids),
+            np.ascontiguousarray(lats, dtype=np.float64),
+            np.ascontiguousarray(lngs, dtype=np.float64),
+        )
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry.ids, entry.lats, entry.lngs
+
+    def invalidate_near(self, lat: Optional[float], lng: Optional[float]):
+        """Drop every cached cell whose reach covers the given point."""
+        if lat is None or lng is None:
+            return
+        with self._lock:
+            if not self._entries:
+                return
+            keys = list(self._entries.keys())
+            centers = [self._entries[k].center for k in keys]
+            reach = np.array([self._entries[k].reach_km for k in keys])
+            distances = distances_from_point_km(lat, lng, [c[0] for c in centers], [c[1] for c in centers])
+            for i in np.flatnonzero(distances <= reach):
+                self._entries.pop(keys[i], None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+nearby_cache = NearbyResultCache(
+    precision=getattr(settings, "NEARBY_CACHE_PRECISION", DEFAULT_PRECISION),
+    ttl=getattr(settings, "NEARBY_CACHE_TTL", DEFAULT_TTL),
+    max_entries=getattr(settings, "NEARBY_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+)
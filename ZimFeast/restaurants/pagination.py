@@ -1,5 +1,155 @@
-from rest_framework.pagination import CursorPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
 
-class NearbyRestaurantCursorPagination(CursorPagination):
+import numpy as np
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Position of a row in (distance, id) order; reverse=True walks backwards
+Cursor = namedtuple("Cursor", ["distance", "id", "reverse"])
+
+
+class NearbyRestaurantCursorPagination(BasePagination):
+    """
+    Cursor pagination keyed on (distance_km, restaurant id).
+
+    The cursor carries the key of the last (or first, going backwards) row that
+    was returned, so the next page only has to pick the page_size closest rows
+    beyond it instead of sorting the whole result set and slicing an offset.
+    Without a user location the key is just the restaurant id and the page is
+    pulled straight from the database.
+    """
     page_size = 10
-    ordering = 'id'  # ordering must be unique; 'id' is usually fine
\ No newline at end of file
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8"))
+            distance = data["d"]
+            return Cursor(
+                float(distance) if distance is not None else None,
+                str(data["id"]),
+                bool(data.get("r")),
+            )
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        payload = {"d": cursor.distance, "id": cursor.id}
+        if cursor.reverse:
+            payload["r"] = 1
+        encoded = urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_distances(self, distances, ids, request):
+        """
+        Return the page as a list of (distance_km, id) tuples.
+        distances and ids describe every restaurant that matches the query.
+        """
+        self._setup(request)
+        ids = np.asarray([str(i) for i in ids])
+        distances = np.asarray(distances, dtype=np.float64)
+        self.count = len(ids)
+
+        mask = np.ones(len(ids), dtype=bool)
+        if self.cursor is not None:
+            d, i = self.cursor.distance or 0.0, self.cursor.id
+            if self.cursor.reverse:
+                mask = (distances < d) | ((distances == d) & (ids < i))
+            else:
+                mask = (distances > d) | ((distances == d) & (ids > i))
+        idx = np.flatnonzero(mask)
+
+        # One extra row tells us whether there is anything beyond this page
+        take = self.page_size + 1
+        if len(idx) > take:
+            if self.cursor is not None and self.cursor.reverse:
+                threshold = np.partition(distances[idx], len(idx) - take)[len(idx) - take]
+                idx = idx[distances[idx] >= threshold]
+            else:
+                threshold = np.partition(distances[idx], take - 1)[take - 1]
+                idx = idx[distances[idx] <= threshold]
+        idx = idx[np.lexsort((ids[idx], distances[idx]))]
+
+        rows = [(float(distances[i]), ids[i]) for i in idx]
+        return self._finish(rows)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Id-ordered pages straight from the database (no user location)."""
+        self._setup(request)
+        self.count = queryset.count()
+        if self.cursor is None:
+            rows = list(queryset.order_by("id").values_list("id", flat=True)[:self.page_size + 1])
+        elif self.cursor.reverse:
+            rows = list(
+                queryset.filter(id__lt=self.cursor.id)
+                .order_by("-id").values_list("id", flat=True)[:self.page_size + 1]
+            )[::-1]
+        else:
+            rows = list(
+                queryset.filter(id__gt=self.cursor.id)
+                .order_by("id").values_list("id", flat=True)[:self.page_size + 1]
+            )
+        return self._finish([(None, str(rest_id)) for rest_id in rows])
+
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.count,
+            "page_size": self.page_size,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_next_link(self):
+        return self.encode_cursor(self.next_cursor) if self.next_cursor else None
+
+    def get_previous_link(self):
+        if self.previous_cursor:
+            return self.encode_cursor(self.previous_cursor)
+        if self.cursor is not None and self.has_previous:
+            # Previous page is the first page
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return None
+
+    def _setup(self, request):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.has_previous = False
+
+    def _finish(self, rows):
+        has_more = len(rows) > self.page_size
+        if self.cursor is not None and self.cursor.reverse:
+            page = rows[-self.page_size:] if has_more else rows
+            self.has_previous = has_more
+            if has_more:
+                self.previous_cursor = Cursor(page[0][0], page[0][1], True)
+            if page:
+                self.next_cursor = Cursor(page[-1][0], page[-1][1], False)
+        else:
+            page = rows[:self.page_size]
+            self.has_previous = self.cursor is not None
+            if has_more:
+                self.next_cursor = Cursor(page[-1][0], page[-1][1], False)
+            if self.cursor is not None and page:
+                self.previous_cursor = Cursor(page[0][0], page[0][1], True)
+        return page
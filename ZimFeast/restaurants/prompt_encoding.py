@@ -0,0 +1,104 @@
+"""
+Compact encoding of the Chef Zim menu context.
+
+Instead of a pretty-printed JSON list that repeats the restaurant name and
+cuisines on every dish, the menu goes into the prompt as two pipe-separated
+tables with fixed columns: restaurants once, then dishes referring to them
+by short id. Descriptions get whatever is left of the token budget after the
+fixed columns, shared evenly between dishes, so the prompt stays under
+AI_PROMPT_MENU_TOKENS without dropping dishes; only if even the bare dish
+rows do not fit are the lowest-ranked dishes left out.
+
+Token counts are estimated (about four characters per token for this kind
+of text), which is close enough to budget against without a tokenizer.
+"""
+import math
+import re
+from typing import Any, Dict, List, Sequence, Tuple
+
+DEFAULT_MENU_TOKENS = 1500
+CHARS_PER_TOKEN = 4
+MIN_DESCRIPTION_CHARS = 24  # below this a description is not worth its column
+
+RESTAURANT_HEADER = "Restaurants (id|name|cuisines):"
+DISH_HEADER = "Dishes (id|restaurant id|name|price|categories|description):"
+
+_SEPARATORS = re.compile(r"[|\r\n]+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _field(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(v) for v in value if v)
+    return _SEPARATORS.sub(" ", str(value if value is not None else "")).strip()
+
+
+def _price(value: Any) -> str:
+    try:
+        return f"{float(value):.2f}"
+    except (TypeError, ValueError):
+        return _field(value)
+
+
+def encode_menu(summaries: Sequence[Dict[str, Any]], max_tokens: int = DEFAULT_MENU_TOKENS) -> Tuple[str, Dict[str, int]]:
+    """
+    Encode summarize()-shaped items, best first. Returns the text and
+    {dish id: index into summaries} for the dishes that made it in.
+    """
+    restaurant_ids: Dict[str, str] = {}
+    restaurant_rows: List[str] = []
+    dish_rows: List[Tuple[str, str, int]] = []  # (row without description, description, index)
+    for index, summary in enumerate(summaries):
+        name = _field(summary.get("restaurant"))
+        rid = restaurant_ids.get(name)
+        if rid is None:
+            rid = restaurant_ids[name] = f"R{len(restaurant_ids) + 1}"
+            restaurant_rows.append(f"{rid}|{name}|{_field(summary.get('cuisines'))}")
+        row = "|".join((
+            f"D{len(dish_rows) + 1}",
+            rid,
+            _field(summary.get("dish")),
+            _price(summary.get("price")),
+            _field(summary.get("categories")),
+        ))
+        dish_rows.append((row, _field(summary.get("description")), index))
+
+    fixed = "\n".join([RESTAURANT_HEADER, *restaurant_rows, DISH_HEADER] + [row + "|" for row, _, _ in dish_rows])
+    spare_chars = (max_tokens - estimate_tokens(fixed)) * CHARS_PER_TOKEN
+
+    if spare_chars < 0:
+        # Not even the bare rows fit: keep the best-ranked dishes that do
+        restaurant_lines = {row.split("|", 1)[0]: row for row in restaurant_rows}
+        kept, listed = [], set()
+        used = estimate_tokens("\n".join([RESTAURANT_HEADER, DISH_HEADER]))
+        for row, _, index in dish_rows:
+            rid = row.split("|", 2)[1]
+            cost = estimate_tokens(row + "|\n")
+            if rid not in listed:
+                cost += estimate_tokens(restaurant_lines[rid] + "\n")
+            if used + cost > max_tokens:
+                break
+            kept.append((row, "", index))
+            listed.add(rid)
+            used += cost
+        dish_rows = kept
+        per_dish = 0
+    else:
+        per_dish = spare_chars // max(len(dish_rows), 1)
+        if per_dish < MIN_DESCRIPTION_CHARS:
+            per_dish = 0
+
+    used_restaurants = {row.split("|", 2)[1] for row, _, _ in dish_rows}
+    lines = [RESTAURANT_HEADER]
+    lines += [row for row in restaurant_rows if row.split("|", 1)[0] in used_restaurants]
+    lines.append(DISH_HEADER)
+    ids: Dict[str, int] = {}
+    for row, description, index in dish_rows:
+        if len(description) > per_dish:
+            description = description[:max(per_dish - 1, 0)].rstrip() + "…" if per_dish else ""
+        lines.append(f"{row}|{description}")
+        ids[row.split("|", 1)[0]] = index
+    return "\n".join(lines), ids
@@ -0,0 +1,312 @@
+"""
+In-process full-text index for restaurants, dishes and cuisines.
+
+The index is derived from the catalog snapshot (restaurants/catalog.py), so it
+follows the same signal-driven invalidation: whenever the catalog rebuilds or
+drops a restaurant, that restaurant's documents are re-indexed on the next
+query.
+
+Text is split into words. Each distinct word is indexed by its trigrams, and
+each word keeps a posting list of the documents (and field weight) it appears
+in. A query word matches vocabulary words that contain it (trigram
+intersection + substring check) or, failing that, words that are
+trigram-similar to it (typos). Lookups therefore scale with the vocabulary,
+not with the number of menu rows.
+"""
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from orders.utils import distances_from_point_km
+
+from .catalog import DEFAULT_RECHECK_INTERVAL, CatalogTracker, restaurant_catalog
+
+WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+# Field weights: where in a document a word was found
+NAME_WEIGHT = 1.0
+TAG_WEIGHT = 0.7  # cuisines / categories
+DESCRIPTION_WEIGHT = 0.4
+
+# Match quality of a query word against a vocabulary word
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.9
+SUBSTRING_MATCH = 0.75
+FUZZY_MATCH = 0.6
+MIN_FUZZY_SIMILARITY = 0.4
+
+# Share of the final score that comes from proximity when the user's location
+# is known, and the distance at which proximity has dropped to one half
+DEFAULT_DISTANCE_WEIGHT = 0.35
+DEFAULT_DISTANCE_SCALE_KM = 5.0
+
+RESTAURANT = "r"
+DISH = "d"
+CUISINE = "c"
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return WORD_RE.findall((text or "").lower())
+
+
+def trigrams(word: str) -> Set[str]:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchHit:
+    __slots__ = ("kind", "score", "payload", "lat", "lng")
+
+    def __init__(self, kind, score, payload, lat=None, lng=None):
+        self.kind = kind
+        self.score = score
+        self.payload = payload
+        self.lat = lat
+        self.lng = lng
+
+
+def rank_hits(
+    hits: List[SearchHit],
+    limit: int,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Return the payloads of the top `limit` hits.
+
+    With a user location the text score is blended with proximity, computed in
+    one batch for every hit before truncating, and each payload gets a
+    distance_km. Hits without coordinates get no proximity credit.
+    """
+    if lat is None or lng is None or not hits:
+        return [hit.payload for hit in hits[:limit]]
+
+    weight = getattr(settings, "SEARCH_DISTANCE_WEIGHT", DEFAULT_DISTANCE_WEIGHT)
+    scale = getattr(settings, "SEARCH_DISTANCE_SCALE_KM", DEFAULT_DISTANCE_SCALE_KM)
+
+    text = np.fromiter((hit.score for hit in hits), dtype=np.float64, count=len(hits))
+    lats = np.array([np.nan if hit.lat is None else hit.lat for hit in hits], dtype=np.float64)
+    lngs = np.array([np.nan if hit.lng is None else hit.lng for hit in hits], dtype=np.float64)
+    distances = distances_from_point_km(lat, lng, lats, lngs)
+    proximity = np.nan_to_num(scale / (scale + distances), nan=0.0)
+    scores = (1.0 - weight) * text + weight * proximity
+
+    order = np.argsort(-scores, kind="stable")[:limit]
+    results = []
+    for i in order:
+        distance = distances[i]
+        results.append({
+            **hits[i].payload,
+            'distance_km': None if np.isnan(distance) else round(float(distance), 3),
+        })
+    return results
+
+
+class SearchIndex:
+    def __init__(self, recheck_interval: float = DEFAULT_RECHECK_INTERVAL):
+        self._lock = threading.RLock()
+        self._catalog = CatalogTracker(restaurant_catalog, recheck_interval)
+        self._word_ids: Dict[str, int] = {}
+        self._words: List[str] = []
+        self._trigrams: Dict[str, Set[int]] = defaultdict(set)
+        self._postings: List[Dict[tuple, float]] = []
+        self._docs: Dict[tuple, SearchHit] = {}
+        self._doc_words: Dict[tuple, Set[int]] = {}
+        self._restaurant_docs: Dict[str, List[tuple]] = {}
+        self._restaurant_cuisines: Dict[str, List[str]] = {}
+        self._cuisine_refs: Counter = Counter()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def search(self, query: str) -> Dict[str, List[SearchHit]]:
+        """Return every matching document grouped by kind, best match first."""
+        results = {RESTAURANT: [], DISH: [], CUISINE: []}
+        terms = tokenize(query)
+        if not terms:
+            return results
+
+        self.refresh()
+        with self._lock:
+            scores: Optional[Dict[tuple, float]] = None
+            for term in terms:
+                term_scores: Dict[tuple, float] = {}
+                for word_id, quality in self._match_word(term).items():
+                    for doc_key, weight in self._postings[word_id].items():
+                        score = quality * weight
+                        if score > term_scores.get(doc_key, 0.0):
+                            term_scores[doc_key] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    # Every query word has to match somewhere in the document
+                    scores = {k: v + term_scores[k] for k, v in scores.items() if k in term_scores}
+                if not scores:
+                    return results
+
+            for doc_key, score in scores.items():
+                doc = self._docs[doc_key]
+                results[doc.kind].append(SearchHit(doc.kind, score / len(terms), doc.payload, doc.lat, doc.lng))
+
+        for hits in results.values():
+            hits.sort(key=lambda hit: -hit.score)
+        return results
+
+    def _match_word(self, term: str) -> Dict[int, float]:
+        matches: Dict[int, float] = {}
+        exact = self._word_ids.get(term)
+        if exact is not None:
+            matches[exact] = EXACT_MATCH
+
+        if len(term) < 3:
+            # Too short for trigrams: scan the vocabulary (words, not documents)
+            for word_id, word in enumerate(self._words):
+                if word_id != exact and term in word:
+                    matches[word_id] = PREFIX_MATCH if word.startswith(term) else SUBSTRING_MATCH
+            return matches
+
+        term_grams = trigrams(term)
+        interior = {g for g in term_grams if " " not in g}
+        candidates = None
+        for gram in interior:
+            posting = self._trigrams.get(gram, set())
+            candidates = set(posting) if candidates is None else candidates & posting
+            if not candidates:
+                break
+        for word_id in candidates or ():
+            word = self._words[word_id]
+            if term in word:
+                quality = PREFIX_MATCH if word.startswith(term) else SUBSTRING_MATCH
+                if quality > matches.get(word_id, 0.0):
+                    matches[word_id] = quality
+
+        if matches:
+            return matches
+
+        # Nothing contains the term: fall back to trigram similarity (typos)
+        shared = Counter()
+        for gram in term_grams:
+            for word_id in self._trigrams.get(gram, ()):
+                shared[word_id] += 1
+        min_shared = max(1, int(len(term_grams) * MIN_FUZZY_SIMILARITY))
+        for word_id, count in shared.items():
+            if count < min_shared:
+                continue
+            # Dice coefficient over padded trigrams
+            similarity = 2 * count / (len(term_grams) + len(trigrams(self._words[word_id])))
+            if similarity >= MIN_FUZZY_SIMILARITY:
+                matches[word_id] = FUZZY_MATCH * similarity
+        return matches
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def refresh(self):
+        """Re-index restaurants whose catalog entry changed since the last query."""
+        if not self._catalog.due():
+            return
+
+        with self._lock:
+            diff = self._catalog.diff()
+            for rid in diff.removed:
+                self._remove_restaurant(rid)
+            for entry in diff.changed:
+                rid = entry.restaurant["id"]
+                self._remove_restaurant(rid)
+                self._add_restaurant(rid, entry)
+            self._catalog.record(diff)
+
+    def _add_restaurant(self, rid: str, entry):
+        data = entry.restaurant
+        cuisines = [c["name"] for c in data.get("cuisines", [])]
+        keys = []
+
+        key = (RESTAURANT, rid)
+        self._add_doc(key, SearchHit(RESTAURANT, 0.0, {
+            'id': rid,
+            'name': data["name"],
+            'description': data["description"][:100] if data.get("description") else '',
+            'cuisines': cuisines,
+            'profile_image': data.get("imageUrl"),
+            'est_delivery_time': data.get("est_delivery_time"),
+            'minimum_order_price': float(data.get("minimum_order_price") or 0),
+        }, data.get("lat"), data.get("lng")), [
+            (data["name"], NAME_WEIGHT),
+            (" ".join(cuisines), TAG_WEIGHT),
+            (data.get("description"), DESCRIPTION_WEIGHT),
+        ])
+        keys.append(key)
+
+        for item in entry.menu_items:
+            key = (DISH, item["item_id"])
+            self._add_doc(key, SearchHit(DISH, 0.0, {
+                'id': item["item_id"],
+                'name': item["name"],
+                'description': item["description"][:100] if item.get("description") else '',
+                'price': item["price"],
+                'categories': item["categories"],
+                'restaurant_id': rid,
+                'restaurant_name': data["name"],
+                'image_url': item["image_url"],
+            }, data.get("lat"), data.get("lng")), [
+                (item["name"], NAME_WEIGHT),
+                (" ".join(item["categories"]), TAG_WEIGHT),
+                (item.get("description"), DESCRIPTION_WEIGHT),
+            ])
+            keys.append(key)
+
+        for name in cuisines:
+            self._cuisine_refs[name] += 1
+            if self._cuisine_refs[name] == 1:
+                self._add_doc((CUISINE, name), SearchHit(CUISINE, 0.0, name), [(name, NAME_WEIGHT)])
+
+        self._restaurant_docs[rid] = keys
+        self._restaurant_cuisines[rid] = cuisines
+
+    def _remove_restaurant(self, rid: str):
+        for key in self._restaurant_docs.pop(rid, []):
+            self._remove_doc(key)
+        for name in self._restaurant_cuisines.pop(rid, []):
+            self._cuisine_refs[name] -= 1
+            if self._cuisine_refs[name] <= 0:
+                del self._cuisine_refs[name]
+                self._remove_doc((CUISINE, name))
+
+    def _add_doc(self, key: tuple, doc: SearchHit, fields: List[Tuple[Optional[str], float]]):
+        word_ids = set()
+        for text, weight in fields:
+            for word in tokenize(text):
+                word_id = self._word_id(word)
+                posting = self._postings[word_id]
+                if weight > posting.get(key, 0.0):
+                    posting[key] = weight
+                word_ids.add(word_id)
+        self._docs[key] = doc
+        self._doc_words[key] = word_ids
+
+    def _remove_doc(self, key: tuple):
+        self._docs.pop(key, None)
+        for word_id in self._doc_words.pop(key, ()):
+            self._postings[word_id].pop(key, None)
+
+    def _word_id(self, word: str) -> int:
+        word_id = self._word_ids.get(word)
+        if word_id is None:
+            word_id = len(self._words)
+            self._word_ids[word] = word_id
+            self._words.append(word)
+            self._postings.append({})
+            for gram in trigrams(word):
+                self._trigrams[gram].add(word_id)
+        return word_id
+
+
+search_index = SearchIndex(
+    recheck_interval=getattr(settings, "SEARCH_INDEX_RECHECK_INTERVAL", DEFAULT_RECHECK_INTERVAL),
+)
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .images import variant_urls
 from .models import (
     CuisineType,
     Restaurant,
@@ -7,6 +8,50 @@ from .models import (
     CategoryType,
 )
 
+# Compact representation used by listing screens (no nested menus or APIs)
+RESTAURANT_CARD_FIELDS = (
+    "id",
+    "name",
+    "description",
+    "full_address",
+    "lat",
+    "lng",
+    "minimum_order_price",
+    "est_delivery_time",
+    "cuisines",
+    "rating",
+    "imageUrl",
+    "imageVariants",
+)
+
+def restaurant_fields_from_params(query_params, default=None):
+    """
+    Resolve ?fields= / ?expand= into the set of restaurant fields to return.
+    ?fields=name,lat,lng replaces the default set, ?expand=menu_items adds to it.
+    Returns None when every field should be returned.
+    """
+    def parse(name):
+        raw = query_params.get(name, "")
+        return [f.strip() for f in raw.split(",") if f.strip()]
+
+    requested = parse("fields")
+    expand = parse("expand")
+    if requested:
+        fields = set(requested)
+    elif default is not None:
+        fields = set(default)
+    else:
+        return None
+    fields.update(expand)
+    fields.add("id")
+    return fields
+
+def restrict_fields(data, fields):
+    """Return a copy of a serialized restaurant limited to the given fields (None = all)."""
+    if fields is None:
+        return dict(data)
+    return {key: value for key, value in data.items() if key in fields}
+
 class CuisineTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = CuisineType
@@ -33,12 +78,17 @@ class MenuItemSerializer(serializers.ModelSerializer):
     category = serializers.SlugRelatedField(
         many=True, read_only=True, slug_field="name"
     )
+    item_image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = MenuItem
-        fields = ["id","restaurant","name","price","description","category","prep_time","available","item_image","created",]
+        fields = ["id","restaurant","name","price","description","category","prep_time","available","item_image","item_image_variants","created",]
         read_only_fields = ("restaurant", "created")
 
+    def get_item_image_variants(self, obj):
+        """Resized WebP/JPEG URLs per size (thumb, card, detail); {} until generated"""
+        return variant_urls(obj.item_image, obj.item_image_variants, self.context.get('request'))
+
 
 class RestaurantCreateSerializer(serializers.ModelSerializer):
     # Accept cuisine ids for creation/updating
@@ -76,6 +126,7 @@ class RestaurantSerializer(serializers.ModelSerializer):
     menu_items = MenuItemSerializer(many=True, read_only=True)
     rating = serializers.SerializerMethodField()
     imageUrl = serializers.SerializerMethodField()
+    imageVariants = serializers.SerializerMethodField()
 
     class Meta:
         model = Restaurant
@@ -94,6 +145,7 @@ class RestaurantSerializer(serializers.ModelSerializer):
             "menu_items",
             "rating",
             "imageUrl",
+            "imageVariants",
             "created",
         ]
     
@@ -106,6 +158,10 @@ class RestaurantSerializer(serializers.ModelSerializer):
             return f"/media/{obj.profile_image}"
         return None
     
+    def get_imageVariants(self, obj):
+        """Resized WebP/JPEG URLs of the profile image per size; {} until generated"""
+        return variant_urls(obj.profile_image, obj.profile_image_variants, self.context.get('request'))
+    
     def get_rating(self, obj):
         """Get rating from restaurant dashboard, default to 4.5"""
         try:
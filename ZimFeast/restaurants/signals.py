@@ -0,0 +1,171 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import (
+    Restaurant,
+    RestaurantExternalAPI,
+    RestaurantDashboard,
+    MenuItem,
+    CuisineType,
+    CategoryType,
+)
+from .geo_index import restaurant_index
+from .catalog import restaurant_catalog
+from .nearby_cache import nearby_cache
+from .external_cache import external_api_cache
+from .images import needs_variants, schedule_variants
+
+M2M_CHANGES = ("post_add", "post_remove", "post_clear")
+
+
+def _invalidate_catalog(restaurant_ids=None, membership_changed=False):
+    """Drop catalog entries once the surrounding transaction commits (None = everything)."""
+    if restaurant_ids is None:
+        transaction.on_commit(lambda: restaurant_catalog.invalidate())
+    else:
+        restaurant_ids = list(restaurant_ids)
+        transaction.on_commit(
+            lambda: restaurant_catalog.invalidate_many(restaurant_ids, membership_changed=membership_changed)
+        )
+
+
+def _bump_menu_version(restaurant_ids):
+    """Move the menu ETag of these restaurants on, in the same transaction as the change."""
+    Restaurant.objects.filter(pk__in=list(restaurant_ids)).update(menu_version=F("menu_version") + 1)
+
+
+def image_variants_ready(restaurant_ids):
+    """
+    New image variants of these restaurants (or their menu items) were saved
+    with .update(), which fires no signals. Menus and the catalog serve the
+    variant URLs, so move the menu ETags on and then drop the entries.
+    """
+    restaurant_ids = list(restaurant_ids)
+    _bump_menu_version(restaurant_ids)
+    restaurant_catalog.invalidate_many(restaurant_ids)
+
+
+@receiver(post_save, sender=Restaurant)
+def index_restaurant_location(sender, instance, created=False, **kwargs):
+    old_location = restaurant_index.location(instance.id)
+    if old_location:
+        nearby_cache.invalidate_near(*old_location)
+    nearby_cache.invalidate_near(instance.lat, instance.lng)
+    restaurant_index.upsert(instance.id, instance.lat, instance.lng)
+    _invalidate_catalog([instance.id], membership_changed=created)
+
+
+@receiver(post_delete, sender=Restaurant)
+def unindex_restaurant_location(sender, instance, **kwargs):
+    nearby_cache.invalidate_near(instance.lat, instance.lng)
+    restaurant_index.remove(instance.id)
+    _invalidate_catalog([instance.id], membership_changed=True)
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def bump_restaurant_menu_version(sender, instance, **kwargs):
+    _bump_menu_version([instance.restaurant_id])
+
+
+@receiver(post_save, sender=MenuItem)
+def make_menu_item_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw and needs_variants(instance, "item_image"):
+        restaurant_id = instance.restaurant_id
+        schedule_variants(MenuItem, "item_image", [instance.pk], on_done=lambda: image_variants_ready([restaurant_id]))
+
+
+@receiver(post_save, sender=Restaurant)
+def make_restaurant_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw and needs_variants(instance, "profile_image"):
+        restaurant_id = instance.pk
+        schedule_variants(Restaurant, "profile_image", [instance.pk], on_done=lambda: image_variants_ready([restaurant_id]))
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=RestaurantExternalAPI)
+@receiver(post_delete, sender=RestaurantExternalAPI)
+@receiver(post_save, sender=RestaurantDashboard)
+def invalidate_restaurant_catalog(sender, instance, **kwargs):
+    _invalidate_catalog([instance.restaurant_id])
+
+
+@receiver(post_save, sender=RestaurantExternalAPI)
+@receiver(post_delete, sender=RestaurantExternalAPI)
+def invalidate_external_api_responses(sender, instance, **kwargs):
+    external_api_cache.invalidate(instance.api_url)
+
+
+@receiver(post_save, sender=CuisineType)
+def invalidate_cuisine_restaurants(sender, instance, created=False, **kwargs):
+    if not created:
+        nearby_cache.clear()  # entries are keyed by cuisine name
+        _invalidate_catalog(Restaurant.objects.filter(cuisines=instance).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=CategoryType)
+def invalidate_category_restaurants(sender, instance, created=False, **kwargs):
+    if not created:
+        restaurant_ids = list(
+            MenuItem.objects.filter(category=instance).values_list("restaurant_id", flat=True).distinct()
+        )
+        _bump_menu_version(restaurant_ids)
+        _invalidate_catalog(restaurant_ids)
+
+
+@receiver(pre_delete, sender=CategoryType)
+def bump_category_menu_versions(sender, instance, **kwargs):
+    # Still able to see who uses the category here, unlike post_delete
+    _bump_menu_version(
+        MenuItem.objects.filter(category=instance).values_list("restaurant_id", flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=CuisineType)
+@receiver(post_delete, sender=CategoryType)
+def invalidate_whole_catalog(sender, instance, **kwargs):
+    # Through-table rows are already gone, so we can't tell who used it
+    if sender is CuisineType:
+        nearby_cache.clear()
+    _invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=Restaurant.cuisines.through)
+def invalidate_restaurant_cuisines(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_CHANGES:
+        return
+    if not reverse:
+        nearby_cache.invalidate_near(instance.lat, instance.lng)
+        _invalidate_catalog([instance.pk])
+    elif pk_set:
+        for lat, lng in Restaurant.objects.filter(pk__in=pk_set).values_list("lat", "lng"):
+            nearby_cache.invalidate_near(lat, lng)
+        _invalidate_catalog(pk_set)
+    else:
+        nearby_cache.clear()
+        _invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=MenuItem.category.through)
+def invalidate_menu_item_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # category.menuitem_set.clear(): the affected items are gone by post_clear
+        _bump_menu_version(
+            MenuItem.objects.filter(category=instance).values_list("restaurant_id", flat=True).distinct()
+        )
+    if action not in M2M_CHANGES:
+        return
+    if not reverse:
+        _bump_menu_version([instance.restaurant_id])
+        _invalidate_catalog([instance.restaurant_id])
+    elif pk_set:
+        restaurant_ids = list(
+            MenuItem.objects.filter(pk__in=pk_set).values_list("restaurant_id", flat=True).distinct()
+        )
+        _bump_menu_version(restaurant_ids)
+        _invalidate_catalog(restaurant_ids)
+    else:
+        _invalidate_catalog()
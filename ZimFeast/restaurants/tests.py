@@ -1,3 +1,1184 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from requests.cookies import create_cookie
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from orders.models import Order, OrderItem
+from realtime.redis_publisher import publisher
+from ZimFeast.http_client import http_client
+from ZimFeast.streaming import streaming_content
+
+from . import ai_service
+from .ai_cache import RecommendationCache, normalize_context, recommendation_cache
+from .autocomplete import AutocompleteIndex
+from .catalog import CHANGES_KEY, CatalogTracker, RestaurantCatalog, restaurant_catalog
+from .external_cache import ExternalResponseCache, cache_key, external_api_cache
+from .geo_index import RestaurantGridIndex, restaurant_index
+from .images import variant_name
+from .integrations import (
+    BulkheadFullError,
+    CircuitBreakers,
+    CircuitOpenError,
+    HALF_OPEN,
+    HostBulkheads,
+    OPEN,
+    guarded_call,
+)
+from .json_stream import StreamingAnswerScanner
+from .menu_digest import LiveMenu, MenuDigest, menu_digest
+from .menu_import import COLUMNS
+from .menu_retrieval import DishLookup, MenuMatrix, menu_retriever
+from .menu_sync import mirrored_menu, sync_external_menu
+from .models import CategoryType, ExternalMenuItem, MenuItem, Restaurant, RestaurantExternalAPI
+from .nearby_cache import NearbyResultCache, nearby_cache
+from .pagination import NearbyRestaurantCursorPagination
+from .prompt_encoding import estimate_tokens, encode_menu
+from .search_index import DISH, SearchHit, SearchIndex, rank_hits
+
+User = get_user_model()
+
+HARARE = (-17.8252, 31.0335)
+BULAWAYO = (-20.1325, 28.6265)
+
+IN_MEMORY_CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def make_owner(email="owner@example.com"):
+    return User.objects.create_user(email=email, password="pass1234")
+
+
+def make_restaurant(owner, name="Mama's Kitchen", lat=HARARE[0], lng=HARARE[1], **fields):
+    return Restaurant.objects.create(
+        owner=owner, name=name, full_address="1 Samora Machel Ave, Harare", lat=lat, lng=lng, **fields
+    )
+
+
+def make_item(restaurant, name="Sadza and Beef Stew", price="6.50", **fields):
+    fields.setdefault("item_image", "")
+    return MenuItem.objects.create(restaurant=restaurant, name=name, price=price, **fields)
+
+
+def png_bytes(size=(640, 480), color=(200, 60, 20)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def zip_bytes(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def reset_caches():
+    restaurant_catalog.invalidate(broadcast=False)
+    restaurant_index.invalidate()
+    nearby_cache.clear()
+    external_api_cache.invalidate()
+    recommendation_cache.clear()
+
+
+class InlineExecutor:
+    """Runs submitted work right away, so done callbacks have run when submit() returns."""
+
+    def submit(self, fn, **kwargs):
+        future = Future()
+        future.set_result(fn(**kwargs))
+        return future
+
+
+class FakeRedis:
+    """The few commands the catalog invalidation and the recommendation cache use."""
+
+    def __init__(self):
+        self.values = {}
+        self.zsets = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.values[key] = str(value).encode()
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if float(low) <= score <= float(high)]:
+            del zset[member]
+
+    def zrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        return [m.encode() for m, score in sorted(zset.items(), key=lambda pair: pair[1])
+                if float(low) <= score <= float(high)]
+
+    def zincrby(self, key, amount, member):
+        zset = self.zsets.setdefault(key, {})
+        zset[member] = zset.get(member, 0) + amount
+        return zset[member]
+
+    def zremrangebyrank(self, key, start, stop):
+        zset = self.zsets.get(key, {})
+        ranked = sorted(zset, key=lambda member: (zset[member], member))
+        stop = len(ranked) + stop if stop < 0 else stop
+        for member in ranked[start:stop + 1]:
+            del zset[member]
+
+    def zrevrange(self, key, start, stop):
+        zset = self.zsets.get(key, {})
+        ranked = sorted(zset, key=lambda member: (zset[member], member), reverse=True)
+        return [m.encode() for m in ranked[start:stop + 1]]
+
+    def multi(self):
+        pass
+
+    def transaction(self, func, *watches, value_from_callable=False):
+        result = func(self)
+        return result if value_from_callable else []
+
+
+@override_settings(IMAGE_VARIANT_WORKERS=0, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class RestaurantTestCase(TestCase):
+    """Runs without Redis and with the process-wide caches emptied around each test."""
+
+    def setUp(self):
+        for name, value in (("connected", False), ("redis_client", None)):
+            patcher = mock.patch.object(publisher, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        reset_caches()
+        self.addCleanup(reset_caches)
+        self.owner = make_owner()
+        self.restaurant = make_restaurant(self.owner)
+        self.client = APIClient()
+
+    def use_temp_media(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class GridIndexTests(RestaurantTestCase):
+    def test_candidates_only_come_from_cells_around_the_point(self):
+        near = make_restaurant(self.owner, "Avondale Grill", lat=HARARE[0] + 0.02, lng=HARARE[1])
+        far = make_restaurant(self.owner, "Bulawayo Braai", *BULAWAYO)
+        index = RestaurantGridIndex(cell_size_deg=0.05)
+
+        ids = {row[0] for row in index.candidates(*HARARE, radius_km=5)}
+
+        self.assertIn(self.restaurant.id, ids)
+        self.assertIn(near.id, ids)
+        self.assertNotIn(far.id, ids)
+
+    def test_upsert_moves_a_restaurant_between_cells(self):
+        index = RestaurantGridIndex(cell_size_deg=0.05)
+        index.candidates(*HARARE, radius_km=5)
+
+        index.upsert(self.restaurant.id, *BULAWAYO)
+
+        self.assertNotIn(self.restaurant.id, {row[0] for row in index.candidates(*HARARE, radius_km=5)})
+        self.assertIn(self.restaurant.id, {row[0] for row in index.candidates(*BULAWAYO, radius_km=5)})
+
+    def test_save_during_a_rebuild_is_not_lost(self):
+        index = RestaurantGridIndex(cell_size_deg=0.05)
+        read = RestaurantGridIndex._read_locations
+
+        def racing(*args):
+            rows = read(*args)
+            index.upsert(self.restaurant.id, *BULAWAYO)
+            return rows
+
+        with mock.patch.object(RestaurantGridIndex, "_read_locations", side_effect=racing):
+            index.rebuild()
+
+        self.assertEqual(index.location(self.restaurant.id), BULAWAYO)
+        self.assertIn(self.restaurant.id, {row[0] for row in index.candidates(*BULAWAYO, radius_km=5)})
+
+    def test_moves_saved_on_other_workers_arrive_through_the_catalog_change_log(self):
+        redis = FakeRedis()
+        with mock.patch.object(publisher, "connected", True), mock.patch.object(publisher, "redis_client", redis):
+            this_worker = RestaurantGridIndex(cell_size_deg=0.05, catalog=RestaurantCatalog(sync_interval=0))
+            other_worker = RestaurantCatalog(sync_interval=0)
+            this_worker.candidates(*HARARE, radius_km=5)
+
+            Restaurant.objects.filter(pk=self.restaurant.pk).update(lat=BULAWAYO[0], lng=BULAWAYO[1])
+            other_worker.invalidate(self.restaurant.id)
+
+            self.assertIn(self.restaurant.id, {row[0] for row in this_worker.candidates(*BULAWAYO, radius_km=5)})
+            self.assertEqual(this_worker.location(self.restaurant.id), BULAWAYO)
+
+
+class NearbyRestaurantsTests(RestaurantTestCase):
+    url = "/api/restaurants/nearby/"
+
+    def setUp(self):
+        super().setUp()
+        # ~1.1 km apart going north from the user
+        self.nearby = [self.restaurant] + [
+            make_restaurant(self.owner, f"Place {i}", lat=HARARE[0] + 0.01 * i, lng=HARARE[1])
+            for i in range(1, 5)
+        ]
+        make_restaurant(self.owner, "Bulawayo Braai", *BULAWAYO)
+
+    def test_lists_restaurants_within_radius_closest_first_as_cards(self):
+        response = self.client.get(self.url, {"lat": HARARE[0], "lng": HARARE[1], "radius_km": 10, "page_size": 10})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 5)
+        results = response.data["results"]
+        self.assertEqual([r["id"] for r in results], [str(r.id) for r in self.nearby])
+        self.assertEqual(results[0]["distance_km"], 0.0)
+        self.assertNotIn("menu_items", results[0])
+        self.assertNotIn("external_apis", results[0])
+
+    def test_fields_param_limits_the_card(self):
+        response = self.client.get(self.url, {"lat": HARARE[0], "lng": HARARE[1], "fields": "name"})
+
+        self.assertEqual(set(response.data["results"][0]), {"id", "name", "distance_km"})
+
+    def test_cursor_walks_every_page_forwards_and_back(self):
+        params = {"lat": HARARE[0], "lng": HARARE[1], "radius_km": 10, "page_size": 2}
+        pages = [self.client.get(self.url, params).data]
+        while pages[-1]["next"]:
+            pages.append(self.client.get(pages[-1]["next"]).data)
+
+        seen = [r["id"] for page in pages for r in page["results"]]
+        self.assertEqual(seen, [str(r.id) for r in self.nearby])
+        self.assertEqual([len(page["results"]) for page in pages], [2, 2, 1])
+        self.assertIsNone(pages[0]["previous"])
+
+        back = self.client.get(pages[2]["previous"]).data
+        self.assertEqual(back["results"], pages[1]["results"])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(self.url, {"lat": HARARE[0], "lng": HARARE[1], "cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class CursorPaginationTests(SimpleTestCase):
+    def paginate(self, distances, ids, **params):
+        paginator = NearbyRestaurantCursorPagination()
+        request = Request(APIRequestFactory().get("/api/restaurants/nearby/", params))
+        return paginator, paginator.paginate_distances(distances, ids, request)
+
+    def test_rows_at_the_same_distance_are_split_by_id_without_repeats(self):
+        distances, ids = [1.0, 1.0, 1.0, 0.5], ["c", "a", "b", "d"]
+
+        paginator, first = self.paginate(distances, ids, page_size=2)
+        cursor = parse_qs(urlparse(paginator.get_next_link()).query)["cursor"][0]
+        _, second = self.paginate(distances, ids, page_size=2, cursor=cursor)
+
+        self.assertEqual(first, [(0.5, "d"), (1.0, "a")])
+        self.assertEqual(second, [(1.0, "b"), (1.0, "c")])
+
+
+class NearbyResultCacheTests(SimpleTestCase):
+    def test_points_in_the_same_cell_share_one_load(self):
+        cache = NearbyResultCache()
+        loader = mock.Mock(return_value=[("r1", HARARE[0], HARARE[1])])
+
+        cache.candidates(HARARE[0], HARARE[1], 10, "", loader)
+        ids, lats, lngs = cache.candidates(HARARE[0] + 0.0001, HARARE[1] + 0.0001, 10, "", loader)
+
+        self.assertEqual(loader.call_count, 1)
+        self.assertEqual(ids, ("r1",))
+
+    def test_cuisine_and_invalidation_are_respected(self):
+        cache = NearbyResultCache()
+        loader = mock.Mock(return_value=[])
+
+        cache.candidates(HARARE[0], HARARE[1], 10, "", loader)
+        cache.candidates(HARARE[0], HARARE[1], 10, "pizza", loader)
+        cache.invalidate_near(HARARE[0] + 0.01, HARARE[1])
+        cache.candidates(HARARE[0], HARARE[1], 10, "", loader)
+
+        self.assertEqual(loader.call_count, 3)
+
+
+class CatalogTests(RestaurantTestCase):
+    def test_entry_is_reused_until_a_menu_change_commits(self):
+        entry = restaurant_catalog.get(self.restaurant.id)
+        self.assertIs(restaurant_catalog.get(self.restaurant.id), entry)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_item(self.restaurant, "Peri Peri Chicken")
+
+        rebuilt = restaurant_catalog.get(self.restaurant.id)
+        self.assertIsNot(rebuilt, entry)
+        self.assertEqual([item["name"] for item in rebuilt.menu_items], ["Peri Peri Chicken"])
+
+    def test_build_racing_an_invalidation_is_not_cached(self):
+        catalog = RestaurantCatalog()
+        build = RestaurantCatalog._menu_items_for
+
+        def racing(restaurant):
+            catalog.invalidate(restaurant.id, broadcast=False)
+            return build(restaurant)
+
+        with mock.patch.object(RestaurantCatalog, "_menu_items_for", side_effect=racing):
+            entry = catalog.get(self.restaurant.id)
+
+        self.assertEqual(entry.restaurant["name"], "Mama's Kitchen")
+        self.assertNotIn(str(self.restaurant.id), catalog._entries)
+
+    def test_invalidation_reaches_other_workers_through_redis(self):
+        redis = FakeRedis()
+        with mock.patch.object(publisher, "connected", True), mock.patch.object(publisher, "redis_client", redis):
+            this_worker = RestaurantCatalog(sync_interval=0)
+            other_worker = RestaurantCatalog(sync_interval=0)
+            entry = other_worker.get(self.restaurant.id)
+
+            this_worker.invalidate(self.restaurant.id)
+
+            self.assertIsNot(other_worker.get(self.restaurant.id), entry)
+            self.assertEqual(int(redis.get("catalog:version")), 1)
+
+    def test_change_log_is_bounded_and_lagging_workers_drop_everything(self):
+        redis = FakeRedis()
+        with mock.patch.object(publisher, "connected", True), mock.patch.object(publisher, "redis_client", redis):
+            this_worker = RestaurantCatalog(sync_interval=0, changelog_versions=3)
+            other_worker = RestaurantCatalog(sync_interval=0, changelog_versions=3)
+            entry = other_worker.get(self.restaurant.id)
+
+            for _ in range(5):
+                this_worker.invalidate(uuid.uuid4())
+
+            self.assertEqual(len(redis.zsets[CHANGES_KEY]), 3)
+            self.assertIsNot(other_worker.get(self.restaurant.id), entry)
+
+    def test_tracker_hands_back_only_the_entries_that_changed(self):
+        other = make_restaurant(self.owner, name="Sadza Express")
+        other_id = str(other.id)
+        restaurant_catalog.all()  # building entries moves the generation too
+        tracker = CatalogTracker(restaurant_catalog, recheck_interval=60)
+        first = tracker.diff()
+        self.assertEqual(len(first.changed), 2)
+        tracker.record(first, now=0)
+        self.assertFalse(tracker.due(now=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_item(self.restaurant, "Peri Peri Chicken")
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+
+        self.assertTrue(tracker.due(now=2))
+        diff = tracker.diff()
+        self.assertEqual([entry.restaurant["id"] for entry in diff.changed], [str(self.restaurant.id)])
+        self.assertEqual(diff.removed, [other_id])
+        tracker.record(diff, now=2)
+        self.assertFalse(tracker.diff())
+        self.assertTrue(tracker.due(now=62))
+
+
+class RestaurantCardTests(RestaurantTestCase):
+    def test_listing_defaults_to_cards_and_expand_adds_fields(self):
+        make_item(self.restaurant)
+
+        card = self.client.get("/api/restaurants/get/all/").data[0]
+        expanded = self.client.get("/api/restaurants/get/all/", {"expand": "menu_items"}).data[0]
+
+        self.assertNotIn("menu_items", card)
+        self.assertIn("cuisines", card)
+        self.assertEqual([item["name"] for item in expanded["menu_items"]], ["Sadza and Beef Stew"])
+
+
+class SearchTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pizza = make_item(self.restaurant, "Chicken Pizza", description="Wood fired")
+        make_item(self.restaurant, "Beef Burger")
+
+    def test_dishes_match_by_word_prefix_and_typo(self):
+        index = SearchIndex()
+
+        self.assertEqual([hit.payload["name"] for hit in index.search("burg")[DISH]], ["Beef Burger"])
+        self.assertEqual([hit.payload["id"] for hit in index.search("piza")[DISH]], [str(self.pizza.id)])
+        self.assertEqual(index.search("sushi")[DISH], [])
+
+    def test_search_endpoint_returns_grouped_results(self):
+        response = self.client.get("/api/restaurants/search/", {"q": "mama"})
+
+        self.assertEqual([r["name"] for r in response.data["restaurants"]], ["Mama's Kitchen"])
+        self.assertEqual(response.data["dishes"], [])
+
+
+class RankHitsTests(SimpleTestCase):
+    def test_equal_text_scores_are_ordered_by_distance(self):
+        far = SearchHit(DISH, 1.0, {"id": "far"}, *BULAWAYO)
+        near = SearchHit(DISH, 1.0, {"id": "near"}, *HARARE)
+
+        ranked = rank_hits([far, near], 10, *HARARE)
+
+        self.assertEqual([hit["id"] for hit in ranked], ["near", "far"])
+        self.assertEqual(ranked[0]["distance_km"], 0.0)
+        self.assertEqual([hit["id"] for hit in rank_hits([far, near], 10)], ["far", "near"])
+
+
+class AutocompleteTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chicken_pizza = make_item(self.restaurant, "Chicken Pizza")
+        self.margherita = make_item(self.restaurant, "Pizza Margherita")
+        make_item(self.restaurant, "Beef Burger")
+
+    def names(self, index, query):
+        return [suggestion["name"] for suggestion in index.suggest(query)]
+
+    def test_every_word_of_a_name_is_a_prefix(self):
+        index = AutocompleteIndex()
+
+        self.assertEqual(self.names(index, "pizz"), ["Chicken Pizza", "Pizza Margherita"])
+        self.assertEqual(self.names(index, "chick"), ["Chicken Pizza"])
+        self.assertEqual(self.names(index, "zza"), [])
+
+    def test_most_ordered_dishes_come_first(self):
+        customer = make_owner("customer@example.com")
+        order = Order.objects.create(
+            customer=customer, restaurant=self.restaurant, restaurant_names="Mama's Kitchen",
+            total_fee="10.00", status="delivered",
+        )
+        OrderItem.objects.create(user=customer, order=order, menu_item=self.margherita)
+
+        self.assertEqual(self.names(AutocompleteIndex(), "pizz"), ["Pizza Margherita", "Chicken Pizza"])
+
+    def test_endpoint_suggests_dishes_and_restaurants(self):
+        with mock.patch("restaurants.views.autocomplete_index", AutocompleteIndex()):
+            response = self.client.get("/api/restaurants/autocomplete/", {"q": "ma"})
+
+        self.assertEqual(
+            {(s["type"], s["name"]) for s in response.data["suggestions"]},
+            {("restaurant", "Mama's Kitchen"), ("dish", "Pizza Margherita")},
+        )
+
+
+class ConditionalGetTests(RestaurantTestCase):
+    def test_menu_answers_304_until_the_menu_changes(self):
+        url = f"/api/restaurants/{self.restaurant.id}/menu/"
+        make_item(self.restaurant)
+
+        first = self.client.get(url)
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        make_item(self.restaurant, "Peri Peri Chicken")
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+        self.assertEqual(len(changed.data), 2)
+
+    def test_detail_etag_depends_on_the_fields_requested(self):
+        url = f"/api/restaurants/{self.restaurant.id}/detail/"
+
+        full = self.client.get(url)
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=full["ETag"])
+        partial = self.client.get(url, {"fields": "name"}, HTTP_IF_NONE_MATCH=full["ETag"])
+
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(partial.status_code, 200)
+        self.assertEqual(set(partial.data), {"id", "name"})
+
+    def test_stale_restaurant_save_keeps_menu_version(self):
+        stale = Restaurant.objects.get(pk=self.restaurant.pk)
+        make_item(self.restaurant)
+
+        stale.name = "Mama's Kitchen Avondale"
+        stale.save()
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.menu_version, 1)
+        self.assertEqual(self.restaurant.name, "Mama's Kitchen Avondale")
+
+
+class ExternalResponseCacheTests(SimpleTestCase):
+    def test_fresh_responses_skip_the_fetch(self):
+        cache = ExternalResponseCache(ttl=60)
+        fetch = mock.Mock(return_value={"items": []})
+
+        cache.get(cache_key("https://partner.example.com/menu"), fetch)
+        cache.get(cache_key("https://partner.example.com/menu"), fetch)
+
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_params_order_does_not_matter(self):
+        self.assertEqual(
+            cache_key("https://partner.example.com/menu", {"a": "1", "b": "2"}),
+            cache_key("https://partner.example.com/menu", {"b": "2", "a": "1"}),
+        )
+
+    def test_stale_copy_is_served_while_refreshing(self):
+        cache = ExternalResponseCache(ttl=0, stale=60)
+        key = cache_key("https://partner.example.com/menu")
+        release = threading.Event()
+
+        def slow_refresh():
+            release.wait(5)
+            return "new"
+
+        cache.get(key, lambda: "old")
+        self.assertEqual(cache.get(key, slow_refresh), "old")
+        refresh = cache._inflight[key]
+        release.set()
+        refresh.result(timeout=5)
+
+        self.assertEqual(cache.get(key, lambda: "newer"), "new")
+
+    def test_failed_fetches_are_not_cached(self):
+        cache = ExternalResponseCache(ttl=60)
+        key = cache_key("https://partner.example.com/menu")
+
+        with self.assertRaises(ValueError):
+            cache.get(key, mock.Mock(side_effect=ValueError("partner down")))
+        self.assertEqual(cache.get(key, lambda: "ok"), "ok")
+
+
+@mock.patch.object(publisher, "connected", False)
+class CircuitBreakerTests(SimpleTestCase):
+    api = SimpleNamespace(pk="api-1", api_url="https://partner.example.com/menu")
+
+    def setUp(self):
+        self.breakers = CircuitBreakers(min_requests=3, error_rate=0.5, open_seconds=0.05)
+        self.bulkheads = HostBulkheads(limit=1, wait=0.01)
+        for name, value in (("circuit_breakers", self.breakers), ("host_bulkheads", self.bulkheads)):
+            patcher = mock.patch(f"restaurants.integrations.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fail(self):
+        with self.assertRaises(ConnectionError):
+            guarded_call(self.api, mock.Mock(side_effect=ConnectionError))
+
+    def test_opens_after_errors_and_fails_fast(self):
+        for _ in range(3):
+            self.fail()
+        call = mock.Mock()
+
+        with self.assertRaises(CircuitOpenError):
+            guarded_call(self.api, call)
+        call.assert_not_called()
+        self.assertEqual(self.breakers.state("api-1"), OPEN)
+
+    def test_half_open_lets_one_probe_through_and_closes_on_success(self):
+        for _ in range(3):
+            self.fail()
+        time.sleep(0.1)
+
+        self.assertEqual(self.breakers.state("api-1"), HALF_OPEN)
+        self.assertEqual(guarded_call(self.api, lambda: "menu"), "menu")
+        self.assertEqual(self.breakers.state("api-1"), "closed")
+
+    def test_full_bulkhead_does_not_claim_the_probe(self):
+        for _ in range(3):
+            self.fail()
+        time.sleep(0.1)
+        slot = self.bulkheads.slot("partner.example.com")
+        slot.acquire()
+        try:
+            with self.assertRaises(BulkheadFullError):
+                guarded_call(self.api, lambda: "menu")
+        finally:
+            slot.release()
+
+        self.assertTrue(self.breakers.allow("api-1"))
+
+
+class ExternalMenuFanOutTests(RestaurantTestCase):
+    @override_settings(EXTERNAL_MENU_FETCH_DEADLINE=0.2)
+    def test_menus_missing_the_deadline_are_skipped(self):
+        slow = make_restaurant(self.owner, "Slow Partner")
+        for restaurant in (self.restaurant, slow):
+            RestaurantExternalAPI.objects.create(
+                restaurant=restaurant, category="menu_api", api_url=f"https://{restaurant.pk}.example.com/menu"
+            )
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def fetch(restaurant, api):
+            if restaurant.pk == slow.pk:
+                release.wait(5)
+            return [{"name": f"{restaurant.name} special"}]
+
+        with mock.patch.object(ai_service, "fetch_external_menu_items", side_effect=fetch):
+            started = time.monotonic()
+            menus = ai_service.fetch_all_external_menu_items([str(self.restaurant.pk), str(slow.pk)])
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(menus, {str(self.restaurant.pk): [{"name": "Mama's Kitchen special"}]})
+
+
+class SharedHttpClientTests(SimpleTestCase):
+    def test_partner_cookies_are_never_kept(self):
+        cookie = create_cookie("sessionid", "abc", domain="partner.example.com")
+        request = urllib.request.Request("https://partner.example.com/menu")
+
+        self.assertFalse(http_client.session.cookies.get_policy().set_ok(cookie, request))
+
+    def test_http_and_https_share_one_pooled_adapter(self):
+        session = http_client.session
+
+        self.assertIs(session.get_adapter("http://a.example.com"), session.get_adapter("https://b.example.com"))
+
+
+class ExternalMenuMirrorTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = RestaurantExternalAPI.objects.create(
+            restaurant=self.restaurant, category="menu_api", api_url="https://partner.example.com/menu"
+        )
+
+    def sync(self, items):
+        with mock.patch("restaurants.menu_sync.fetch_partner_menu", return_value=items):
+            changes = sync_external_menu(self.api)
+        self.api.refresh_from_db()
+        return changes
+
+    def test_resync_applies_only_the_differences(self):
+        self.sync([
+            {"id": 1, "name": "Burger", "price": "5.00"},
+            {"id": 2, "name": "Chips", "price": "2.00"},
+            {"id": 3, "name": "Cola", "price": "1.00"},
+        ])
+        changes = self.sync([
+            {"id": 1, "name": "Burger", "price": "5.00"},
+            {"id": 2, "name": "Chips", "price": "2.50"},
+        ])
+
+        self.assertEqual(changes, {"created": 0, "updated": 1, "deleted": 1})
+        self.assertEqual([item["price"] for item in mirrored_menu(self.api)], ["5.00", "2.50"])
+
+    def test_menu_endpoint_reads_the_mirror_without_calling_the_partner(self):
+        self.sync([{"id": 1, "name": "Burger", "price": "5.00"}])
+
+        with mock.patch("restaurants.views._call_external_api") as partner:
+            response = self.client.get(f"/api/restaurants/{self.restaurant.id}/menu/")
+
+        partner.assert_not_called()
+        self.assertEqual(response.data, [{"id": 1, "name": "Burger", "price": "5.00"}])
+        self.assertEqual(ExternalMenuItem.objects.count(), 1)
+
+    @override_settings(EXTERNAL_MENU_MIRROR_MAX_AGE=60)
+    def test_stale_mirror_calls_the_partner_and_is_kept_as_a_last_resort(self):
+        self.sync([{"id": 1, "name": "Burger", "price": "5.00"}])
+        RestaurantExternalAPI.objects.filter(pk=self.api.pk).update(
+            last_synced_at=self.api.last_synced_at - timedelta(minutes=5)
+        )
+        url = f"/api/restaurants/{self.restaurant.id}/menu/"
+
+        live = [{"id": 1, "name": "Burger", "price": "6.00"}]
+        with mock.patch("restaurants.views._call_external_api", return_value=live) as partner:
+            response = self.client.get(url)
+        partner.assert_called_once()
+        self.assertEqual(response.data, live)
+
+        with mock.patch("restaurants.views._call_external_api", side_effect=RuntimeError("down")):
+            response = self.client.get(url)
+        self.assertEqual(response.data, [{"id": 1, "name": "Burger", "price": "5.00"}])
+
+
+class MenuDigestTests(RestaurantTestCase):
+    def test_snapshot_is_reused_until_a_menu_changes(self):
+        make_item(self.restaurant)
+        digest = MenuDigest()
+
+        snapshot = digest.current()
+        self.assertIs(digest.current(), snapshot)
+        self.assertEqual([summary["dish"] for summary in snapshot.summary], ["Sadza and Beef Stew"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_item(self.restaurant, "Peri Peri Chicken")
+
+        changed = digest.current()
+        self.assertGreater(changed.version, snapshot.version)
+        self.assertNotEqual(changed.fingerprint, snapshot.fingerprint)
+        self.assertEqual(len(changed.items), 2)
+
+
+class RecommendationCacheTests(RestaurantTestCase):
+    def test_equivalent_answers_share_a_context(self):
+        self.assertEqual(
+            normalize_context("Happy", "Something Spicy", "workday", "sunny", "4 people"),
+            normalize_context("happy", "something_spicy", "Workday", "Sunny", "family"),
+        )
+
+    def test_entries_are_per_menu_fingerprint_and_expire(self):
+        context = normalize_context("happy", "comfort_food", "workday", "sunny", "just_me")
+        cache = RecommendationCache(ttl=60)
+        cache.set("menus-v1", context, {"success": True})
+
+        self.assertEqual(cache.get("menus-v1", context), {"success": True})
+        self.assertIsNone(cache.get("menus-v2", context))
+        self.assertIsNone(cache.get("menus-v1", context))
+
+        expired = RecommendationCache(ttl=0)
+        expired.set("menus-v1", context, {"success": True})
+        self.assertIsNone(expired.get("menus-v1", context))
+
+    def test_only_dialog_choices_are_counted_and_the_counts_are_bounded(self):
+        redis = FakeRedis()
+        cache = RecommendationCache(max_popular_contexts=2)
+        spicy = normalize_context("happy", "something_spicy", "workday", "sunny", "just_me")
+        sweet = normalize_context("happy", "something_sweet", "workday", "sunny", "just_me")
+        fresh = normalize_context("tired", "something_fresh", "weekend", "rainy", "couple")
+        with mock.patch.object(publisher, "connected", True), mock.patch.object(publisher, "redis_client", redis):
+            for context in (spicy, spicy, spicy, sweet, sweet, fresh):
+                cache.get("menus-v1", context)
+            for n in range(5):
+                cache.get("menus-v1", normalize_context("happy", f"pizza number {n}", "workday", "sunny", "just_me"))
+
+            self.assertEqual(cache.popular_contexts(10), [spicy, sweet])
+
+    def test_recommend_serves_a_cached_answer_without_the_model(self):
+        make_item(self.restaurant)
+        context = normalize_context("happy", "comfort_food", "workday", "sunny", "just_me")
+        recommendation_cache.set(menu_digest.current().fingerprint, context, {"success": True, "engine": "openai"})
+
+        with mock.patch.object(ai_service, "generate_ai_recommendations") as model:
+            result = ai_service.recommend("happy", "comfort_food", "workday", "sunny", "just_me")
+
+        model.assert_not_called()
+        self.assertEqual(result["engine"], "openai")
+
+    def test_answers_over_live_partner_menus_are_cached_by_their_content(self):
+        make_item(self.restaurant)
+        RestaurantExternalAPI.objects.create(
+            restaurant=self.restaurant, category="menu_api", api_url="https://partner.example.com/menu"
+        )
+        rid = str(self.restaurant.id)
+        burger = {"source": "external_api", "restaurant_id": rid, "restaurant_name": "Mama's Kitchen",
+                  "name": "Burger", "description": "", "price": 5, "category": ""}
+        answer = {"success": True, "engine": "openai", "recommendations": []}
+
+        with mock.patch.object(ai_service, "_ai_executor", return_value=InlineExecutor()), \
+                mock.patch.object(ai_service, "generate_ai_recommendations", return_value=answer) as model:
+            for menu in ([burger], [burger], [{**burger, "price": 6}]):
+                with mock.patch.object(ai_service, "fetch_all_external_menu_items", return_value={rid: menu}):
+                    ai_service.recommend("happy", "comfort_food", "workday", "sunny", "just_me")
+
+        # the repeat is served from the cache, the price change is not
+        self.assertEqual(model.call_count, 2)
+
+
+def menu_entry(restaurant, name, description="", categories=()):
+    return {
+        "source": "database",
+        "restaurant_id": restaurant,
+        "restaurant_name": restaurant,
+        "restaurant_cuisines": [],
+        "item_id": f"{restaurant}:{name}",
+        "name": name,
+        "description": description,
+        "price": 5.0,
+        "categories": list(categories),
+    }
+
+
+class MenuRetrievalTests(RestaurantTestCase):
+    def test_context_keywords_rank_matching_dishes_first(self):
+        items = [
+            menu_entry("Grill House", "Plain Rice"),
+            menu_entry("Grill House", "Peri Peri Chicken", "Spicy chilli marinade"),
+            menu_entry("Sweet Spot", "Chocolate Cake"),
+        ]
+
+        candidates = menu_retriever.candidates(items, "happy", "something_spicy", "workday", "sunny", "just_me")
+
+        self.assertEqual(candidates[0][0]["name"], "Peri Peri Chicken")
+        self.assertEqual(len(candidates), 3)
+
+    def test_one_menu_cannot_crowd_out_the_others(self):
+        items = [menu_entry("Curry Den", f"Hot Curry {i}", "spicy chilli") for i in range(5)]
+        items.append(menu_entry("Salad Bar", "Garden Salad"))
+
+        candidates = menu_retriever.candidates(
+            items, "happy", "something_spicy", "workday", "sunny", "just_me", limit=2, per_restaurant=1
+        )
+
+        self.assertEqual({item["restaurant_name"] for item, _, _ in candidates}, {"Curry Den", "Salad Bar"})
+
+    def test_live_partner_items_are_scored_next_to_the_prebuilt_digest_matrix(self):
+        make_item(self.restaurant, "Beef Stew", description="Slow cooked comfort stew")
+        digest = menu_digest.current()
+        menu_retriever.digest_matrix(digest)
+        live = LiveMenu(digest, [menu_entry("Curry Den", "Hot Curry", "spicy chilli")])
+
+        with mock.patch("restaurants.menu_retrieval.MenuMatrix", wraps=MenuMatrix) as build:
+            candidates = menu_retriever.candidates(live, "happy", "something_spicy", "workday", "sunny", "just_me")
+
+        build.assert_called_once()
+        self.assertEqual([summary["dish"] for summary in build.call_args.args[0]], ["Hot Curry"])
+        self.assertEqual([item["name"] for item, _, _ in candidates], ["Hot Curry", "Beef Stew"])
+        self.assertEqual(menu_retriever.dish_lookup(live).find("Curry Den", "Hot Curry")["name"], "Hot Curry")
+
+
+class LatencyBudgetTests(RestaurantTestCase):
+    def test_slow_model_falls_back_to_local_recommendations(self):
+        make_item(self.restaurant, "Beef Stew", description="Slow cooked comfort stew")
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_model(**kwargs):
+            release.wait(5)
+            return {"success": True, "engine": "openai", "recommendations": []}
+
+        with mock.patch.object(ai_service, "generate_ai_recommendations", side_effect=slow_model):
+            started = time.monotonic()
+            result = ai_service.recommend("tired", "comfort_food", "workday", "cold", "just_me", budget=0.05)
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(result["engine"], "local")
+        self.assertEqual(result["recommendations"][0]["dish_name"], "Beef Stew")
+        self.assertEqual(result["recommendations"][0]["restaurant_name"], "Mama's Kitchen")
+
+
+class DishLookupTests(SimpleTestCase):
+    def setUp(self):
+        self.lookup = DishLookup([
+            menu_entry("Grill House", "Peri-Peri Chicken"),
+            menu_entry("Sweet Spot", "Chocolate Cake"),
+        ])
+
+    def test_exact_and_near_miss_names_resolve(self):
+        self.assertEqual(self.lookup.find("grill house", "peri peri chicken")["name"], "Peri-Peri Chicken")
+        self.assertEqual(self.lookup.find("Grill Hous", "Peri Peri Chiken")["name"], "Peri-Peri Chicken")
+
+    def test_dish_under_the_wrong_restaurant_still_resolves(self):
+        self.assertEqual(self.lookup.find("Grill House", "Chocolate Cake")["restaurant_name"], "Sweet Spot")
+        self.assertIsNone(self.lookup.find("Grill House", "Sushi Platter"))
+
+
+class PromptEncodingTests(SimpleTestCase):
+    summaries = [
+        {"restaurant": "Grill House", "dish": "Peri Peri Chicken", "price": 8, "categories": ["Mains"],
+         "cuisines": ["Portuguese"], "description": "Flame grilled | spicy " * 10},
+        {"restaurant": "Grill House", "dish": "Chips", "price": 2.5, "categories": [], "cuisines": ["Portuguese"],
+         "description": "Hand cut"},
+        {"restaurant": "Sweet Spot", "dish": "Chocolate Cake", "price": 4, "categories": ["Dessert"],
+         "cuisines": [], "description": "Rich"},
+    ]
+
+    def test_restaurants_are_listed_once_and_dishes_get_short_ids(self):
+        text, ids = encode_menu(self.summaries, max_tokens=1500)
+
+        self.assertEqual(text.count("Grill House"), 1)
+        self.assertEqual(ids, {"D1": 0, "D2": 1, "D3": 2})
+        self.assertIn("D2|R1|Chips|2.50||Hand cut", text.splitlines())
+
+    def test_budget_trims_descriptions_then_drops_the_lowest_ranked_dishes(self):
+        trimmed, ids = encode_menu(self.summaries, max_tokens=80)
+        self.assertLessEqual(estimate_tokens(trimmed), 80)
+        self.assertEqual(len(ids), 3)
+
+        bare, ids = encode_menu(self.summaries, max_tokens=40)
+        self.assertLessEqual(estimate_tokens(bare), 40)
+        self.assertEqual(ids, {"D1": 0})
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+def fake_openai(pieces, error=None):
+    def create(**kwargs):
+        def stream():
+            for piece in pieces:
+                yield chunk(piece)
+            if error is not None:
+                raise error
+        return stream()
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def split(text, size=7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StreamingAnswerScannerTests(SimpleTestCase):
+    def test_parts_are_returned_as_soon_as_they_are_complete(self):
+        answer = json.dumps({
+            "greeting": 'Say "hi"',
+            "recommendations": [
+                {"dish_id": "D1", "reason": "Braces } and { inside"},
+                {"dish_id": "D2", "reason": "Escaped \\ slash"},
+            ],
+            "closing": "Enjoy!",
+        })
+        scanner = StreamingAnswerScanner()
+
+        events = [event for char in answer for event in scanner.feed(char)]
+
+        self.assertEqual(events, [
+            ("greeting", 'Say "hi"'),
+            ("recommendation", {"dish_id": "D1", "reason": "Braces } and { inside"}),
+            ("recommendation", {"dish_id": "D2", "reason": "Escaped \\ slash"}),
+            ("closing", "Enjoy!"),
+        ])
+        self.assertEqual(scanner.emitted, {"greeting", "closing"})
+
+    def test_streaming_content_is_async_only_under_asgi(self):
+        chunks = iter(["a", "b"])
+        self.assertIs(streaming_content(SimpleNamespace(), chunks), chunks)
+
+        async def collect():
+            return [piece async for piece in streaming_content(SimpleNamespace(scope={}), iter(["a", "b"]))]
+
+        self.assertEqual(async_to_sync(collect)(), ["a", "b"])
+
+
+class StreamRecommendationsTests(RestaurantTestCase):
+    answer = json.dumps({
+        "greeting": "Hello!",
+        "recommendations": [{"dish_id": "D1", "reason": "Warming", "match_score": 90}],
+        "closing": "Enjoy!",
+    })
+    context = ("tired", "comfort_food", "workday", "cold", "just_me")
+
+    def setUp(self):
+        super().setUp()
+        self.item = make_item(self.restaurant, "Beef Stew", description="Slow cooked comfort stew")
+
+    def stream(self, client):
+        with mock.patch.object(ai_service, "get_openai_client", return_value=client):
+            return list(ai_service.stream_recommendations(*self.context))
+
+    def cached(self):
+        return recommendation_cache.get(menu_digest.current().fingerprint, normalize_context(*self.context), count=False)
+
+    def test_complete_stream_ends_with_done_and_is_cached(self):
+        events = self.stream(fake_openai(split(self.answer)))
+
+        self.assertEqual([event for event, _ in events], ["greeting", "recommendation", "closing", "done"])
+        self.assertEqual(events[1][1]["item_id"], str(self.item.id))
+        self.assertEqual(self.cached()["recommendations"][0]["dish_name"], "Beef Stew")
+
+    def test_stream_cut_off_midway_ends_with_a_partial_error_and_is_not_cached(self):
+        cut = self.answer.index('"closing"')
+        events = self.stream(fake_openai(split(self.answer[:cut]), error=ConnectionError("reset")))
+
+        self.assertEqual([event for event, _ in events], ["greeting", "recommendation", "error"])
+        self.assertTrue(events[-1][1]["partial"])
+        self.assertIsNone(self.cached())
+
+    def test_sse_endpoint_sends_events(self):
+        self.client.force_authenticate(self.owner)
+        with mock.patch.object(ai_service, "get_openai_client", return_value=fake_openai(split(self.answer))):
+            response = self.client.post(
+                "/api/restaurants/ai/recommendations/?stream=1", dict(zip(
+                    ("mood", "craving", "day_type", "weather", "party_size"), self.context
+                )), format="json",
+            )
+            body = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertTrue(body.startswith("event: greeting\n"))
+        self.assertIn("event: done\n", body)
+
+
+class ImageVariantTests(RestaurantTestCase):
+    def test_variant_names_keep_the_source_extension(self):
+        self.assertEqual(variant_name("menu_items/pizza.png", "card", "webp"), "menu_items/variants/pizza.png.card.webp")
+        self.assertNotEqual(
+            variant_name("menu_items/pizza.png", "card", "webp"),
+            variant_name("menu_items/pizza.jpg", "card", "webp"),
+        )
+
+    def test_variants_are_made_after_commit_and_never_upscaled(self):
+        self.use_temp_media()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item = make_item(self.restaurant, item_image=SimpleUploadedFile("dish.png", png_bytes((1200, 300))))
+
+        item.refresh_from_db()
+        variants = item.item_image_variants
+        self.assertEqual(variants["source"], item.item_image.name)
+        with default_storage.open(variants["thumb"]["webp"]) as handle:
+            self.assertEqual(Image.open(handle).size, (160, 40))
+        with default_storage.open(variants["detail"]["jpg"]) as handle:
+            self.assertEqual(Image.open(handle).size, (1080, 270))
+
+    def test_small_images_keep_their_size(self):
+        self.use_temp_media()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item = make_item(self.restaurant, item_image=SimpleUploadedFile("dish.png", png_bytes((100, 80))))
+
+        item.refresh_from_db()
+        with default_storage.open(item.item_image_variants["detail"]["webp"]) as handle:
+            self.assertEqual(Image.open(handle).size, (100, 80))
+
+    def test_menu_etag_moves_on_once_the_variants_land(self):
+        self.use_temp_media()
+        url = f"/api/restaurants/{self.restaurant.id}/menu/"
+
+        with self.captureOnCommitCallbacks() as make_variants:
+            make_item(self.restaurant, item_image=SimpleUploadedFile("dish.png", png_bytes()))
+        before = self.client.get(url)
+        for callback in make_variants:
+            callback()
+        after = self.client.get(url, HTTP_IF_NONE_MATCH=before["ETag"])
+
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after["ETag"], before["ETag"])
+
+
+class MenuImportExportTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media()
+        self.client.force_authenticate(self.owner)
+        self.mains = CategoryType.objects.create(name="Mains")
+        self.images = zip_bytes({"photos/stew.png": png_bytes(), "broken.png": b"not an image"})
+
+    def upload(self, rows, **params):
+        text = io.StringIO()
+        writer = csv.DictWriter(text, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+        return self.client.post("/api/restaurants/menu/import/", {
+            "file": SimpleUploadedFile("menu.csv", text.getvalue().encode()),
+            "images": SimpleUploadedFile("images.zip", self.images),
+            **params,
+        }, format="multipart")
+
+    def row(self, **fields):
+        return {"name": "Beef Stew", "price": "7.50", "description": "", "categories": "mains",
+                "prep_time": "20", "available": "true", "image": "stew.png", **fields}
+
+    def test_csv_with_zip_images_is_created_in_bulk_with_shared_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload([self.row(), self.row(name="Chicken Stew", available="no")])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+        items = list(MenuItem.objects.filter(restaurant=self.restaurant).order_by("name"))
+        self.assertEqual([(i.name, i.available) for i in items], [("Beef Stew", True), ("Chicken Stew", False)])
+        self.assertEqual(list(items[0].category.all()), [self.mains])
+        self.assertEqual(items[0].item_image.name, items[1].item_image.name)
+        self.assertTrue(items[0].item_image_variants)
+        self.assertEqual(items[0].item_image_variants, items[1].item_image_variants)
+        self.restaurant.refresh_from_db()
+        # once for the import, once more when the variants landed
+        self.assertEqual(self.restaurant.menu_version, 2)
+
+    def test_invalid_rows_are_reported_and_nothing_is_written(self):
+        response = self.upload([
+            self.row(),
+            self.row(name="", price="abc"),
+            self.row(categories="Unknown", image="broken.png"),
+            self.row(image="missing.png"),
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        errors = {error["row"]: set(error["errors"]) for error in response.data["errors"]}
+        self.assertEqual(errors, {2: {"name", "price"}, 3: {"categories", "image"}, 4: {"image"}})
+        self.assertFalse(MenuItem.objects.exists())
+
+    def test_partial_import_keeps_the_valid_rows(self):
+        response = self.upload([self.row(), self.row(price="-1")], partial="true")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["errors"][0]["row"], 2)
+
+    def test_json_body_and_a_bad_archive_are_validated(self):
+        stored = default_storage.save("menu_items/stew.png", ContentFile(png_bytes()))
+
+        body = self.client.post("/api/restaurants/menu/import/", {"items": [self.row(image=stored)]}, format="json")
+        archive = self.client.post("/api/restaurants/menu/import/", {
+            "file": SimpleUploadedFile("menu.json", json.dumps([self.row()]).encode()),
+            "images": SimpleUploadedFile("images.zip", b"not a zip"),
+        }, format="multipart")
+
+        self.assertEqual(body.status_code, 201)
+        self.assertEqual(archive.status_code, 400)
+        self.assertEqual(archive.data["error"], "images must be a zip archive")
+
+    def test_export_round_trips_through_import(self):
+        stored = default_storage.save("menu_items/stew.png", ContentFile(png_bytes()))
+        item = make_item(self.restaurant, "Beef Stew", price="7.50", item_image=stored, prep_time=20)
+        item.category.add(self.mains)
+
+        exported = self.client.get("/api/restaurants/menu/export/", {"type": "json"})
+        rows = json.loads(b"".join(exported.streaming_content))
+        csv_export = self.client.get("/api/restaurants/menu/export/")
+        header = b"".join(csv_export.streaming_content).decode().splitlines()[0]
+        reimported = self.client.post("/api/restaurants/menu/import/", {"items": rows}, format="json")
+
+        self.assertEqual(rows, [{"name": "Beef Stew", "price": "7.50", "description": "", "categories": ["Mains"],
+                                 "prep_time": 20, "available": True, "image": stored}])
+        self.assertEqual(header, ",".join(COLUMNS))
+        self.assertEqual(reimported.status_code, 201)
+        self.assertEqual(MenuItem.objects.filter(item_image=stored).count(), 2)
+
+
+class MenuAvailabilityTests(RestaurantTestCase):
+    url = "/api/restaurants/menu/availability/"
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.owner)
+        drinks = CategoryType.objects.create(name="Drinks")
+        self.cola = make_item(self.restaurant, "Cola")
+        self.juice = make_item(self.restaurant, "Juice")
+        self.stew = make_item(self.restaurant, "Beef Stew")
+        self.cola.category.add(drinks)
+        self.juice.category.add(drinks)
+        self.restaurant.refresh_from_db()
+
+    def test_category_is_switched_with_one_version_bump(self):
+        version = self.restaurant.menu_version
+        with mock.patch("restaurants.menu_availability._notify") as notify:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, {"available": False, "categories": ["drinks"]}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data["changed"]), {str(self.cola.id), str(self.juice.id)})
+        self.assertEqual(response.data["menu_version"], version + 1)
+        self.assertEqual(
+            set(MenuItem.objects.filter(available=False).values_list("name", flat=True)), {"Cola", "Juice"}
+        )
+        notify.assert_called_once()
+
+    def test_items_already_in_that_state_and_unknown_ids_are_reported(self):
+        unknown = uuid.uuid4()
+        with mock.patch("restaurants.menu_availability._notify") as notify:
+            response = self.client.post(
+                self.url, {"available": True, "item_ids": [str(self.stew.id), str(unknown)]}, format="json"
+            )
+
+        self.assertEqual(response.data["changed"], [])
+        self.assertEqual(response.data["unchanged"], 1)
+        self.assertEqual(response.data["unknown_item_ids"], [str(unknown)])
+        self.assertEqual(response.data["menu_version"], self.restaurant.menu_version)
+        notify.assert_not_called()
+
+    def test_requires_a_boolean_and_something_to_switch(self):
+        self.assertEqual(self.client.post(self.url, {"available": "no", "categories": ["Drinks"]}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"available": False}, format="json").status_code, 400)
@@ -11,10 +11,14 @@ urlpatterns = [
     
     # Search and AI recommendations (PUT BEFORE DYNAMIC PATHS)
     path('search/', views.search, name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('ai/recommendations/', views.ai_recommendations, name='ai_recommendations'),
     
     # Menu items (PUT BEFORE DYNAMIC RESTAURANT_ID)
     path('add/menu-items/', views.add_menu_item, name='add_menu_item'),
+    path('menu/import/', views.import_menu_items, name='import_menu_items'),
+    path('menu/export/', views.export_menu_items, name='export_menu_items'),
+    path('menu/availability/', views.set_menu_availability, name='set_menu_availability'),
     path("menu/<str:menu_id>/delete/", views.delete_menu_item, name="delete_menu_item"),
     path('menu/', views.get_menu_items, name='restaurant_menu'),
     
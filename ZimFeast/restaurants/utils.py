@@ -1,11 +1,12 @@
 import logging
-import requests
 from collections import defaultdict
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
 from restaurants.models import Restaurant, RestaurantDashboard
+from restaurants.integrations import guarded_call
+from ZimFeast.http_client import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -57,8 +58,8 @@ def process_restaurant_orders(order):
                 headers["Authorization"] = f"Bearer {api_entry.api_key}"
 
             try:
-                response = requests.post(api_entry.api_url, json=payload, headers=headers, timeout=10)
-                response.raise_for_status()
+                # Fails fast (-> dashboard fallback) while the partner's breaker is open
+                response = guarded_call(api_entry, lambda: _post_order(api_entry, payload, headers))
                 data = response.json()
                 # expect external API returns {"order_number": "..."}
                 order_number = data.get("order_number")
@@ -74,6 +75,11 @@ def process_restaurant_orders(order):
 
     return restaurant_order_numbers
 
+def _post_order(api_entry, payload, headers):
+    response = http_client.post(api_entry.api_url, json=payload, headers=headers, timeout=10)
+    response.raise_for_status()
+    return response
+
 def update_restaurant_dashboard(restaurant, items, order):
     """
     Update internal restaurant dashboard model:
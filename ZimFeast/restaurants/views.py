@@ -1,7 +1,8 @@
 import logging
 import requests
 from django.shortcuts import get_object_or_404
-from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
 from django.utils import timezone
 from rest_framework.decorators import (
     api_view,
@@ -9,11 +10,14 @@ from rest_framework.decorators import (
     parser_classes,
 )
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 from rest_framework import status
 
-from geopy.distance import geodesic
+import hashlib
+import json
+import uuid
+import numpy as np
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
@@ -29,10 +33,23 @@ from .serializers import (
     RestaurantSerializer,
     RestaurantCreateSerializer,
     RestaurantExternalAPISerializer,
-    MenuItemSerializer 
+    MenuItemSerializer,
+    RESTAURANT_CARD_FIELDS,
+    restaurant_fields_from_params,
+    restrict_fields,
 )
 
 from .pagination import NearbyRestaurantCursorPagination
+from .geo_index import restaurant_index, bounding_box
+from .catalog import restaurant_catalog
+from .nearby_cache import nearby_cache
+from .autocomplete import autocomplete_index
+from .external_cache import external_api_cache, cache_key as external_cache_key
+from .integrations import guarded_call
+from .menu_sync import MIRRORED_CATEGORIES, mirror_is_fresh, mirrored_menu
+from orders.utils import distances_from_point_km
+from ZimFeast.http_client import http_client
+from ZimFeast.streaming import streaming_content
 
 logger = logging.getLogger(__name__)
 channel_layer = get_channel_layer()
@@ -150,6 +167,110 @@ def add_menu_item(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser, JSONParser])
+def import_menu_items(request):
+    """
+    Bulk-create menu items for the owner's restaurant.
+    Accepts a CSV or JSON `file` (plus an optional `images` zip), or a JSON
+    body {"items": [...]}; columns as in restaurants/menu_import.py.
+    Every row is validated first. With errors nothing is written and the
+    per-row errors are returned, unless `partial` is true, in which case
+    the valid rows are still imported.
+    """
+    from .menu_import import ImageSource, MenuImportError, import_menu, read_rows, validate_rows
+
+    restaurant = get_object_or_404(Restaurant, owner=request.user)
+
+    try:
+        upload = request.FILES.get("file")
+        rows = read_rows(upload=upload, data=None if upload else request.data)
+        images = ImageSource(request.FILES.get("images"))
+    except MenuImportError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    clean, errors = validate_rows(rows, images)
+    body = request.data if isinstance(request.data, dict) else {}
+    partial = str(body.get("partial", request.query_params.get("partial", ""))).lower() in ("1", "true")
+    if errors and not partial:
+        return Response({"created": 0, "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    items = import_menu(restaurant, clean, images)
+    return Response(
+        {"created": len(items), "item_ids": [str(item.id) for item in items], "errors": errors},
+        status=status.HTTP_201_CREATED,
+    )
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_menu_items(request):
+    """
+    Stream the owner's menu as CSV (default) or JSON (?type=json), in the
+    format import_menu_items accepts.
+    """
+    from .menu_import import export_csv, export_json, export_rows
+
+    restaurant = get_object_or_404(Restaurant, owner=request.user)
+    as_json = request.query_params.get("type") == "json"
+    rows = export_rows(restaurant)
+    response = StreamingHttpResponse(
+        streaming_content(request, export_json(rows) if as_json else export_csv(rows)),
+        content_type="application/json" if as_json else "text/csv",
+    )
+    response["Content-Disposition"] = f'attachment; filename="menu.{"json" if as_json else "csv"}"'
+    return response
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def set_menu_availability(request):
+    """
+    Mark many menu items of the owner's restaurant available or unavailable at once.
+    Body: {"available": false, "item_ids": [...], "categories": ["Burgers", ...]}
+    (item_ids and/or categories). Items already in that state are left alone.
+    """
+    from .menu_availability import set_availability
+
+    restaurant = get_object_or_404(Restaurant, owner=request.user)
+
+    available = request.data.get("available")
+    if not isinstance(available, bool):
+        return Response({"error": "available must be true or false"}, status=status.HTTP_400_BAD_REQUEST)
+    item_ids = request.data.get("item_ids") or []
+    categories = request.data.get("categories") or []
+    if not isinstance(item_ids, list) or not isinstance(categories, list):
+        return Response({"error": "item_ids and categories must be lists"}, status=status.HTTP_400_BAD_REQUEST)
+    if not item_ids and not categories:
+        return Response({"error": "Provide item_ids and/or categories"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        item_ids = [uuid.UUID(str(item_id)) for item_id in item_ids]
+    except ValueError:
+        return Response({"error": "item_ids must be menu item ids"}, status=status.HTTP_400_BAD_REQUEST)
+
+    result = set_availability(restaurant, available, item_ids, [str(name) for name in categories])
+    return Response(result, status=status.HTTP_200_OK)
+
+def _conditional_response(request, etag, build):
+    """
+    Answer 304 when If-None-Match already names `etag`; otherwise build() the
+    response and tag it, so unchanged menus are never re-serialized.
+    """
+    etag = quote_etag(etag)
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        tags = [tag[2:] if tag.startswith("W/") else tag for tag in parse_etags(if_none_match)]
+        if "*" in tags or etag in tags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = etag
+            return response
+    response = build()
+    response["ETag"] = etag
+    return response
+
+def _etag_variant(*parts):
+    """Short stable digest of request parameters that change the representation."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:12]
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_menu_items(request):
@@ -159,20 +280,16 @@ def get_menu_items(request):
     # Get the restaurant for the logged-in user
     restaurant = get_object_or_404(Restaurant, owner=request.user)
 
-    # Get all menu items for this restaurant
-    menu_items = MenuItem.objects.filter(restaurant=restaurant).order_by("created")
+    def build():
+        # Get all menu items for this restaurant
+        menu_items = MenuItem.objects.filter(restaurant=restaurant).order_by("created")
 
-    # Serialize the menu items
-    serializer = MenuItemSerializer(menu_items, many=True)
+        # Serialize the menu items
+        serializer = MenuItemSerializer(menu_items, many=True)
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from rest_framework import status
-from django.shortcuts import get_object_or_404
-from .models import MenuItem, Restaurant
+    return _conditional_response(request, f"{restaurant.id}-{restaurant.menu_version}-owner", build)
 
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
@@ -194,8 +311,34 @@ def delete_menu_item(request, menu_id):
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def get_restaurant_detail(request, restaurant_id):
-    rest = get_object_or_404(Restaurant, id=restaurant_id)
-    return Response(RestaurantSerializer(rest).data)
+    entry = restaurant_catalog.get(restaurant_id)
+    if entry is None:
+        raise Http404("No Restaurant matches the given query.")
+    fields = restaurant_fields_from_params(request.query_params)
+    etag = f"{entry.etag}-{_etag_variant(sorted(fields) if fields else None)}"
+    return _conditional_response(request, etag, lambda: Response(restrict_fields(entry.restaurant, fields)))
+
+def _restaurants_within(restaurants, lat, lng, radius_km, filtered=False):
+    """(id, lat, lng) of restaurants in the queryset within radius_km of a point."""
+    # Grid index narrows the scan to nearby cells; exact distance only on those
+    candidates = restaurant_index.candidates(lat, lng, radius_km)
+
+    # Bounding box keeps the SQL side (cuisine filter) to the same small area
+    if filtered and candidates:
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        allowed_ids = set(
+            restaurants.filter(
+                lat__range=(min_lat, max_lat),
+                lng__range=(min_lng, max_lng),
+            ).values_list("id", flat=True)
+        )
+        candidates = [c for c in candidates if c[0] in allowed_ids]
+
+    if not candidates:
+        return []
+    ids, lats, lngs = zip(*candidates)
+    distances = distances_from_point_km(lat, lng, lats, lngs)
+    return [candidates[i] for i in np.flatnonzero(distances <= radius_km)]
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
@@ -210,8 +353,6 @@ def list_nearby_restaurants(request):
         return Response({"error": "lat and lng must be floats"}, status=400)
 
     radius_km = float(request.query_params.get("radius_km", 10.0))
-    page_size = int(request.query_params.get("page_size", 10))
-    page = int(request.query_params.get("page", 1))
 
     # Optional cuisine filter
     cuisine = request.query_params.get("cuisine", "").strip().lower()
@@ -219,54 +360,54 @@ def list_nearby_restaurants(request):
     # Start queryset
     restaurants = Restaurant.objects.all()
     if cuisine:
-        restaurants = restaurants.filter(cuisines__name__iexact=cuisine)
+        restaurants = restaurants.filter(cuisines__name__iexact=cuisine).distinct()
 
-    nearby = []
+    paginator = NearbyRestaurantCursorPagination()
 
     if user_lat is not None and user_lng is not None:
-        user_point = (user_lat, user_lng)
-        for r in restaurants:
-            try:
-                r_point = (r.lat, r.lng)
-                dist = geodesic(user_point, r_point).km
-                if dist <= radius_km:
-                    nearby.append((dist, r))
-            except Exception:
-                continue
-        # Sort by distance
-        nearby.sort(key=lambda x: x[0])
-        restaurant_objs = [r for _, r in nearby]
+        # Candidates are shared by everyone in the same ~150 m cell
+        ids, lats, lngs = nearby_cache.candidates(
+            user_lat, user_lng, radius_km, cuisine,
+            lambda lat, lng, reach: _restaurants_within(restaurants, lat, lng, reach, filtered=bool(cuisine)),
+        )
+        candidate_ids, distances = [], []
+        if ids:
+            all_distances = distances_from_point_km(user_lat, user_lng, lats, lngs)
+            within = np.flatnonzero(all_distances <= radius_km)
+            candidate_ids = [ids[i] for i in within]
+            distances = all_distances[within]
+
+        page_entries = paginator.paginate_distances(distances, candidate_ids, request)
     else:
         # No lat/lng → skip distance filtering
-        restaurant_objs = list(restaurants)
-        nearby = [(None, r) for r in restaurant_objs]
+        page_entries = paginator.paginate_queryset(restaurants, request)
 
-    # Manual pagination
-    start = (page - 1) * page_size
-    end = start + page_size
-    paginated_restaurants = restaurant_objs[start:end]
+    fields = restaurant_fields_from_params(request.query_params, default=RESTAURANT_CARD_FIELDS)
+    entries = restaurant_catalog.get_many([rest_id for _, rest_id in page_entries])
 
     # Serialize
     serialized = []
-    for r in paginated_restaurants:
-        dist = next((d for d, rest in nearby if rest.id == r.id), None)
-        data = RestaurantSerializer(r).data
+    for dist, rest_id in page_entries:
+        entry = entries.get(rest_id)
+        if entry is None:
+            continue
+        data = restrict_fields(entry.restaurant, fields)
         data["distance_km"] = round(dist, 3) if dist is not None else None
         serialized.append(data)
 
-    return Response({
-        "count": len(restaurant_objs),
-        "page": page,
-        "page_size": page_size,
-        "results": serialized
-    })
+    return paginator.get_paginated_response(serialized)
 
 def _call_external_api(api_obj, params=None):
+    # Cached per url + params; stale copies are served while a refresh runs
+    key = external_cache_key(api_obj.api_url, params, api_obj.api_key)
+    return external_api_cache.get(key, lambda: guarded_call(api_obj, lambda: _fetch_external_api(api_obj, params)))
+
+def _fetch_external_api(api_obj, params=None):
     headers = {}
     if api_obj.api_key:
         headers["Authorization"] = f"Bearer {api_obj.api_key}"
     try:
-        resp = requests.get(api_obj.api_url, params=(params or {}), headers=headers, timeout=8)
+        resp = http_client.get(api_obj.api_url, params=(params or {}), headers=headers, timeout=8)
         resp.raise_for_status()
         return resp.json()
     except requests.RequestException as e:
@@ -313,19 +454,37 @@ def get_menu_data(request, restaurant_id):
             if api_entry:
                 break
 
+    mirrored = bool(api_entry and api_entry.last_synced_at and api_entry.category.lower() in MIRRORED_CATEGORIES)
+    if mirrored:
+        if mirror_is_fresh(api_entry):
+            # Served from the local mirror kept by the sync_external_menus command
+            return Response(mirrored_menu(api_entry, request.query_params.get("category")))
+        logger.warning(
+            "Menu mirror for restaurant %s was last synced at %s - calling the external API",
+            restaurant.id, api_entry.last_synced_at,
+        )
+
     if api_entry:
         try:
             data = _call_external_api(api_entry, params=request.query_params)
             return Response(data)
         except Exception:
+            if mirrored:
+                logger.warning("External menu API failed for restaurant %s - serving the old mirror", restaurant.id)
+                return Response(mirrored_menu(api_entry, request.query_params.get("category")))
             logger.warning("External menu API failed for restaurant %s - falling back to DB", restaurant.id)
 
-    items_qs = MenuItem.objects.filter(restaurant=restaurant)
     category_filter = request.query_params.get("category")
-    if category_filter:
-        items_qs = items_qs.filter(category__iexact=category_filter)
-    serializer = MenuItemSerializer(items_qs, many=True, context={"request": request})
-    return Response(serializer.data)
+
+    def build():
+        items_qs = MenuItem.objects.filter(restaurant=restaurant)
+        if category_filter:
+            items_qs = items_qs.filter(category__iexact=category_filter)
+        serializer = MenuItemSerializer(items_qs, many=True, context={"request": request})
+        return Response(serializer.data)
+
+    etag = f"{restaurant.id}-{restaurant.menu_version}-{_etag_variant(category_filter, request.get_host())}"
+    return _conditional_response(request, etag, build)
 
 # -------------------------------
 # Order status updates for dashboard
@@ -486,9 +645,8 @@ def mark_order_collected(request, order_id):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def list_restaurants(request):
-    restaurants = Restaurant.objects.all()
-    serializer = RestaurantSerializer(restaurants, many=True)
-    return Response(serializer.data)
+    fields = restaurant_fields_from_params(request.query_params, default=RESTAURANT_CARD_FIELDS)
+    return Response([restrict_fields(data, fields) for data in restaurant_catalog.list_restaurants()])
 
 
 @api_view(['GET'])
@@ -504,21 +662,40 @@ def search(request):
     user_lat = request.GET.get('lat')
     user_lng = request.GET.get('lng')
     
-    if user_lat:
-        try:
-            user_lat = float(user_lat)
-        except ValueError:
-            user_lat = None
-    if user_lng:
-        try:
-            user_lng = float(user_lng)
-        except ValueError:
-            user_lng = None
+    try:
+        user_lat = float(user_lat) if user_lat else None
+    except ValueError:
+        user_lat = None
+    try:
+        user_lng = float(user_lng) if user_lng else None
+    except ValueError:
+        user_lng = None
     
     results = search_restaurants_and_items(query, user_lat, user_lng)
     return Response(results, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def autocomplete(request):
+    """
+    Keystroke suggestions for restaurant, dish and cuisine names.
+    Query params: q (prefix typed so far), limit (default 8, max 20)
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), 20))
+    except ValueError:
+        limit = 8
+    
+    suggestions = autocomplete_index.suggest(query, limit) if query else []
+    return Response({'query': query, 'suggestions': suggestions}, status=status.HTTP_200_OK)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def ai_recommendations(request):
@@ -526,8 +703,12 @@ def ai_recommendations(request):
     Chef Zim AI recommendation endpoint.
     Expects JSON body with: mood, craving, day_type, weather, party_size
     Returns personalized food recommendations based on all available menus.
+    With ?stream=1 (or "stream": true in the body) the answer is sent as
+    Server-Sent Events instead: greeting, one recommendation event per dish,
+    closing and done, each as soon as it is available (or error, marked
+    partial, if the answer breaks off midway).
     """
-    from .ai_service import get_all_menu_items, generate_ai_recommendations
+    from .ai_service import recommend, stream_recommendations
     
     mood = request.data.get('mood', '')
     craving = request.data.get('craving', '')
@@ -538,15 +719,32 @@ def ai_recommendations(request):
     user_lat = request.data.get('lat')
     user_lng = request.data.get('lng')
     
-    menu_items = get_all_menu_items(user_lat, user_lng)
+    if request.query_params.get('stream') in ('1', 'true') or request.data.get('stream') is True:
+        events = stream_recommendations(
+            mood=mood,
+            craving=craving,
+            day_type=day_type,
+            weather=weather,
+            party_size=party_size,
+            user_lat=user_lat,
+            user_lng=user_lng,
+        )
+        response = StreamingHttpResponse(
+            streaming_content(request, (_sse(event, data) for event, data in events)),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx: flush each event
+        return response
     
-    recommendations = generate_ai_recommendations(
+    recommendations = recommend(
         mood=mood,
         craving=craving,
         day_type=day_type,
         weather=weather,
         party_size=party_size,
-        menu_items=menu_items
+        user_lat=user_lat,
+        user_lng=user_lng,
     )
     
     return Response(recommendations, status=status.HTTP_200_OK)
\ No newline at end of file
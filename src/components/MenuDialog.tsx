@@ -29,6 +29,8 @@ export default function MenuDialog({
 
   if (!restaurant) return null;
 
+  // listings pass card fields only; menu_items arrives once the menu is fetched
+  const isLoadingMenu = restaurant.menu_items === undefined;
   const menuItems = restaurant.menu_items || [];
 
   const handleAddToCart = (menuItem: MenuItemType) => {
@@ -71,7 +73,11 @@ export default function MenuDialog({
         </DialogHeader>
 
         <ScrollArea className="h-[500px] pr-4">
-          {menuItems.length === 0 ? (
+          {isLoadingMenu ? (
+            <div className="text-center py-8 text-muted-foreground">
+              <p>Loading menu...</p>
+            </div>
+          ) : menuItems.length === 0 ? (
             <div className="text-center py-8 text-muted-foreground">
               <i className="fas fa-utensils text-4xl mb-4"></i>
               <p>No menu items available yet</p>
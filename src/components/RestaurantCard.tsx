@@ -61,7 +61,7 @@ export default function RestaurantCard({ restaurant, currency, onViewMenu, userL
           data-testid={`button-view-menu-${restaurant.id}`}
         >
           <i className="fas fa-utensils mr-2"></i>
-          View Menu ({restaurant.menu_items?.length || 0} items)
+          View Menu{restaurant.menu_items ? ` (${restaurant.menu_items.length} items)` : ""}
         </Button>
       </CardContent>
     </Card>
@@ -234,9 +234,32 @@ export default function CustomerApp() {
     });
   };
 
+  // Listings only carry card fields; the menu is loaded when the dialog opens
+  const fetchMenu = async (restaurantId: string) => {
+    try {
+      const token = localStorage.getItem("token");
+      const res = await fetch(`/api/restaurants/${restaurantId}/detail/?fields=menu_items`, {
+        credentials: "include",
+        headers: {
+          "Content-Type": "application/json",
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
+        },
+      });
+
+      if (!res.ok) throw new Error("Failed to fetch menu");
+      const data = await res.json();
+      setSelectedRestaurant((current) =>
+        current && current.id === restaurantId ? { ...current, menu_items: data.menu_items || [] } : current
+      );
+    } catch (err: any) {
+      toast({ title: "Error", description: err.message || "Failed to fetch menu", variant: "destructive" });
+    }
+  };
+
   const handleViewMenu = (restaurant: Restaurant) => {
     setSelectedRestaurant(restaurant);
     setIsMenuDialogOpen(true);
+    if (!restaurant.menu_items) fetchMenu(restaurant.id);
   };
 
   const handleSelectRestaurantFromSearch = async (restaurantId: string) => {
@@ -244,8 +267,7 @@ export default function CustomerApp() {
       (r) => r.id === restaurantId
     );
     if (restaurant) {
-      setSelectedRestaurant(restaurant);
-      setIsMenuDialogOpen(true);
+      handleViewMenu(restaurant);
     } else {
       try {
         const token = localStorage.getItem("token");